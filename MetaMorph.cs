@@ -2,6 +2,9 @@
 using System;
 using System.Collections;
 using System.Collections.Generic;
+using System.IO;
+using System.IO.Compression;
+using System.Text;
 using System.Text.RegularExpressions;
 
 
@@ -26,9 +29,15 @@ public class MetaMorph : MonoBehaviour {
 	public class DiffMap : dataTemplate {
 		public Texture2D image;
 		public float multiplier = 0;
-		public Vector3 scale;
+		public Vector3 scale;							// For maps exported with "Per Axis Scale": the JSON Scale divided by its largest axis, read from the animation files when left at 1,1,1
+		// For maps packed into an atlas sheet (see Atlas in the exported JSON): the rect of the
+		// map in the image, the map texel at its bottom left corner and the full map size.
+		// Leave empty for a map that has an image of its own.
+		public Rect atlasRect;
+		public Vector2 mapOffset;
+		public Vector2 mapSize;
 		
-		DiffMap () {
+		public DiffMap () {
 			scale = new Vector3(1,1,1);
 		}
 	}
@@ -44,6 +53,40 @@ public class MetaMorph : MonoBehaviour {
 		//public string name;							// ID for a shapekey animation set
 		public TextAsset text;							// Textfile with the animation data
 	}
+
+	public class AnimationTrack {
+		// The weights of one key in a binary recording: a value per frame, or with simplified
+		// tracks only the key frames, interpolated (or held) between them as they are played.
+		public int[] frames;							// Frame of every key, null for a value per frame
+		public float[] values;
+		public bool step;								// Keys hold until the next one instead of blending into it
+		public int cursor;								// Key at or before the frame played last
+
+		public float Weight(int frame) {
+			if (frames == null) {
+				return values[frame];
+			}
+			// Playback mostly moves a frame or two at a time, so the key is looked for from the last one.
+			while (cursor > 0 && frames[cursor] > frame) {
+				cursor--;
+			}
+			while (cursor + 1 < frames.Length && frames[cursor + 1] <= frame) {
+				cursor++;
+			}
+			if (step || cursor + 1 >= frames.Length || frames[cursor] >= frame) {
+				return values[cursor];
+			}
+			return Mathf.Lerp(values[cursor], values[cursor + 1], (float)(frame - frames[cursor]) / (frames[cursor + 1] - frames[cursor]));
+		}
+	}
+
+	public class BinaryAnimation {
+		// An animation read from a binary recording, kept as floats so playback never parses text.
+		public int frameCount;
+		public int[] indexes;							// Diff map of every key
+		public float[] multipliers;						// Multiplier of every key
+		public AnimationTrack[] tracks;					// Weights of every key
+	}
 	
 	public class CurrentlyActiveMorph : dataTemplate {
 		//string name;  // relates directly to Diff_Map_class.AR_Name
@@ -82,6 +125,7 @@ public class MetaMorph : MonoBehaviour {
 
 	public MetaMorphSettings metaMorphSettings;
 	public DiffMap[] diffMaps;
+	public TextAsset vertexDeltas;					// Optional -DiffMapDeltas.bytes from the exporter, used instead of diff map images
 	public AnimationRecording[] animationRecordings;
 
 	private bool isVisible = false;
@@ -98,6 +142,7 @@ public class MetaMorph : MonoBehaviour {
 	private List<List<Vector3>> morphShapesData;
 	private List<List<int>> morphShapesLinks;
 	private List<List<List<string>>> morphAnimationData;
+	private List<BinaryAnimation> morphAnimationBinary;	// Binary recordings, null for text ones
 	//private List<> playingAnimations;
 
 	private List<CurrentlyActiveMorph> currentlyActiveMorphs;
@@ -153,6 +198,27 @@ public class MetaMorph : MonoBehaviour {
 			baseUVs = mesh.uv2;
 		}
 		
+		// Shape keys exported as vertex deltas don't need diff map images at all.
+		List<string> deltaNames = new List<string> ();
+		Dictionary<string, List<Vector3>> deltaData = new Dictionary<string, List<Vector3>> ();
+		Dictionary<string, List<int>> deltaLinks = new Dictionary<string, List<int>> ();
+		Dictionary<string, float> deltaMultipliers = new Dictionary<string, float> ();
+		if (vertexDeltas != null) {
+			ReadVertexDeltas(vertexDeltas, baseUVs, deltaNames, deltaData, deltaLinks, deltaMultipliers);
+			
+			// Without any diff maps set up, every key of the file becomes one.
+			if (diffMaps == null || diffMaps.Length == 0) {
+				diffMaps = new DiffMap[deltaNames.Count];
+				for (int key = 0 ; key < deltaNames.Count ; key++) {
+					diffMaps[key] = new DiffMap ();
+					diffMaps[key].name = deltaNames[key];
+				}
+			}
+		}
+		
+		// Pixels of every image, read once in bulk. Maps packed into the same atlas sheet share them.
+		Dictionary<Texture2D, Color[]> imagePixels = new Dictionary<Texture2D, Color[]> ();
+		
 		// let's cycle through all the diff maps in Diff_Maps.
 		int diffMapLoopMax = diffMaps.Length;	
 		for ( int diffMapLoop = 0 ; diffMapLoop < diffMapLoopMax ; diffMapLoop++ )
@@ -173,25 +239,71 @@ public class MetaMorph : MonoBehaviour {
 			// Grab the Diff Map data...
 			DiffMap aDiffMap = diffMaps[diffMapLoop];
 			
+			List<Vector3> deltaMorph;
+			if (deltaData.TryGetValue(aDiffMap.name, out deltaMorph)) {
+				for (int item = 0 ; item < deltaMorph.Count ; item++) {
+					loadDiffMap.Add(Vector3.Scale(deltaMorph[item], aDiffMap.scale));
+				}
+				loadDiffMapL = deltaLinks[aDiffMap.name];
+				if (aDiffMap.multiplier == 0) {
+					aDiffMap.multiplier = deltaMultipliers[aDiffMap.name];
+				}
+				Report("Object "+name+": Vertex Deltas '"+aDiffMap.name+"' change " + loadDiffMapL.Count + " out of " + baseMesh.Length + " verts...", 2);
+				morphShapesData.Add (loadDiffMap);
+				morphShapesLinks.Add (loadDiffMapL);
+				continue;
+			}
+			
 			// And get the parts of it we need for processing...
 			Texture2D diffMapImage = aDiffMap.image; 
 			Vector3 diffMapScale = aDiffMap.scale;
 			
+			Color[] pixels;
+			if (!imagePixels.TryGetValue(diffMapImage, out pixels)) {
+				pixels = diffMapImage.GetPixels();
+				imagePixels.Add(diffMapImage, pixels);
+			}
+			
+			// Half and float maps (OpenEXR) hold offsets finer than one 8 bit step, which must not count as untouched.
+			bool highPrecision = diffMapImage.format == TextureFormat.RGBAHalf || diffMapImage.format == TextureFormat.RGBAFloat;
+			float levels = highPrecision ? 65535 : 255;
+			
+			// Where the map sits in the image, a map without atlas rect fills all of it
+			bool packed = aDiffMap.atlasRect.width > 0 && aDiffMap.atlasRect.height > 0;
+			Rect rect = packed ? aDiffMap.atlasRect : new Rect(0, 0, diffMapImage.width, diffMapImage.height);
+			Vector2 mapSize = (packed && aDiffMap.mapSize != Vector2.zero) ? aDiffMap.mapSize : new Vector2(rect.width, rect.height);
+			Vector2 mapOffset = packed ? aDiffMap.mapOffset : Vector2.zero;
+			int rectX = (int)rect.x;
+			int rectY = (int)rect.y;
+			int rectWidth = (int)rect.width;
+			int rectHeight = (int)rect.height;
+			
 			// We now read the mesh, uv, and Diff Map to get the shape data. and store it.
 			for (int vert = 0 ; vert < baseUVs.Length ; vert++) {
-				int UV_x = (int)Mathf.Round(baseUVs[vert].x * diffMapImage.width);
-				int UV_y = (int)Mathf.Round(baseUVs[vert].y * diffMapImage.height);
+				int UV_x = (int)Mathf.Round(baseUVs[vert].x * mapSize.x - mapOffset.x);
+				int UV_y = (int)Mathf.Round(baseUVs[vert].y * mapSize.y - mapOffset.y);
+				
+				if (packed) {
+					// Outside the rect the map is neutral
+					if (UV_x < 0 || UV_y < 0 || UV_x >= rectWidth || UV_y >= rectHeight) {
+						continue;
+					}
+				} else {
+					UV_x = Mathf.Clamp(UV_x, 0, rectWidth - 1);
+					UV_y = Mathf.Clamp(UV_y, 0, rectHeight - 1);
+				}
+				Color pixel = pixels[(rectY + UV_y) * diffMapImage.width + rectX + UV_x];
 
 				// These 
-				int test_x = (int)Mathf.Round((diffMapImage.GetPixel(UV_x, UV_y).r - 0.5f) * 255);
-				int test_y = (int)Mathf.Round((diffMapImage.GetPixel(UV_x, UV_y).g - 0.5f) * 255);
-				int test_z = (int)Mathf.Round((diffMapImage.GetPixel(UV_x, UV_y).b - 0.5f) * 255);
+				int test_x = (int)Mathf.Round((pixel.r - 0.5f) * levels);
+				int test_y = (int)Mathf.Round((pixel.g - 0.5f) * levels);
+				int test_z = (int)Mathf.Round((pixel.b - 0.5f) * levels);
 				
 				if ( !(test_x == 0 && test_y == 0 && test_z == 0) ) {
 					// Okay, now we grab the color data for the pixel under the UV point for this vert.  We then convert it to a number from -1.0 to 1.0, and multiply it by Diff_Map_Scale.
-					float UVC_r = ((diffMapImage.GetPixel(UV_x, UV_y).r / 0.5f)  - 1 ) * -1 * diffMapScale.x; // Why -1?  Because the relation to blender is reversed for some reason...
-					float UVC_g = ((diffMapImage.GetPixel(UV_x, UV_y).g / 0.5f)  - 1 ) * diffMapScale.y;
-					float UVC_b = ((diffMapImage.GetPixel(UV_x, UV_y).b / 0.5f)  - 1 ) * diffMapScale.z;
+					float UVC_r = ((pixel.r / 0.5f)  - 1 ) * -1 * diffMapScale.x; // Why -1?  Because the relation to blender is reversed for some reason...
+					float UVC_g = ((pixel.g / 0.5f)  - 1 ) * diffMapScale.y;
+					float UVC_b = ((pixel.b / 0.5f)  - 1 ) * diffMapScale.z;
 					
 					Vector3 vert_xyz_shift = new Vector3 (UVC_r, UVC_g, UVC_b);
 
@@ -213,14 +325,22 @@ public class MetaMorph : MonoBehaviour {
 	void LoadAnimationRecordings() {
 		Report("Loading Animation Recordings", 1);
 		morphAnimationData = new List<List<List<string>>> ();
+		morphAnimationBinary = new List<BinaryAnimation> ();
 		for (int fileloop = 0; fileloop <  animationRecordings.Length; fileloop++) {
 			AnimationRecording ar = animationRecordings[fileloop];
 			
-			List<List<string>> animationArray = ReadAnimationFile(ar.text);
+			List<List<string>> animationArray = null;
+			BinaryAnimation binaryAnimation = null;
+			if (IsAnimationBinary(ar.text)) {
+				binaryAnimation = ReadAnimationBinary(ar.text);
+			} else {
+				animationArray = ReadAnimationFile(ar.text);
+			}
 			
 			// Okay, we have the data for this animation kit...
 			// Let's store it!
 			morphAnimationData.Add(animationArray);
+			morphAnimationBinary.Add(binaryAnimation);
 			// Now it's stored in the format: Morph_Sequence_Data[animationset][frame1-xxx][name/amountmorph]
 		}
 	}
@@ -236,6 +356,8 @@ public class MetaMorph : MonoBehaviour {
 
 		for (int line = 0 ; line < Total_Array.Length ; line=line+1) {
 			string lineString = Total_Array[line];
+			// With "Per Axis Scale" line two holds the scale of every axis, [[x, y, z], ...]
+			bool axisScales = animationArray.Count == 2 && lineString.Contains("[[");
 
 			// parse out all the crap.
 			Match boo = Regex.Match(lineString,"(\\[|\\])");
@@ -265,6 +387,18 @@ public class MetaMorph : MonoBehaviour {
 					}
 					animationArray.Add(lineArray2);
 					
+				} else if (axisScales) {
+					List<string> multipliers = new List<string>();
+					for (item = 0 ; item < animationArray[0].Count ; item=item+1) {
+						Vector3 axes = new Vector3(float.Parse(lineArray[item * 3]), float.Parse(lineArray[item * 3 + 1]), float.Parse(lineArray[item * 3 + 2]));
+						float multiplier = Mathf.Max(axes.x, Mathf.Max(axes.y, axes.z));
+						multipliers.Add(multiplier.ToString("R"));
+						int Found3 = FindName( diffMaps, animationArray[0][item] );
+						if ( Found3 != -1) {
+							SetDiffMapScale(Found3, multiplier, axes);
+						}
+					}
+					animationArray.Add(multipliers);
 				} else {
 					for (item = 0 ; item < lineArray.Length ; item=item+1) {
 						int Found2 = FindName( diffMaps, animationArray[0][item] );
@@ -282,6 +416,257 @@ public class MetaMorph : MonoBehaviour {
 		return animationArray;
 	}
 
+	bool IsAnimationBinary(TextAsset datafile) {
+		// Binary animations (.bytes) start with the magic 'MMAN'.
+		byte[] data = datafile.bytes;
+		return data.Length >= 4 && data[0] == 'M' && data[1] == 'M' && data[2] == 'A' && data[3] == 'N';
+	}
+
+	BinaryAnimation ReadAnimationBinary(TextAsset datafile) {
+		// This reads the compact binary animations written with the exporter's "Binary Animation" option.
+		// The file comes in with a single read, and the weights stay floats for playback.
+		Report("Loading Binary Animation Recording: " + datafile.name, 2);
+
+		BinaryReader reader = new BinaryReader(new MemoryStream(datafile.bytes));
+		reader.ReadBytes(4); // magic
+		reader.ReadUInt16(); // version
+		int encoding = reader.ReadByte(); // 0 = uint8, 1 = uint16, 2 = float16
+		int flags = reader.ReadByte(); // 1 = delta coded and zlib compressed tracks, 2 = sparse keys, 4 = keys hold until the next one, 8 = per axis scales
+		int keyCount = (int)reader.ReadUInt32();
+		int frameCount = (int)reader.ReadUInt32();
+
+		BinaryAnimation recording = new BinaryAnimation();
+		recording.frameCount = frameCount;
+		recording.indexes = new int[keyCount];
+		recording.multipliers = new float[keyCount];
+		recording.tracks = new AnimationTrack[keyCount];
+		float[] minimum = new float[keyCount];
+		float[] maximum = new float[keyCount];
+
+		for (int key = 0 ; key < keyCount ; key++) {
+			string keyName = Encoding.UTF8.GetString(reader.ReadBytes(reader.ReadUInt16()));
+			float scale = reader.ReadSingle();
+			Vector3 axes = new Vector3(scale, scale, scale);
+			if ((flags & 8) != 0) {
+				axes = new Vector3(scale, reader.ReadSingle(), reader.ReadSingle());
+				scale = Mathf.Max(axes.x, Mathf.Max(axes.y, axes.z));
+			}
+			minimum[key] = reader.ReadSingle();
+			maximum[key] = reader.ReadSingle();
+
+			recording.multipliers[key] = scale;
+
+			int Found = FindName( diffMaps, keyName );
+			recording.indexes[key] = Found; // The diff map indexes.  Faster than name lookups per frame.
+			if ( Found != -1) {
+				SetDiffMapScale(Found, scale, axes);
+			} else {
+				Report("ERROR: Morph not found" + keyName, 0);
+				Debug.Break();
+			}
+		}
+
+		// Tracks are stored per key, and kept that way.
+		bool sparse = (flags & 2) != 0;
+		int valueSize = (encoding == 0) ? 1 : 2;
+		int mask = (encoding == 0) ? 0xff : 0xffff;
+		for (int key = 0 ; key < keyCount ; key++) {
+			// Sparse tracks only hold some frames, with their frame numbers in front of the values.
+			int valueCount = sparse ? (int)reader.ReadUInt32() : frameCount;
+			int keySize = sparse ? valueCount * 4 : 0;
+
+			byte[] track;
+			if ((flags & 1) != 0) {
+				int length = (int)reader.ReadUInt32();
+				track = Inflate(reader.ReadBytes(length), keySize + valueCount * valueSize);
+			} else {
+				track = reader.ReadBytes(keySize + valueCount * valueSize);
+			}
+
+			int[] keyFrames = sparse ? new int[valueCount] : null;
+			float[] keyValues = new float[valueCount];
+			float step = (maximum[key] - minimum[key]) / mask;
+			int previous = 0;
+			int previousFrame = 0;
+			for (int item = 0 ; item < valueCount ; item++) {
+				if (sparse) {
+					keyFrames[item] = BitConverter.ToInt32(track, item * 4);
+					if ((flags & 1) != 0) {
+						keyFrames[item] += previousFrame;
+						previousFrame = keyFrames[item];
+					}
+				}
+
+				int offset = keySize + item * valueSize;
+				int value = (valueSize == 1) ? track[offset] : (track[offset] | (track[offset + 1] << 8));
+				if ((flags & 1) != 0) {
+					value = (value + previous) & mask;
+					previous = value;
+				}
+
+				if (encoding == 2) {
+					keyValues[item] = HalfToFloat(value);
+				} else {
+					keyValues[item] = minimum[key] + value * step;
+				}
+			}
+
+			// Sparse keys stay as they are, playback interpolates between them (or holds them).
+			AnimationTrack animationTrack = new AnimationTrack();
+			animationTrack.frames = keyFrames;
+			animationTrack.values = keyValues;
+			animationTrack.step = (flags & 4) != 0;
+			recording.tracks[key] = animationTrack;
+		}
+
+		return recording;
+	}
+
+	void SetDiffMapScale(int map, float multiplier, Vector3 axes) {
+		// The first animation file naming a map sets its multiplier, unless it was set by hand or by the vertex deltas.
+		// Maps exported with "Per Axis Scale" span every axis on its own: the multiplier is the largest axis, and
+		// the morph data is scaled by the other axes relative to it, unless the scale was set by hand.
+		DiffMap aDiffMap = diffMaps[map];
+		if (aDiffMap.multiplier != 0) {
+			return;
+		}
+		aDiffMap.multiplier = multiplier;
+		if (multiplier <= 0 || axes == new Vector3(multiplier, multiplier, multiplier) || aDiffMap.scale != new Vector3(1,1,1)) {
+			return;
+		}
+		aDiffMap.scale = axes / multiplier;
+		List<Vector3> shape = morphShapesData[map];
+		for (int item = 0 ; item < shape.Count ; item++) {
+			shape[item] = Vector3.Scale(shape[item], aDiffMap.scale);
+		}
+	}
+
+	void ReadVertexDeltas(TextAsset datafile, Vector2[] baseUVs, List<string> names, Dictionary<string, List<Vector3>> data, Dictionary<string, List<int>> links, Dictionary<string, float> multipliers) {
+		// This reads the per vertex offsets written with the exporter's "Vertex Deltas" option.
+		// Unity splits the Blender vertices along UV seams, so every vert is first linked to its Blender vertex through its UV.
+		// After that each key is a couple of block copies, no textures involved.
+		Report("Loading Vertex Deltas: " + datafile.name, 1);
+
+		BinaryReader reader = new BinaryReader(new MemoryStream(datafile.bytes));
+		reader.ReadBytes(4); // magic 'MMVD'
+		reader.ReadUInt16(); // version
+		int encoding = reader.ReadByte(); // 0 = int16, 1 = float16
+		reader.ReadByte(); // flags
+		int vertexCount = (int)reader.ReadUInt32();
+		int entryCount = (int)reader.ReadUInt32();
+		int keyCount = (int)reader.ReadUInt32();
+
+		Dictionary<Vector2, int> uvVertex = new Dictionary<Vector2, int>();
+		for (int entry = 0 ; entry < entryCount ; entry++) {
+			Vector2 uv = UVKey(new Vector2(reader.ReadSingle(), reader.ReadSingle()));
+			int vertex = (int)reader.ReadUInt32();
+			if (!uvVertex.ContainsKey(uv)) {
+				uvVertex.Add(uv, vertex);
+			}
+		}
+
+		// The verts of every Blender vertex
+		List<int>[] vertexVerts = new List<int>[vertexCount];
+		int unlinked = 0;
+		for (int vert = 0 ; vert < baseUVs.Length ; vert++) {
+			int vertex;
+			if (uvVertex.TryGetValue(UVKey(baseUVs[vert]), out vertex) && vertex < vertexCount) {
+				if (vertexVerts[vertex] == null) {
+					vertexVerts[vertex] = new List<int>();
+				}
+				vertexVerts[vertex].Add(vert);
+			} else {
+				unlinked++;
+			}
+		}
+		if (unlinked > 0) {
+			Report("WARNING: " + unlinked + " verts have no matching UV in " + datafile.name, 0);
+		}
+
+		for (int key = 0 ; key < keyCount ; key++) {
+			string keyName = Encoding.UTF8.GetString(reader.ReadBytes(reader.ReadUInt16()));
+			Vector3 scale = new Vector3(reader.ReadSingle(), reader.ReadSingle(), reader.ReadSingle());
+			int moved = (int)reader.ReadUInt32();
+
+			// Both blocks are little endian, like every platform Unity runs on.
+			int[] indexes = new int[moved];
+			Buffer.BlockCopy(reader.ReadBytes(moved * 4), 0, indexes, 0, moved * 4);
+			short[] values = new short[moved * 3];
+			Buffer.BlockCopy(reader.ReadBytes(moved * 6), 0, values, 0, moved * 6);
+
+			// Offsets are stored per axis scale, the diff maps use one scale as multiplier for all axes.
+			float multiplier = Mathf.Max(scale.x, Mathf.Max(scale.y, scale.z));
+			if (multiplier > 0) {
+				scale = scale / multiplier;
+			}
+
+			List<Vector3> morph = new List<Vector3>();
+			List<int> link = new List<int>();
+			for (int item = 0 ; item < moved ; item++) {
+				List<int> verts = vertexVerts[indexes[item]];
+				if (verts == null) {
+					continue;
+				}
+				float x, y, z;
+				if (encoding == 0) {
+					x = values[item * 3] / 32767.0f;
+					y = values[item * 3 + 1] / 32767.0f;
+					z = values[item * 3 + 2] / 32767.0f;
+				} else {
+					x = HalfToFloat(values[item * 3] & 0xffff);
+					y = HalfToFloat(values[item * 3 + 1] & 0xffff);
+					z = HalfToFloat(values[item * 3 + 2] & 0xffff);
+				}
+				// Same axes the diff maps end up with.
+				Vector3 shift = new Vector3(x * scale.x, -y * scale.y, -z * scale.z);
+				for (int vert = 0 ; vert < verts.Count ; vert++) {
+					morph.Add(shift);
+					link.Add(verts[vert]);
+				}
+			}
+
+			names.Add(keyName);
+			data[keyName] = morph;
+			links[keyName] = link;
+			multipliers[keyName] = multiplier;
+		}
+	}
+
+	Vector2 UVKey(Vector2 uv) {
+		// UVs are matched on a 1/65536 grid, so tiny float differences from the import don't break the link.
+		return new Vector2(Mathf.Round(uv.x * 65536), Mathf.Round(uv.y * 65536));
+	}
+
+	byte[] Inflate(byte[] compressed, int size) {
+		// zlib data is a 2 byte header followed by a raw deflate stream (and a checksum we don't check).
+		byte[] output = new byte[size];
+		using (DeflateStream stream = new DeflateStream(new MemoryStream(compressed, 2, compressed.Length - 2), CompressionMode.Decompress)) {
+			int read = 0;
+			while (read < size) {
+				int count = stream.Read(output, read, size - read);
+				if (count <= 0) {
+					break;
+				}
+				read += count;
+			}
+		}
+		return output;
+	}
+
+	float HalfToFloat(int half) {
+		int exponent = (half >> 10) & 0x1f;
+		int mantissa = half & 0x3ff;
+		float value;
+		if (exponent == 0) {
+			value = mantissa * Mathf.Pow(2, -24);
+		} else if (exponent == 31) {
+			value = (mantissa == 0) ? float.PositiveInfinity : float.NaN;
+		} else {
+			value = (1.0f + mantissa / 1024.0f) * Mathf.Pow(2, exponent - 15);
+		}
+		return ((half & 0x8000) != 0) ? -value : value;
+	}
+
 	void InitMetaMorph () {
 		//metaMorphSettings = new MetaMorphSettings ();
 
@@ -429,7 +814,8 @@ public class MetaMorph : MonoBehaviour {
 			int animIndex = currentlyActiveAnimations[CAALoop].link;
 			
 			int Frame = Time2Frame( Time.realtimeSinceStartup - currentlyActiveAnimations[CAALoop].CAAStartTime, currentlyActiveAnimations[CAALoop].CAASpeed);
-			int endFrame = morphAnimationData[animIndex].Count - 4;
+			BinaryAnimation binaryAnimation = morphAnimationBinary[animIndex];
+			int endFrame = (binaryAnimation != null) ? binaryAnimation.frameCount - 1 : morphAnimationData[animIndex].Count - 4;
 			
 			// Remember Animation styles?  This is where we process them.
 			if (Frame > endFrame ) {
@@ -461,22 +847,43 @@ public class MetaMorph : MonoBehaviour {
 				}
 			}
 			
-			// Grabbing the data for adding to the morph list...
-			List<string> morphIndexes  = morphAnimationData[animIndex][1]; // Indexes of the Diffmaps we're using.
-			List<string> morphPowers = morphAnimationData[animIndex][2]; // frames start on line 3 (from line 0)...
-			List<string> morphLevels = morphAnimationData[animIndex][Frame+3]; // frames start on line 3 (from line 0)...
-			
-			for(int MADLoop = 0; MADLoop < morphIndexes.Count; MADLoop++) {
-				float morphPower = float.Parse(morphPowers[MADLoop]) * float.Parse(morphLevels[MADLoop]) * fadeOut;
+			if (binaryAnimation != null) {
+				// Binary recordings are floats already, nothing is parsed per frame.
+				for(int key = 0; key < binaryAnimation.indexes.Length; key++) {
+					int morphIndex = binaryAnimation.indexes[key];
+					if (morphIndex == -1) {
+						continue;
+					}
+					float morphPower = binaryAnimation.multipliers[key] * binaryAnimation.tracks[key].Weight(Frame) * fadeOut;
+					
+					if ( !Mathf.Approximately( morphPower, 0.0f ) ) {
+						MorphItem morphItem = new MorphItem ();
+						morphItem.ShapeMorph = listToArray(morphShapesData[morphIndex]);	// section 0
+						morphItem.ShapeLink = listToArray(morphShapesLinks[morphIndex]);	// section 1
+						morphItem.ShapePower = morphPower;		// section 2
+
+						morphArray.Add(morphItem);
+						meshChanged = 2;
+					}
+				}
+			} else {
+				// Grabbing the data for adding to the morph list...
+				List<string> morphIndexes  = morphAnimationData[animIndex][1]; // Indexes of the Diffmaps we're using.
+				List<string> morphPowers = morphAnimationData[animIndex][2]; // frames start on line 3 (from line 0)...
+				List<string> morphLevels = morphAnimationData[animIndex][Frame+3]; // frames start on line 3 (from line 0)...
 				
-				if ( !Mathf.Approximately( morphPower, 0.0f ) ) {
-					MorphItem morphItem = new MorphItem ();
-					morphItem.ShapeMorph = listToArray(morphShapesData[int.Parse(morphIndexes[MADLoop])]);									// section 0
-					morphItem.ShapeLink = listToArray(morphShapesLinks[int.Parse(morphIndexes[MADLoop])]);									// section 1
-					morphItem.ShapePower = morphPower;		// section 2
+				for(int MADLoop = 0; MADLoop < morphIndexes.Count; MADLoop++) {
+					float morphPower = float.Parse(morphPowers[MADLoop]) * float.Parse(morphLevels[MADLoop]) * fadeOut;
+					
+					if ( !Mathf.Approximately( morphPower, 0.0f ) ) {
+						MorphItem morphItem = new MorphItem ();
+						morphItem.ShapeMorph = listToArray(morphShapesData[int.Parse(morphIndexes[MADLoop])]);									// section 0
+						morphItem.ShapeLink = listToArray(morphShapesLinks[int.Parse(morphIndexes[MADLoop])]);									// section 1
+						morphItem.ShapePower = morphPower;		// section 2
 
-					morphArray.Add(morphItem);	
-					meshChanged = 2;
+						morphArray.Add(morphItem);	
+						meshChanged = 2;
+					}
 				}
 			}
 			
@@ -0,0 +1,24 @@
+bl_info = {
+    "name": "Export to MetaMorph for Unity",
+    "author": "Foolish Frost / Ivo Grigull, Karl Lattimer",
+    "version": (1, 2, 0),
+    "blender": (2, 7, 4),
+    "api": 36079,
+    "location": "Export Shape Key Animation for MetaMorph",
+    "description": "Creates Diff Maps as TGA files for each Shape Key which can be used with MetaMorph in Unity",
+    "warning": "",
+    "url": "https://github.com/klattimer/io_export_diffmap",
+    "category": "Import-Export"}
+
+__version__ = '1.2.0'
+
+# bpy is only importable inside Blender. The computation modules (delta, ...)
+# do not depend on it, so the package may also be imported headless for
+# testing.
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if bpy is not None:
+    from .export_diffmap import register, unregister
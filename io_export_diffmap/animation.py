@@ -0,0 +1,495 @@
+# Shape key animation sampling
+#
+# All shape key values of a span of frames are sampled once per frame into
+# a frames x keys matrix. Active keys and output rows are then read from the
+# matrix instead of evaluating the scene again per key and per frame.
+
+import array
+import struct
+import sys
+import zlib
+
+from . import encode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Keys never further from 0 than this in a range are left out of it
+ACTIVE_THRESHOLD = 0.0005
+
+
+# Sorted frames covered by any of the ranges, overlapping ranges share
+# their frames
+#   ranges: list of (start, end) tuples, end included
+def range_frames(ranges):
+    frames = set()
+    for start, end in ranges:
+        frames.update(range(start, max(start, end) + 1))
+    return sorted(frames)
+
+
+# Runs of consecutive frames
+#   frames: sorted frame numbers
+# Returns: list of (start, end) tuples, end included
+def frame_spans(frames):
+    spans = []
+    for frame in frames:
+        if spans and spans[-1][1] == frame - 1:
+            spans[-1] = (spans[-1][0], frame)
+        else:
+            spans.append((frame, frame))
+    return spans
+
+
+# Frames x keys matrix of shape key values
+#   frames: frame numbers, as returned by range_frames
+#   names: shape key names, one column each
+class Samples(object):
+
+    def __init__(self, frames, names):
+        self.frames = list(frames)
+        self.names = list(names)
+        self.frame_index = dict((f, i) for i, f in enumerate(self.frames))
+        if numpy is not None:
+            self.values = numpy.zeros((len(self.frames), len(self.names)))
+        else:
+            self.values = [[0.0] * len(self.names) for f in self.frames]
+
+    # Fill one column with the same value on every frame
+    def set_constant(self, column, value):
+        if numpy is not None:
+            self.values[:, column] = value
+        else:
+            for row in self.values:
+                row[column] = value
+
+    # Fill a column by evaluating a curve (anything with evaluate(frame),
+    # e.g. a bpy FCurve) on every frame
+    #   low, high: range to clamp the values to, as Blender clamps a key
+    #              to its slider range (None for no limit)
+    def set_curve(self, column, curve, low=None, high=None):
+        for i, frame in enumerate(self.frames):
+            value = curve.evaluate(frame)
+            if low is not None:
+                value = max(low, value)
+            if high is not None:
+                value = min(high, value)
+            self.values[i][column] = value
+
+    # Set the values of some columns on one frame
+    def set_frame(self, frame, columns, values):
+        row = self.values[self.frame_index[frame]]
+        for column, value in zip(columns, values):
+            row[column] = value
+
+    def _rows(self, start, end):
+        first = self.frame_index[start]
+        if end < start:
+            return first, first
+        return first, self.frame_index[end] + 1
+
+    # Columns whose value exceeds the threshold on any frame of a range,
+    # either way (folded and basis weights can be negative)
+    def active(self, start, end, threshold=ACTIVE_THRESHOLD):
+        first, last = self._rows(start, end)
+        if numpy is not None:
+            mask = (numpy.abs(self.values[first:last]) > threshold).any(axis=0)
+            return [int(i) for i in numpy.flatnonzero(mask)]
+        return [c for c in range(len(self.names))
+                if any(abs(row[c]) > threshold for row in self.values[first:last])]
+
+    # Values of some columns on a frame
+    def row(self, frame, columns):
+        row = self.values[self.frame_index[frame]]
+        return [float(row[c]) for c in columns]
+
+    # Rows of some columns for every frame of a range
+    def rows(self, start, end, columns):
+        first, last = self._rows(start, end)
+        if numpy is not None:
+            return self.values[first:last][:, columns].tolist()
+        return [[row[c] for c in columns] for row in self.values[first:last]]
+
+
+# Samples ranges a block of frames at a time, keeping the rows of frames a
+# later range shares so overlapping ranges sample them once
+#   sample: function (list of (start, end)) -> Samples of those frames
+#   names: shape key names, one column each
+#   ranges: list of (start, end) of every range, in the order they are
+#           sampled
+#   limit: most frames kept, frames over it are sampled again
+class SharedFrames(object):
+
+    def __init__(self, sample, names, ranges, limit):
+        self._sample = sample
+        self.names = list(names)
+        self.ranges = list(ranges)
+        self.limit = max(0, int(limit))
+        self.rows = {}
+
+    # Samples of the frames start..end of a range
+    #   index: position of the range in ranges
+    def sample(self, index, start, end):
+        def shared(frame, ranges):
+            return any(first <= frame <= last for first, last in ranges)
+
+        # Rows neither this range nor a later one needs any more
+        ranges = self.ranges[index:]
+        for frame in [f for f in self.rows if not shared(f, ranges)]:
+            del self.rows[frame]
+
+        frames = list(range(start, end + 1))
+        missing = [f for f in frames if f not in self.rows]
+        fresh = self._sample(frame_spans(missing)) if missing else None
+        if len(missing) == len(frames):
+            samples = fresh
+        else:
+            samples = Samples(frames, self.names)
+            for i, frame in enumerate(frames):
+                row = self.rows.get(frame)
+                if row is None:
+                    row = fresh.values[fresh.frame_index[frame]]
+                samples.values[i] = row if numpy is not None else list(row)
+
+        # Rows a later range needs
+        later = ranges[1:]
+        for frame in missing:
+            if len(self.rows) >= self.limit:
+                break
+            if shared(frame, later):
+                row = fresh.values[fresh.frame_index[frame]]
+                self.rows[frame] = numpy.array(row) if numpy is not None else list(row)
+        return samples
+
+
+# ------------------------------------ track simplification -----------------
+
+SIMPLIFY_MODES = ('NONE', 'KEYS', 'SPANS')
+
+
+# Ramer-Douglas-Peucker reduction of a track sampled once per frame
+#   Keeps the fewest frames so that linear interpolation between them stays
+#   within tolerance of every sample.
+# Returns: sorted list of kept frame offsets (always the first and last)
+def simplify_keys(values, tolerance):
+    count = len(values)
+    if count <= 2:
+        return list(range(count))
+
+    keep = set((0, count - 1))
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        v0 = values[first]
+        slope = (values[last] - v0) / float(last - first)
+        if numpy is not None:
+            segment = numpy.asarray(values[first + 1:last], dtype=numpy.float64)
+            line = v0 + slope * numpy.arange(1, last - first)
+            errors = numpy.abs(segment - line)
+            worst = int(errors.argmax())
+            error = errors[worst]
+            worst += first + 1
+        else:
+            error = -1.0
+            worst = first
+            for i in range(first + 1, last):
+                e = abs(values[i] - (v0 + slope * (i - first)))
+                if e > error:
+                    error = e
+                    worst = i
+        if error > tolerance:
+            keep.add(worst)
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return sorted(keep)
+
+
+# Run length encode a track into spans that stay within tolerance
+#   Every span holds the middle of its smallest and largest value.
+# Returns: list of (frame offset, value), each holding until the next one
+def constant_spans(values, tolerance):
+    spans = []
+    low = high = None
+    start = 0
+    for i, v in enumerate(values):
+        if low is not None and max(high, v) - min(low, v) <= tolerance * 2.0:
+            low = min(low, v)
+            high = max(high, v)
+            continue
+        if low is not None:
+            spans.append((start, (low + high) * 0.5))
+        start = i
+        low = high = v
+    if low is not None:
+        spans.append((start, (low + high) * 0.5))
+    return spans
+
+
+# Simplify every track (column) of frames x keys rows
+#   mode: 'KEYS' (linear keys) or 'SPANS' (constant spans)
+# Returns: list of tracks, each a list of (frame offset, value)
+def simplify_tracks(rows, tolerance, mode='KEYS'):
+    return [simplify_track(values, tolerance, mode) for values in columns(rows)]
+
+
+# Simplify the values of one track
+# Returns: list of (frame offset, value)
+def simplify_track(values, tolerance, mode='KEYS'):
+    values = [float(v) for v in values]
+    if mode == 'SPANS':
+        return constant_spans(values, tolerance)
+    return [(i, values[i]) for i in simplify_keys(values, tolerance)]
+
+
+# Tracks (columns) of frames x keys rows
+def columns(rows):
+    count = len(rows[0]) if len(rows) else 0
+    return [[row[column] for row in rows] for column in range(count)]
+
+
+# Dense values of a simplified track over count frames
+#   step: spans hold their value, otherwise keys are linearly interpolated
+def expand_track(keys, count, step=False):
+    values = []
+    for n in range(len(keys)):
+        frame, value = keys[n]
+        if n + 1 < len(keys):
+            end, next_value = keys[n + 1]
+        else:
+            end, next_value = count, value
+        for i in range(frame, min(end, count)):
+            if step or end == frame:
+                values.append(value)
+            else:
+                values.append(value + (next_value - value) * (i - frame) / float(end - frame))
+    return values
+
+
+# ------------------------------------ binary animation format ---------------
+#
+# Little-endian, read by MetaMorph.cs (ReadAnimationBinary):
+#   char[4]  magic 'MMAN'
+#   uint16   version
+#   uint8    encoding (see ENCODINGS)
+#   uint8    flags (FLAG_DELTA_ZLIB)
+#   uint32   key count
+#   uint32   frame count
+#   per key: uint16 name length, utf-8 name, float32 scale (float32 scale
+#            x, y, z with FLAG_AXIS_SCALES), float32 minimum, float32
+#            maximum (quantization range)
+#   per key: the track of frame count values; with FLAG_DELTA_ZLIB the
+#            values are delta coded (modulo the value size), zlib compressed
+#            and prefixed by their uint32 compressed size
+#
+# uint8/uint16 values map linearly from minimum..maximum to 0..255/65535,
+# float16 values are stored as they are.
+#
+# With FLAG_SPARSE a track is a uint32 key count followed by that many
+# uint32 frame offsets and then that many values (both delta coded and
+# compressed together with FLAG_DELTA_ZLIB). Keys are linearly interpolated,
+# or held until the next key with FLAG_STEP.
+#
+# FLAG_AXIS_SCALES is set for maps exported with Per Axis Scale: every key
+# has the offset of a full color step of each axis, the largest of them
+# being the scale of the other files.
+
+BINARY_MAGIC = b'MMAN'
+BINARY_VERSION = 1
+
+ENCODINGS = {
+    'UINT8': 0,
+    'UINT16': 1,
+    'FLOAT16': 2,
+    }
+
+FLAG_DELTA_ZLIB = 1
+FLAG_SPARSE = 2
+FLAG_STEP = 4
+FLAG_AXIS_SCALES = 8
+
+_ENCODING_TYPES = {0: ('B', 0xff), 1: ('H', 0xffff), 2: ('H', None)}
+
+
+# Quantize one track
+# Returns: tuple (minimum, maximum, array of integers)
+def _encode_track(values, encoding):
+    typecode, levels = _ENCODING_TYPES[encoding]
+    if levels is None:
+        return 0.0, 0.0, encode.half_array(values)
+
+    low = float(min(values)) if len(values) else 0.0
+    high = float(max(values)) if len(values) else 0.0
+    scale = levels / (high - low) if high > low else 0.0
+    if numpy is not None:
+        q = numpy.rint((numpy.asarray(values, dtype=numpy.float64) - low) * scale)
+        data = q.astype(numpy.uint8 if typecode == 'B' else numpy.uint16)
+        return low, high, array.array(typecode, data.tobytes())
+    return low, high, array.array(typecode, [int(round((v - low) * scale)) for v in values])
+
+
+def _decode_track(data, encoding, low, high):
+    typecode, levels = _ENCODING_TYPES[encoding]
+    if levels is None:
+        return [encode.half_to_float(n) for n in data]
+    step = (high - low) / levels
+    return [low + n * step for n in data]
+
+
+# Delta code integer values in place, wrapping around the value size
+def _delta(data, mask):
+    for i in range(len(data) - 1, 0, -1):
+        data[i] = (data[i] - data[i - 1]) & mask
+
+
+def _undelta(data, mask):
+    for i in range(1, len(data)):
+        data[i] = (data[i] + data[i - 1]) & mask
+
+
+# Write tracks in the binary animation format
+#   names, scales: one per key (name and MaxDiffStore value, or (x, y, z)
+#                  scales, see FLAG_AXIS_SCALES)
+#   rows: frames x keys values, e.g. Samples.rows
+#   encoding: one of ENCODINGS
+#   compress: delta code and zlib every track
+#   simplify, tolerance: store simplified tracks, see simplify_tracks
+def write_binary(path, names, scales, rows, encoding='UINT16', compress=True,
+                 simplify='NONE', tolerance=0.0):
+    write_tracks(path, names, scales, columns(rows), len(rows), encoding, compress,
+                 simplify, tolerance)
+
+
+# Write tracks in the binary animation format, one track at a time
+#   tracks: values of every frame per key, any iterable so tracks can be
+#           read from disk one by one
+#   frames: number of frames of every track
+def write_tracks(path, names, scales, tracks, frames, encoding='UINT16', compress=True,
+                 simplify='NONE', tolerance=0.0):
+    code = ENCODINGS[encoding]
+    typecode, levels = _ENCODING_TYPES[code]
+    mask = 0xff if typecode == 'B' else 0xffff
+
+    flags = FLAG_DELTA_ZLIB if compress else 0
+    if simplify != 'NONE':
+        flags |= FLAG_SPARSE
+        if simplify == 'SPANS':
+            flags |= FLAG_STEP
+    axis_scales = bool(scales) and isinstance(scales[0], (tuple, list))
+    if axis_scales:
+        flags |= FLAG_AXIS_SCALES
+
+    header = bytearray(struct.pack('<4sHBBII', BINARY_MAGIC, BINARY_VERSION, code,
+                                   flags, len(names), frames))
+    blobs = bytearray()
+    for column, (name, values) in enumerate(zip(names, tracks)):
+        if flags & FLAG_SPARSE:
+            sparse = simplify_track(values, tolerance, simplify)
+            keys = array.array('I', [k[0] for k in sparse])
+            values = [k[1] for k in sparse]
+        low, high, data = _encode_track(values, code)
+
+        encoded = name.encode('utf-8')
+        header += struct.pack('<H', len(encoded)) + encoded
+        if axis_scales:
+            header += struct.pack('<fffff', scales[column][0], scales[column][1],
+                                  scales[column][2], low, high)
+        else:
+            header += struct.pack('<fff', scales[column], low, high)
+
+        # Delta code the values before putting them in file byte order
+        if compress:
+            _delta(data, mask)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        blob = data.tobytes()
+        if flags & FLAG_SPARSE:
+            blobs += struct.pack('<I', len(keys))
+            if compress:
+                _delta(keys, 0xffffffff)
+            if sys.byteorder != 'little':
+                keys.byteswap()
+            blob = keys.tobytes() + blob
+
+        if compress:
+            packed = zlib.compress(blob)
+            blobs += struct.pack('<I', len(packed)) + packed
+        else:
+            blobs += blob
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(blobs)
+
+
+# Read a file written by write_binary, simplified tracks are expanded
+# Returns: tuple (names, scales, rows), scales as (x, y, z) tuples with
+#          FLAG_AXIS_SCALES
+def read_binary(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, code, flags, count, frames = struct.unpack_from('<4sHBBII', data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not a MetaMorph binary animation: %s" % path)
+    typecode, levels = _ENCODING_TYPES[code]
+    mask = 0xff if typecode == 'B' else 0xffff
+    size = 1 if typecode == 'B' else 2
+    pos = struct.calcsize('<4sHBBII')
+
+    names, scales, ranges = [], [], []
+    for n in range(count):
+        length = struct.unpack_from('<H', data, pos)[0]
+        names.append(data[pos + 2:pos + 2 + length].decode('utf-8'))
+        pos += 2 + length
+        if flags & FLAG_AXIS_SCALES:
+            x, y, z, low, high = struct.unpack_from('<fffff', data, pos)
+            scales.append((x, y, z))
+            pos += 20
+        else:
+            scale, low, high = struct.unpack_from('<fff', data, pos)
+            scales.append(scale)
+            pos += 12
+        ranges.append((low, high))
+
+    tracks = []
+    for low, high in ranges:
+        values = frames
+        if flags & FLAG_SPARSE:
+            values = struct.unpack_from('<I', data, pos)[0]
+            pos += 4
+        length = values * size
+        if flags & FLAG_SPARSE:
+            length += values * 4
+        if flags & FLAG_DELTA_ZLIB:
+            packed = struct.unpack_from('<I', data, pos)[0]
+            raw = zlib.decompress(data[pos + 4:pos + 4 + packed])
+            pos += 4 + packed
+        else:
+            raw = data[pos:pos + length]
+            pos += length
+
+        if flags & FLAG_SPARSE:
+            keys = array.array('I', raw[:values * 4])
+            raw = raw[values * 4:]
+            if sys.byteorder != 'little':
+                keys.byteswap()
+            if flags & FLAG_DELTA_ZLIB:
+                _undelta(keys, 0xffffffff)
+
+        track = array.array(typecode, raw)
+        if sys.byteorder != 'little':
+            track.byteswap()
+        if flags & FLAG_DELTA_ZLIB:
+            _undelta(track, mask)
+        track = _decode_track(track, code, low, high)
+
+        if flags & FLAG_SPARSE:
+            track = expand_track(list(zip(keys, track)), frames, bool(flags & FLAG_STEP))
+        tracks.append(track)
+
+    rows = [[track[f] for track in tracks] for f in range(frames)]
+    return names, scales, rows
@@ -0,0 +1,159 @@
+# Texture atlas packing of diff maps
+#
+# Instead of one image per shape key, the maps (or just the regions they
+# touch, with Crop Maps) are packed into a few power-of-two sheets. Rects
+# are placed with first-fit decreasing height shelf packing.
+
+import array
+import sys
+
+from . import encode
+from . import raster
+from . import writer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _power_of_two(n):
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+# Pack rects into sheets of at most max_size x max_size
+#   sizes: list of (width, height)
+#   padding: free texels kept between rects
+#   A rect larger than max_size gets a sheet of its own.
+# Returns: tuple (placements, sheets) with placements a list of
+#          (sheet, x, y) in the order of sizes and sheets a list of
+#          (width, height), both powers of two
+def pack(sizes, max_size, padding=2):
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placements = [None] * len(sizes)
+    # per sheet: list of shelves [y, height, next x], used width and height
+    sheets = []
+
+    for i in order:
+        width, height = sizes[i]
+        placed = False
+        for sheet_index, sheet in enumerate(sheets):
+            shelves = sheet['shelves']
+            for shelf in shelves:
+                if height <= shelf[1] and shelf[2] + width <= sheet['size']:
+                    placements[i] = (sheet_index, shelf[2], shelf[0])
+                    shelf[2] += width + padding
+                    placed = True
+                    break
+            if placed:
+                break
+            top = shelves[-1][0] + shelves[-1][1] + padding if shelves else 0
+            if top + height <= sheet['size'] and width <= sheet['size']:
+                shelves.append([top, height, width + padding])
+                placements[i] = (sheet_index, 0, top)
+                placed = True
+                break
+
+        if not placed:
+            size = max(max_size, _power_of_two(max(width, height)))
+            sheets.append({'size': size, 'shelves': [[0, height, width + padding]]})
+            placements[i] = (len(sheets) - 1, 0, 0)
+
+    # Shrink every sheet to the power of two holding what was placed on it
+    used = [[1, 1] for sheet in sheets]
+    for (sheet, x, y), (width, height) in zip(placements, sizes):
+        used[sheet][0] = max(used[sheet][0], x + width)
+        used[sheet][1] = max(used[sheet][1], y + height)
+    return placements, [(_power_of_two(w), _power_of_two(h)) for w, h in used]
+
+
+# Collects the maps of an export and writes them as atlas sheets
+#   Maps are kept at the precision of the sheets' file format, a quarter
+#   (8 bit) or half (16 bit) of their float size, until the sheets are
+#   written.
+#   file_format: one of encode.EXTENSIONS
+#   background: color of texels not covered by any map
+class AtlasBuilder(object):
+
+    def __init__(self, max_size=4096, padding=2, background=(0.5, 0.5, 0.5),
+                 file_format='TGA'):
+        self.max_size = max_size
+        self.padding = padding
+        self.background = background
+        self.file_format = file_format
+        self.maps = []
+
+    # Add the pixels of one map (see pipeline.render_key)
+    def add(self, name, pixels, width, height):
+        self.maps.append((name, _quantize(pixels, self.file_format), width, height))
+
+    # Pack all maps and write the sheets
+    #   path_for_sheet: function returning the file path of a sheet index
+    # Returns: dict of map name -> (sheet path, x, y, width, height)
+    def write(self, path_for_sheet):
+        placements, sheets = pack([(m[2], m[3]) for m in self.maps],
+                                  self.max_size, self.padding)
+        result = {}
+        for sheet_index, (sheet_width, sheet_height) in enumerate(sheets):
+            pixels = raster.place([], (0, 0, 0, 0), sheet_width, sheet_height,
+                                  self.background)
+            for (name, data, width, height), placement in zip(self.maps, placements):
+                sheet, x, y = placement
+                if sheet != sheet_index:
+                    continue
+                _blit(pixels, sheet_width, _dequantize(data, self.file_format),
+                      x, y, width, height)
+                result[name] = (path_for_sheet(sheet_index), x, y, width, height)
+
+            path = path_for_sheet(sheet_index)
+            writer.write_atomic(path, encode.write_image, pixels, sheet_width, sheet_height,
+                                self.file_format)
+            print(" exported %s" % path)
+        return result
+
+
+# Samples of an RGB float buffer as a file format stores them: bytes for
+# 8 bit formats, big endian 16 bit words for PNG16, half floats for
+# EXR_HALF and 32 bit floats for EXR_FLOAT
+def _quantize(pixels, file_format):
+    if file_format == 'PNG16':
+        return encode.to_words(pixels)
+    if file_format == 'EXR_HALF':
+        return encode.half_array(pixels)
+    if file_format == 'EXR_FLOAT':
+        return array.array('f', pixels)
+    return encode.to_bytes(pixels)
+
+
+# RGB floats of what _quantize returned, encoding to the same samples again
+def _dequantize(data, file_format):
+    if file_format == 'EXR_FLOAT':
+        return data
+    if numpy is not None:
+        if file_format == 'PNG16':
+            return numpy.frombuffer(data, dtype='>u2').astype(numpy.float32) / numpy.float32(65535.0)
+        if file_format == 'EXR_HALF':
+            return numpy.frombuffer(data, dtype=numpy.float16).astype(numpy.float32)
+        return numpy.frombuffer(data, dtype=numpy.uint8).astype(numpy.float32) / numpy.float32(255.0)
+    if file_format == 'PNG16':
+        words = array.array('H', data)
+        if sys.byteorder == 'little':
+            words.byteswap()
+        return [n / 65535.0 for n in words]
+    if file_format == 'EXR_HALF':
+        return [encode.half_to_float(n) for n in data]
+    return [n / 255.0 for n in bytearray(data)]
+
+
+# Copy a width x height RGB buffer into a sheet at x, y
+def _blit(sheet, sheet_width, pixels, x, y, width, height):
+    if numpy is not None:
+        rows = numpy.asarray(sheet).reshape(-1, sheet_width, 3)
+        rows[y:y + height, x:x + width] = numpy.asarray(pixels).reshape(height, width, 3)
+        return
+    for row in range(height):
+        i = ((y + row) * sheet_width + x) * 3
+        sheet[i:i + width * 3] = array.array('f', pixels[row * width * 3:(row + 1) * width * 3])
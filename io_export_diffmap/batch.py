@@ -0,0 +1,200 @@
+# Headless batch export
+#
+# Exports many objects of many .blend files in a single Blender session:
+#
+#   blender -b --python io_export_diffmap/batch.py -- manifest.json [summary.json]
+#
+# The manifest is a JSON object:
+#
+#   {
+#       "settings": {"width": 512, "imageformat": "PNG"},
+#       "jobs": [
+#           {"blend": "heads/anna.blend", "objects": ["Head", "Eyes"],
+#            "output": "export/anna"},
+#           {"blend": "heads/ben.blend", "object": "Head", "name": "Ben",
+#            "settings": {"animationson": false}}
+#       ]
+#   }
+#
+# Settings are the properties of the export operator (width, height,
+# margin, imageformat, ...), given for all jobs and overridden per job.
+# "output" defaults to the directory of the .blend file and "name" to the
+# object name. Relative paths are relative to the manifest. Jobs on the same
+# .blend file are exported after opening it once.
+#
+# The summary (by default manifest name + '-summary.json') lists the result
+# of every object. Blender exits with status 1 if any of them failed.
+
+import json
+import os
+import sys
+import time
+import traceback
+
+if __name__ == '__main__' and not __package__:
+    # Run as a script by Blender, import the package this file belongs to
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'io_export_diffmap'
+    __import__(__package__)
+
+import bpy
+
+from . import __version__
+from . import export_diffmap
+
+
+# Stand-in for the export operator when there is no UI
+#   values: operator property values
+class BatchSettings(object):
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+        self.messages = []
+
+    def report(self, level, message):
+        self.messages.append({'level': sorted(level)[0], 'message': message})
+
+
+# Default value of every export operator property
+def operator_defaults():
+    operator = export_diffmap.EXPORT_OT_tools_diffmap_exporter
+    try:
+        properties = operator.bl_rna.properties
+    except AttributeError:
+        # Not enabled as an add-on
+        export_diffmap.register()
+        properties = operator.bl_rna.properties
+    return dict((p.identifier, p.default) for p in properties
+                if p.identifier != 'rna_type')
+
+
+# Read a manifest, resolving relative paths and checking the settings
+# Returns: list of (.blend path, list of (object name, output, name, settings))
+#          in manifest order
+def read_manifest(path, defaults):
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p):
+        return os.path.normpath(os.path.join(base, p))
+
+    def check(settings):
+        unknown = sorted(set(settings) - set(defaults))
+        if unknown:
+            raise ValueError("Unknown settings in %s: %s" % (path, ", ".join(unknown)))
+
+    common = manifest.get('settings', {})
+    check(common)
+
+    files = {}
+    order = []
+    for job in manifest.get('jobs', []):
+        blend = resolve(job['blend'])
+        objects = job.get('objects') or [job['object']]
+        output = resolve(job['output']) if 'output' in job else os.path.dirname(blend)
+        settings = dict(common)
+        settings.update(job.get('settings', {}))
+        check(settings)
+
+        if blend not in files:
+            files[blend] = []
+            order.append(blend)
+        for ob in objects:
+            name = job.get('name', ob) if len(objects) == 1 else ob
+            files[blend].append((ob, output, name, settings))
+    return [(blend, files[blend]) for blend in order]
+
+
+# Export one object of the open file
+# Returns: summary entry
+def export_object(ob_name, output, name, settings, defaults):
+    result = {'object': ob_name, 'output': output, 'name': name, 'status': 'failed'}
+    start = time.time()
+
+    values = dict(defaults)
+    values.update(settings)
+    values['filepath'] = output
+    values['name'] = name
+    operator = BatchSettings(values)
+
+    try:
+        scene = bpy.context.scene
+        ob = bpy.data.objects.get(ob_name)
+        if ob is None or ob.name not in scene.objects:
+            raise ValueError("No object %s in the scene" % ob_name)
+        for other in scene.objects:
+            other.select = False
+        ob.select = True
+        scene.objects.active = ob
+
+        if not os.path.exists(output):
+            os.makedirs(output)
+
+        if export_diffmap.main(operator, bpy.context):
+            result['status'] = 'exported'
+            result['keys'] = list(export_diffmap.ShapeKeyName)
+            result['maxdiff'] = list(export_diffmap.MaxDiffStore)
+    except Exception:
+        result['error'] = traceback.format_exc()
+        print(result['error'])
+
+    result['messages'] = operator.messages
+    result['seconds'] = time.time() - start
+    return result
+
+
+# Export everything listed in a manifest and write the summary
+# Returns: the summary
+def run(manifest_path, summary_path=None):
+    if summary_path is None:
+        summary_path = os.path.splitext(manifest_path)[0] + '-summary.json'
+
+    defaults = operator_defaults()
+    start = time.time()
+    summary = {'version': __version__, 'manifest': os.path.abspath(manifest_path),
+               'files': []}
+
+    for blend, objects in read_manifest(manifest_path, defaults):
+        entry = {'blend': blend, 'objects': []}
+        summary['files'].append(entry)
+        print("Opening %s" % blend)
+        try:
+            bpy.ops.wm.open_mainfile(filepath=blend)
+        except Exception:
+            entry['error'] = traceback.format_exc()
+            print(entry['error'])
+            continue
+
+        for ob_name, output, name, settings in objects:
+            entry['objects'].append(export_object(ob_name, output, name, settings, defaults))
+
+    results = [ob for entry in summary['files'] for ob in entry['objects']]
+    summary['exported'] = sum(1 for ob in results if ob['status'] == 'exported')
+    summary['failed'] = (sum(1 for ob in results if ob['status'] != 'exported') +
+                         sum(1 for entry in summary['files'] if 'error' in entry))
+    summary['seconds'] = time.time() - start
+
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print("Exported %d objects, %d failed, summary in %s" %
+          (summary['exported'], summary['failed'], summary_path))
+    return summary
+
+
+# Command line entry, arguments come after '--'
+def main(argv):
+    if '--' in argv:
+        argv = argv[argv.index('--') + 1:]
+    else:
+        argv = []
+    if not argv:
+        print("Usage: blender -b --python batch.py -- manifest.json [summary.json]")
+        sys.exit(2)
+
+    summary = run(argv[0], argv[1] if len(argv) > 1 else None)
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
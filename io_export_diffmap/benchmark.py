@@ -0,0 +1,396 @@
+# Benchmarks of the export pipeline
+#
+# Times the bpy free stages of an export (those of
+# generate_diffmap_from_shape and Write_Animation) on synthetic meshes, so
+# they run from a plain Python interpreter:
+#
+#   python -m io_export_diffmap.benchmark [--preset small medium ...]
+#          [--vertices N --keys N --frames N --size N] [--history path]
+#
+# A synthetic mesh is a UV mapped grid of quads. Every shape key pushes a
+# round patch of the grid in its own direction, like the local keys of a
+# face rig, and is animated by a linear curve through random keyframes
+# (zero most of the time, so ranges leave keys out). Everything is drawn
+# from a seeded random generator: the same settings give the same mesh,
+# keys and animation on every run and with or without NumPy.
+#
+# Every run is appended as one JSON line to the history file (by default
+# benchmark-history.jsonl in the current directory) and compared with the
+# last run of the same settings found there.
+
+import argparse
+import array
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from . import __version__
+from . import animation
+from . import delta
+from . import encode
+from . import pipeline
+from . import raster
+from . import snapshot
+from . import stream
+from . import timing
+from . import vertexdeltas
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Named sizes, from a quick check to a full production head
+PRESETS = {
+    'tiny': {'vertices': 1000, 'keys': 1, 'frames': 100, 'size': 128},
+    'small': {'vertices': 10000, 'keys': 20, 'frames': 500, 'size': 256},
+    'medium': {'vertices': 100000, 'keys': 100, 'frames': 2000, 'size': 512},
+    'large': {'vertices': 1000000, 'keys': 500, 'frames': 10000, 'size': 1024},
+    }
+
+DEFAULTS = {
+    'margin': 2,
+    'format': 'TGA',
+    'ranges': 4,
+    'radius': 0.15,
+    'simplify': 'KEYS',
+    'tolerance': 0.001,
+    'buffer': 256,
+    'mapped': False,
+    'plan': True,
+    'seed': 1,
+    }
+
+
+# Piecewise linear curve through keyframes, evaluated like an FCurve
+#   points: sorted list of (frame, value)
+class Curve(object):
+
+    def __init__(self, points):
+        self.points = points
+
+    def evaluate(self, frame):
+        points = self.points
+        if frame <= points[0][0]:
+            return points[0][1]
+        for (f0, v0), (f1, v1) in zip(points, points[1:]):
+            if frame <= f1:
+                return v0 + (v1 - v0) * (frame - f0) / float(f1 - f0)
+        return points[-1][1]
+
+
+# Snapshot of a UV mapped grid of about 'vertices' vertices with shape keys
+#   keys: number of shape keys
+#   radius: size of the patch moved by a key, in grid widths
+class SyntheticMesh(snapshot.MeshSnapshot):
+
+    def __init__(self, vertices, keys, radius=0.15, seed=1):
+        side = max(2, int(math.ceil(math.sqrt(vertices))))
+        self.side = side
+        rand = random.Random(seed)
+
+        # Basis: a gently waved unit square
+        steps = [i / float(side - 1) for i in range(side)]
+        self.xs = [x for y in steps for x in steps]
+        self.ys = [y for y in steps for x in steps]
+        basis = delta.new_coord_buffer(side * side)
+        for i, (x, y) in enumerate(zip(self.xs, self.ys)):
+            basis[i * 3] = x
+            basis[i * 3 + 1] = y
+            basis[i * 3 + 2] = 0.05 * math.sin(x * 6.0) * math.cos(y * 6.0)
+
+        # One quad per grid cell, corners counter clockwise
+        loops = []
+        for row in range(side - 1):
+            for col in range(side - 1):
+                v = row * side + col
+                loops.extend((v, v + 1, v + side + 1, v + side))
+        polygons = (side - 1) * (side - 1)
+        uvs = []
+        for v in loops:
+            uvs.extend((0.02 + 0.96 * self.xs[v], 0.02 + 0.96 * self.ys[v]))
+        if numpy is not None:
+            self.xs = numpy.asarray(self.xs, dtype=numpy.float32)
+            self.ys = numpy.asarray(self.ys, dtype=numpy.float32)
+            buffers = (numpy.asarray(loops, dtype=numpy.int32),
+                       numpy.asarray(uvs, dtype=numpy.float32),
+                       numpy.arange(0, polygons * 4, 4, dtype=numpy.int32),
+                       numpy.full(polygons, 4, dtype=numpy.int32))
+        else:
+            buffers = (array.array('i', loops), array.array('f', uvs),
+                       array.array('i', range(0, polygons * 4, 4)),
+                       array.array('i', [4] * polygons))
+
+        # Patch center, radius and push of every key
+        names = []
+        self.patches = []
+        for k in range(keys):
+            names.append('Key%03d' % k)
+            center = (rand.random(), rand.random())
+            size = radius * rand.uniform(0.5, 1.5)
+            push = [rand.uniform(-0.1, 0.1) for axis in range(3)]
+            self.patches.append((center, size, push))
+
+        snapshot.MeshSnapshot.__init__(self, basis, names, None, *buffers)
+
+    # Coordinates of a shape key, made on demand so only one key is held
+    def key_coords(self, index):
+        (cx, cy), size, push = self.patches[index]
+        coords = delta.new_coord_buffer(self.vertex_count)
+        if numpy is not None:
+            falloff = 1.0 - ((self.xs - cx) ** 2 + (self.ys - cy) ** 2) / (size * size)
+            weight = numpy.clip(falloff, 0.0, None) ** 2
+            offsets = weight[:, None] * numpy.asarray(push, dtype=numpy.float32)
+            coords[:] = numpy.asarray(self.basis) + offsets.ravel()
+            return coords
+        for i, (x, y) in enumerate(zip(self.xs, self.ys)):
+            falloff = 1.0 - ((x - cx) ** 2 + (y - cy) ** 2) / (size * size)
+            weight = falloff * falloff if falloff > 0 else 0.0
+            for axis in range(3):
+                coords[i * 3 + axis] = self.basis[i * 3 + axis] + weight * push[axis]
+        return coords
+
+    # Animation curve of every key over frames 1..frames
+    def curves(self, frames, seed=1):
+        rand = random.Random(seed + 1)
+        curves = []
+        for k in self.names:
+            points = []
+            frame = 1
+            while frame < frames:
+                value = rand.random() if rand.random() < 0.3 else 0.0
+                points.append((frame, value))
+                frame += rand.randint(5, 30)
+            points.append((frames, 0.0))
+            curves.append(Curve(points))
+        return curves
+
+
+# Split frames 1..frames into consecutive animation ranges
+def split_ranges(frames, count):
+    count = max(1, min(count, frames))
+    bounds = [1 + frames * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(count)]
+
+
+# Diff map stages of one key, as generate_diffmap_from_shape runs them
+#   plan: raster.RasterPlan shared by all keys, or None
+def run_key(mesh, index, triangles, config, output, writer, plan=None):
+    name = mesh.names[index]
+    size = config['size']
+    with timing.stage('key_coords'):
+        coords = mesh.key_coords(index)
+    with timing.stage('deltas', name):
+        diffs = delta.compute_deltas(mesh.basis, coords)
+        scales = delta.axis_maxdiff(diffs)
+    with timing.stage('render', name):
+        pixels, region = pipeline.render_key(diffs, max(scales), mesh.loop_vertices,
+                                             mesh.uvs, triangles, size, size,
+                                             config['margin'], plan=plan)
+    path = os.path.join(output, name + encode.EXTENSIONS[config['format']])
+    with timing.stage('encode', name):
+        encode.write_image(path, pixels, size, size, config['format'])
+    timing.count_file(path)
+    with timing.stage('vertex_deltas', name):
+        writer.add(name, diffs)
+    timing.count('keys_exported')
+    return max(scales)
+
+
+# Animation stages, as Write_Animation runs them
+def run_animation(mesh, scales, config, output):
+    frames = config['frames']
+    ranges = split_ranges(frames, config['ranges'])
+    curves = mesh.curves(frames, config['seed'])
+
+    def sample(start, end):
+        samples = animation.Samples(range(start, end + 1), mesh.names)
+        for column, curve in enumerate(curves):
+            samples.set_curve(column, curve)
+        return samples
+
+    settings = {'simplify': config['simplify'], 'tolerance': config['tolerance']}
+    writer = stream.AnimationWriter(os.path.join(output, 'Animation.json'), mesh.names,
+                                    scales, settings, config['buffer'])
+    for n, (start, end) in enumerate(ranges):
+        with timing.stage('animation_range'):
+            writer.write_range(n, 'Range%d' % n, start, end, sample,
+                               os.path.join(output, 'Range%d-DiffMapAnimation.TXT' % n),
+                               os.path.join(output, 'Range%d-DiffMapAnimation.bytes' % n))
+    writer.close()
+
+
+# Run one benchmark
+#   config: PRESETS entry updated with DEFAULTS
+# Returns: the timing.Report, synthesizing the mesh is not included
+def run(config):
+    mesh = SyntheticMesh(config['vertices'], config['keys'], config['radius'],
+                         config['seed'])
+    snap = mesh
+    output = tempfile.mkdtemp(prefix='diffmap-benchmark-')
+    try:
+        report = timing.start()
+        if config['mapped']:
+            # Keys are written out and paged back in, like Disk Snapshot
+            with timing.stage('snapshot'):
+                snap = snapshot.save(mesh, os.path.join(output, 'DiffMapSnapshot.bin'))
+        with timing.stage('triangulate'):
+            triangles = snap.triangles()
+        timing.count('vertices', snap.vertex_count)
+        timing.count('triangles', len(triangles) // 3)
+        plan = None
+        if config['plan']:
+            with timing.stage('plan'):
+                plan = raster.RasterPlan(snap.uvs, triangles, snap.loop_vertices,
+                                         config['size'], config['size'], config['margin'])
+
+        path = os.path.join(output, 'DiffMapDeltas.bytes')
+        with timing.stage('uv_entries'):
+            uvs, vertices = vertexdeltas.uv_entries(snap.uvs, snap.loop_vertices)
+        writer = vertexdeltas.DeltaWriter(path, snap.vertex_count, uvs, vertices)
+        try:
+            scales = [run_key(snap, k, triangles, config, output, writer, plan)
+                      for k in range(len(snap.names))]
+        except BaseException:
+            writer.discard()
+            raise
+        writer.close()
+        timing.count_file(path)
+
+        run_animation(mesh, scales, config, output)
+        return report
+    finally:
+        timing.finish()
+        if snap is not mesh:
+            snap.close()
+        shutil.rmtree(output, ignore_errors=True)
+
+
+# Fastest time of every stage over several reports
+def best(reports):
+    stages = {}
+    for report in reports:
+        for name, (seconds, calls) in report.stages.items():
+            if name not in stages or seconds < stages[name]['seconds']:
+                stages[name] = {'seconds': seconds, 'calls': calls}
+    return stages
+
+
+# Entry of the history file for a finished benchmark
+def record(name, config, reports):
+    return {
+        'name': name,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'version': __version__,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__ if numpy is not None else None,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'config': config,
+        'repeat': len(reports),
+        'seconds': min(r.seconds for r in reports),
+        'stages': best(reports),
+        'counters': reports[0].counters,
+        }
+
+
+# Last run of the history with the same settings and the same math backend
+def previous(history, entry):
+    if not os.path.exists(history):
+        return None
+    found = None
+    with open(history, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            old = json.loads(line)
+            if (old.get('config') == entry['config'] and
+                    (old.get('numpy') is None) == (entry['numpy'] is None)):
+                found = old
+    return found
+
+
+# Print the stages of a run, next to those of an earlier one if given
+def show(entry, old=None):
+    print("%s: %d vertices, %d keys, %d frames, %dx%d maps, numpy %s" %
+          (entry['name'], entry['counters'].get('vertices', 0), entry['config']['keys'],
+           entry['config']['frames'], entry['config']['size'], entry['config']['size'],
+           entry['numpy'] or 'off'))
+    if old is not None:
+        print("  compared with %s (%s)" % (old['time'], old['version']))
+    rows = sorted(entry['stages'].items()) + [('total', {'seconds': entry['seconds']})]
+    for name, stage in rows:
+        line = "  %-18s %10.3f s" % (name, stage['seconds'])
+        if old is not None:
+            before = old['seconds'] if name == 'total' else old['stages'].get(name, {}).get('seconds')
+            if before:
+                line += "  %10.3f s  x%.2f" % (before, stage['seconds'] / before)
+        print(line)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the diff map export pipeline")
+    parser.add_argument('--preset', nargs='+', choices=sorted(PRESETS),
+                        help="named sizes to run (default: small)")
+    parser.add_argument('--vertices', type=int, help="vertex count of a custom run")
+    parser.add_argument('--keys', type=int, help="shape key count of a custom run")
+    parser.add_argument('--frames', type=int, help="animation length of a custom run")
+    parser.add_argument('--size', type=int, help="diff map width and height of a custom run")
+    parser.add_argument('--format', choices=sorted(encode.EXTENSIONS),
+                        default=DEFAULTS['format'], help="image format of the maps")
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="runs per benchmark, the fastest time of every stage is kept")
+    parser.add_argument('--history', default='benchmark-history.jsonl',
+                        help="JSON lines file the results are appended to")
+    parser.add_argument('--mapped', action='store_true',
+                        help="page keys from a snapshot file (Disk Snapshot)")
+    parser.add_argument('--no-plan', action='store_true',
+                        help="rasterize every key from scratch instead of sharing a plan")
+    parser.add_argument('--no-history', action='store_true',
+                        help="do not read or write the history file")
+    return parser.parse_args(argv)
+
+
+# Benchmarks to run for the command line arguments
+# Returns: list of (name, config)
+def configs(args):
+    custom = dict((k, getattr(args, k)) for k in ('vertices', 'keys', 'frames', 'size')
+                  if getattr(args, k) is not None)
+    names = args.preset or ([] if custom else ['small'])
+    result = [(name, dict(PRESETS[name])) for name in names]
+    if custom:
+        config = dict(PRESETS['small'])
+        config.update(custom)
+        result.append(('custom', config))
+    for name, config in result:
+        for key, value in DEFAULTS.items():
+            config.setdefault(key, value)
+        config['format'] = args.format
+        config['seed'] = args.seed
+        config['mapped'] = args.mapped
+        config['plan'] = not args.no_plan
+    return result
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    for name, config in configs(args):
+        reports = [run(config) for i in range(max(1, args.repeat))]
+        entry = record(name, config, reports)
+        old = None if args.no_history else previous(args.history, entry)
+        show(entry, old)
+        if not args.no_history:
+            with open(args.history, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+if __name__ == '__main__':
+    main()
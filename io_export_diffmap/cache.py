@@ -0,0 +1,107 @@
+# Content-hash cache for incremental re-export
+#
+# A manifest next to the exported files remembers, for every shape key,
+# a hash of everything its diff map depends on (the key's deltas, the UV
+# layout and topology, the map settings and the exporter version) along
+# with the file written and its MaxDiffStore value. Keys whose hash didn't
+# change since the last export are not rendered again.
+
+import hashlib
+import json
+import os
+
+from . import writer
+
+MANIFEST_VERSION = 2
+
+
+def _bytes(buf):
+    if hasattr(buf, 'tobytes'):
+        return buf.tobytes()
+    return bytes(buf)
+
+
+# Hash of everything shared by all keys of an export
+#   buffers: UVs, triangles, loop to vertex index, ... (anything array-like)
+#   settings: dict of map settings (width, height, margin, format, ...)
+def layout_digest(version, buffers, settings):
+    h = hashlib.sha1()
+    h.update(str(version).encode('utf-8'))
+    h.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    for buf in buffers:
+        data = _bytes(buf)
+        h.update(str(len(data)).encode('utf-8'))
+        h.update(data)
+    return h.hexdigest()
+
+
+# Cache manifest of one export
+#   path: manifest file, see manifest_path
+#   layout: layout_digest of the current export
+class Manifest(object):
+
+    def __init__(self, path, layout):
+        self.path = path
+        self.layout = layout
+        self.entries = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except ValueError:
+                print("Ignoring broken cache manifest %s" % path)
+            else:
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data.get('keys', {})
+
+    # Hash of one key's deltas within the current layout
+    def digest(self, deltas):
+        h = hashlib.sha1(self.layout.encode('utf-8'))
+        h.update(_bytes(deltas))
+        return h.hexdigest()
+
+    # Cached result of a key, if its hash matches and its map still exists
+    # Returns: dict with 'path', 'maxdiff', 'region' and 'scales', or None
+    def lookup(self, name, digest):
+        entry = self.entries.get(name)
+        if entry is None or entry.get('hash') != digest:
+            return None
+        if entry.get('path') is not None and not os.path.exists(entry['path']):
+            return None
+        return entry
+
+    # Remember the result of a key
+    #   path: map written (None if the key was skipped)
+    #   scales: per axis color scales, maxdiff on every axis if not given
+    def store(self, name, digest, path, maxdiff, region=None, scales=None):
+        if scales is None:
+            scales = (maxdiff, maxdiff, maxdiff)
+        self.entries[name] = {
+            'hash': digest,
+            'path': path,
+            'maxdiff': maxdiff,
+            'region': list(region) if region is not None else None,
+            'scales': list(scales),
+            }
+
+    # Forget the keys of maps that couldn't be written
+    def discard(self, paths):
+        paths = set(paths)
+        for name, entry in list(self.entries.items()):
+            if entry.get('path') in paths:
+                del self.entries[name]
+
+    # Write the manifest, replacing the old one only once complete
+    def save(self):
+        writer.write_atomic(self.path, self._write)
+
+    def _write(self, path):
+        with open(path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'keys': self.entries},
+                      f, indent=1, sort_keys=True)
+
+
+# Manifest file of an export, stored next to the exported files
+def manifest_path(filepath, name):
+    return os.path.join(filepath, name + '-DiffMapCache.json')
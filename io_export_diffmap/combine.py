@@ -0,0 +1,190 @@
+# Combination key analysis
+#
+# Finds shape keys whose offsets are (within tolerance) weighted sums of
+# the offsets of other keys, like a key made of its left and right halves,
+# combined visemes or keys that only add a corrective to others. Those keys
+# need no diff map of their own: their animated weight is folded into the
+# weights of the keys they are made of (fold_samples).
+#
+# The key offsets are compared through their Gram matrix (dot products of
+# every pair of keys), summed over blocks of vertices so only a slice of
+# every key is read at a time. Each key is then fitted on the others by
+# orthogonal matching pursuit, adding the best correlated key one at a time
+# and refitting the weights by least squares, and the fit is checked on
+# every vertex against the tolerance.
+
+import math
+
+from . import delta
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Floats of all keys held at once while building the Gram matrix
+BLOCK_FLOATS = 8 * 1024 * 1024
+
+
+# Dot products of the offsets of every pair of keys, and the largest
+# offset of every key
+# Returns: tuple (gram, maxdiffs), gram as a list of rows without NumPy
+def gram_matrix(snap):
+    count = len(snap.names)
+    size = len(snap.basis)
+    step = max(3, BLOCK_FLOATS // max(1, count) // 3 * 3)
+
+    if numpy is not None:
+        gram = numpy.zeros((count, count))
+        maxdiffs = numpy.zeros(count)
+        basis = numpy.asarray(snap.basis, dtype=numpy.float64)
+        for first in range(0, size, step):
+            last = min(size, first + step)
+            block = numpy.empty((count, last - first))
+            for i in range(count):
+                block[i] = basis[first:last] - numpy.asarray(snap.key_coords(i)[first:last])
+            gram += block.dot(block.T)
+            if last > first:
+                maxdiffs = numpy.maximum(maxdiffs, numpy.abs(block).max(axis=1))
+        return gram, maxdiffs.tolist()
+
+    gram = [[0.0] * count for i in range(count)]
+    maxdiffs = [0.0] * count
+    for first in range(0, size, step):
+        last = min(size, first + step)
+        block = [[b - c for b, c in zip(snap.basis[first:last], snap.key_coords(i)[first:last])]
+                 for i in range(count)]
+        for i in range(count):
+            maxdiffs[i] = max([maxdiffs[i]] + [abs(n) for n in block[i]])
+            for j in range(i, count):
+                dot = sum(a * b for a, b in zip(block[i], block[j]))
+                gram[i][j] += dot
+                if i != j:
+                    gram[j][i] += dot
+    return gram, maxdiffs
+
+
+# Least squares weights of some keys fitting another one
+#   terms: key indices of the fit, target: key index to fit
+def _fit(gram, terms, target):
+    if numpy is not None:
+        a = gram[numpy.ix_(terms, terms)]
+        b = gram[terms, target]
+        return numpy.linalg.lstsq(a, b, rcond=-1)[0].tolist()
+
+    # Normal equations by Gauss-Jordan elimination, terms are few
+    n = len(terms)
+    rows = [[gram[i][j] for j in terms] + [gram[i][target]] for i in terms]
+    for c in range(n):
+        pivot = max(range(c, n), key=lambda r: abs(rows[r][c]))
+        rows[c], rows[pivot] = rows[pivot], rows[c]
+        if abs(rows[c][c]) < 1e-30:
+            continue
+        for r in range(n):
+            if r != c:
+                f = rows[r][c] / rows[c][c]
+                rows[r] = [x - f * y for x, y in zip(rows[r], rows[c])]
+    return [rows[c][n] / rows[c][c] if abs(rows[c][c]) >= 1e-30 else 0.0 for c in range(n)]
+
+
+# Squared length of what is left of a key after taking off a fit
+def _residual(gram, terms, weights, target):
+    result = gram[target][target]
+    for w, i in zip(weights, terms):
+        result -= 2.0 * w * gram[i][target]
+        for v, j in zip(weights, terms):
+            result += w * v * gram[i][j]
+    return max(0.0, result)
+
+
+# Largest error of a fit on any vertex and axis
+def _max_error(snap, terms, weights, target):
+    error = delta.compute_deltas(snap.basis, snap.key_coords(target))
+    if numpy is not None:
+        error = numpy.asarray(error, dtype=numpy.float64)
+        for w, i in zip(weights, terms):
+            error -= w * numpy.asarray(snap.deltas(i), dtype=numpy.float64)
+        return float(numpy.abs(error).max()) if len(error) else 0.0
+    error = list(error)
+    for w, i in zip(weights, terms):
+        for n, d in enumerate(snap.deltas(i)):
+            error[n] -= w * d
+    return max([abs(n) for n in error] + [0.0])
+
+
+# Find keys that are weighted sums of other keys
+#   tolerance: largest offset error allowed on any vertex and axis
+#   epsilon: keys moving nothing by more than this take no part
+#   max_terms: most keys a combination is made of
+#   Keys are tried from the last one back (combined and corrective keys
+#   usually come after the keys they are made of). Keys used in a
+#   combination are never combinations themselves.
+# Returns: dict of key index -> list of (key index, weight)
+def find_combinations(snap, tolerance, epsilon=0.0, max_terms=4):
+    count = len(snap.names)
+    if count < 2:
+        return {}
+    gram, maxdiffs = gram_matrix(snap)
+    diagonal = [float(gram[i][i]) for i in range(count)]
+
+    active = [i for i in range(count) if maxdiffs[i] > epsilon]
+    combined = {}
+    pinned = set()
+    for target in reversed(active):
+        if target in pinned:
+            continue
+        pool = [i for i in active if i != target and i not in combined and diagonal[i] > 0]
+        terms = []
+        weights = []
+        residual = diagonal[target]
+        while pool and len(terms) < max_terms and residual > tolerance * tolerance:
+            # Key best correlated with what is left of the target
+            best = None
+            for j in pool:
+                c = gram[j][target] - sum(w * gram[j][i] for w, i in zip(weights, terms))
+                score = abs(c) / math.sqrt(diagonal[j])
+                if best is None or score > best[0]:
+                    best = (score, j)
+            pool.remove(best[1])
+            candidate = terms + [best[1]]
+            fitted = _fit(gram, candidate, target)
+            left = _residual(gram, candidate, fitted, target)
+            # Stop once keys only fit noise
+            if left > residual * 0.99:
+                break
+            terms, weights, residual = candidate, fitted, left
+
+        if not terms:
+            continue
+        # The length of what is left bounds the error of every vertex,
+        # check the vertices only when it doesn't settle it
+        if residual > tolerance * tolerance and _max_error(snap, terms, weights, target) > tolerance:
+            continue
+        recipe = [(i, w) for i, w in zip(terms, weights) if abs(w) > 1e-6]
+        combined[target] = recipe
+        pinned.update(i for i, w in recipe)
+    return combined
+
+
+# Fold the sampled weights of combined keys into the keys they are made of
+#   samples: animation.Samples of the exported keys followed by the
+#            combined ones
+#   count: number of exported keys (the first columns)
+#   recipes: list of (column of a combined key, [(column of a term, weight)])
+# Returns: animation.Samples of the exported keys only
+def fold_samples(samples, count, recipes):
+    folded = type(samples)(samples.frames, samples.names[:count])
+    if numpy is not None:
+        values = numpy.asarray(samples.values)
+        folded.values = values[:, :count].copy()
+        for column, terms in recipes:
+            for term, weight in terms:
+                folded.values[:, term] += weight * values[:, column]
+        return folded
+
+    folded.values = [row[:count] for row in samples.values]
+    for row, source in zip(folded.values, samples.values):
+        for column, terms in recipes:
+            for term, weight in terms:
+                row[term] += weight * source[column]
+    return folded
@@ -0,0 +1,129 @@
+# Shape key delta engine
+#
+# Coordinates are handled as flat buffers [x0, y0, z0, x1, y1, z1, ...], the
+# layout filled by foreach_get('co', ...) on mesh.vertices and on
+# shape.data. NumPy is used when available (Blender bundles it), otherwise
+# the same math runs on array.array so it can be used outside Blender.
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Allocate a zeroed float32 buffer for 'count' 3D coordinates
+def new_coord_buffer(count):
+    if numpy is not None:
+        return numpy.zeros(count * 3, dtype=numpy.float32)
+    return array.array('f', bytes(count * 3 * 4))
+
+
+# Read all coordinates of a vertex or shape key collection in one call
+#   data: mesh.vertices or shape.data (anything with foreach_get)
+def read_coords(data, count=None):
+    if count is None:
+        count = len(data)
+    buf = new_coord_buffer(count)
+    data.foreach_get('co', buf)
+    return buf
+
+
+# Per-component offset of the basis against a shape key (basis - shape)
+def compute_deltas(basis, coords):
+    if numpy is not None:
+        return numpy.subtract(basis, coords, dtype=numpy.float32)
+    return array.array('f', [b - c for b, c in zip(basis, coords)])
+
+
+# Largest absolute offset per axis
+# Returns: tuple (max_x, max_y, max_z)
+def axis_maxdiff(deltas):
+    if len(deltas) == 0:
+        return (0.0, 0.0, 0.0)
+    if numpy is not None:
+        axes = numpy.abs(numpy.asarray(deltas).reshape(-1, 3)).max(axis=0)
+        return tuple(float(n) for n in axes)
+    return tuple(max(abs(n) for n in deltas[i::3]) for i in range(3))
+
+
+# Largest absolute offset over all axes, the single scale the diff maps use
+def maxdiff(deltas):
+    return max(axis_maxdiff(deltas))
+
+
+# Convert offsets to colors in the 0..1 range, 0.5 meaning no offset
+#   color = 1.0 - ((diff / maxdiff + 1.0) * 0.5)
+#   maxdiff: one scale for all axes, or a tuple (x, y, z) of per axis
+#            scales (see axis_maxdiff), an axis without offset stays 0.5
+# A shape without any offset gives black, as the exporter always did.
+def delta_colors(deltas, maxdiff):
+    if isinstance(maxdiff, (tuple, list)):
+        if max(maxdiff) <= 0:
+            maxdiff = 0.0
+        else:
+            factors = [0.5 / n if n > 0 else 0.0 for n in maxdiff]
+            if numpy is not None:
+                deltas = numpy.asarray(deltas, dtype=numpy.float32).reshape(-1, 3)
+                return (0.5 - deltas * numpy.asarray(factors, dtype=numpy.float32)).ravel()
+            return array.array('f', [0.5 - n * factors[i % 3] for i, n in enumerate(deltas)])
+
+    if numpy is not None:
+        deltas = numpy.asarray(deltas, dtype=numpy.float32)
+        if maxdiff <= 0:
+            return numpy.zeros_like(deltas)
+        return (0.5 - deltas * (0.5 / maxdiff)).astype(numpy.float32)
+    if maxdiff <= 0:
+        return array.array('f', bytes(len(deltas) * 4))
+    scale = 0.5 / maxdiff
+    return array.array('f', [0.5 - n * scale for n in deltas])
+
+
+# Vertex index of every loop (face corner), read once per export
+#   loops: mesh.loops
+def read_loop_vertices(loops):
+    if numpy is not None:
+        buf = numpy.zeros(len(loops), dtype=numpy.int32)
+    else:
+        buf = array.array('i', bytes(len(loops) * 4))
+    loops.foreach_get('vertex_index', buf)
+    return buf
+
+
+# Spread per-vertex values (3 per vertex) to every loop using that vertex
+# Returns: flat buffer ready for vcol.data.foreach_set('color', ...)
+def loop_colors(colors, loop_vertices):
+    if numpy is not None:
+        colors = numpy.asarray(colors, dtype=numpy.float32).reshape(-1, 3)
+        return colors[numpy.asarray(loop_vertices)].ravel()
+    out = array.array('f')
+    for v in loop_vertices:
+        i = v * 3
+        out.extend(colors[i:i + 3])
+    return out
+
+
+# Vertices moved by more than epsilon on any axis
+# Returns: one flag per vertex
+def affected_vertices(deltas, epsilon=0.0):
+    if numpy is not None:
+        deltas = numpy.abs(numpy.asarray(deltas).reshape(-1, 3))
+        return (deltas > epsilon).any(axis=1)
+    return bytearray(max(abs(deltas[i]), abs(deltas[i + 1]), abs(deltas[i + 2])) > epsilon
+                     for i in range(0, len(deltas), 3))
+
+
+# Copy of offsets with the vertices that aren't affected not moving at all
+#   affected: one flag per vertex, see affected_vertices
+def keep_affected(deltas, affected):
+    if numpy is not None:
+        deltas = numpy.array(deltas, dtype=numpy.float32).reshape(-1, 3)
+        deltas[~numpy.asarray(affected, dtype=bool)] = 0.0
+        return deltas.ravel()
+    out = array.array('f', deltas)
+    still = array.array('f', bytes(12))
+    for v, flag in enumerate(affected):
+        if not flag:
+            out[v * 3:v * 3 + 3] = still
+    return out
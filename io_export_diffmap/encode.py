@@ -0,0 +1,282 @@
+# Image encoders for diff maps
+#
+# Pixels come as flat RGB float buffers in the 0..1 range, bottom row first,
+# as produced by raster.rasterize.
+
+import array
+import struct
+import sys
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Quantize RGB floats to 8 bit, still RGB and bottom row first
+def to_bytes(pixels):
+    if numpy is not None:
+        pixels = numpy.asarray(pixels, dtype=numpy.float32)
+        return (numpy.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8).tobytes()
+    return bytes(int(min(max(n, 0.0), 1.0) * 255.0 + 0.5) for n in pixels)
+
+
+# Quantize RGB floats to 16 bit big endian samples, as PNG stores them
+def to_words(pixels):
+    if numpy is not None:
+        pixels = numpy.asarray(pixels, dtype=numpy.float32)
+        return (numpy.clip(pixels, 0.0, 1.0) * 65535.0 + 0.5).astype('>u2').tobytes()
+    data = array.array('H', [int(min(max(n, 0.0), 1.0) * 65535.0 + 0.5) for n in pixels])
+    if sys.byteorder == 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+# IEEE 754 half precision bits of a float (for when NumPy is missing)
+def float_to_half(value):
+    bits = struct.unpack('<I', struct.pack('<f', value))[0]
+    sign = (bits >> 16) & 0x8000
+    exponent = ((bits >> 23) & 0xff) - 127 + 15
+    mantissa = bits & 0x7fffff
+    if ((bits >> 23) & 0xff) == 0xff:
+        return sign | 0x7c00 | (0x200 if mantissa else 0)
+    if exponent >= 31:
+        return sign | 0x7c00
+    if exponent <= 0:
+        if exponent < -10:
+            return sign
+        mantissa |= 0x800000
+        shift = 14 - exponent
+        half = mantissa >> shift
+        if (mantissa >> (shift - 1)) & 1:
+            half += 1
+        return sign | half
+    half = sign | (exponent << 10) | (mantissa >> 13)
+    if mantissa & 0x1000:
+        half += 1
+    return half
+
+
+# Float value of IEEE 754 half precision bits
+def half_to_float(half):
+    sign = -1.0 if half & 0x8000 else 1.0
+    exponent = (half >> 10) & 0x1f
+    mantissa = half & 0x3ff
+    if exponent == 0:
+        return sign * mantissa * 2.0 ** -24
+    if exponent == 31:
+        return sign * float('inf') if mantissa == 0 else float('nan')
+    return sign * (1.0 + mantissa / 1024.0) * 2.0 ** (exponent - 15)
+
+
+# Half precision bits of a buffer of floats
+# Returns: array.array('H')
+def half_array(values):
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float16).view(numpy.uint16)
+        return array.array('H', data.tobytes())
+    return array.array('H', [float_to_half(v) for v in values])
+
+
+# Swap RGB bytes to the BGR order TGA stores
+def _rgb_to_bgr(data):
+    data = bytearray(data)
+    data[0::3], data[2::3] = data[2::3], data[0::3]
+    return data
+
+
+# File extension of each supported format
+EXTENSIONS = {
+    'TGA': '.tga',
+    'TGA_RLE': '.tga',
+    'PNG': '.png',
+    'PNG16': '.png',
+    'EXR_HALF': '.exr',
+    'EXR_FLOAT': '.exr',
+    }
+
+
+# Lengths of the runs of identical pixels in a row of RGB bytes
+def _runs(row):
+    count = len(row) // 3
+    if numpy is not None:
+        px = numpy.frombuffer(bytes(row), dtype=numpy.uint8).reshape(-1, 3)
+        starts = numpy.flatnonzero((px[1:] != px[:-1]).any(axis=1)) + 1
+        bounds = numpy.concatenate(([0], starts, [count]))
+        return numpy.diff(bounds).tolist()
+    runs = []
+    start = 0
+    for i in range(1, count + 1):
+        if i == count or row[i * 3:i * 3 + 3] != row[start * 3:start * 3 + 3]:
+            runs.append(i - start)
+            start = i
+    return runs
+
+
+# Run length encode one row of BGR bytes into TGA packets
+#   Runs of two or more pixels become run packets, single pixels are
+#   collected into raw packets. Packets hold at most 128 pixels and never
+#   cross rows.
+def _rle_row(row):
+    out = bytearray()
+    raw_start = 0
+    raw_count = 0
+    pos = 0
+
+    def flush_raw():
+        start = raw_start
+        left = raw_count
+        while left > 0:
+            n = min(left, 128)
+            out.append(n - 1)
+            out.extend(row[start * 3:(start + n) * 3])
+            start += n
+            left -= n
+
+    for length in _runs(row):
+        if length == 1:
+            if raw_count == 0:
+                raw_start = pos
+            raw_count += 1
+        else:
+            flush_raw()
+            raw_count = 0
+            pixel = row[pos * 3:pos * 3 + 3]
+            left = length
+            while left > 0:
+                n = min(left, 128)
+                out.append(0x80 | (n - 1))
+                out.extend(pixel)
+                left -= n
+        pos += length
+    flush_raw()
+    return out
+
+
+# Write a 24 bit TGA, run length encoded if rle is set
+def write_tga(path, pixels, width, height, rle=False):
+    header = struct.pack('<BBBHHBHHHHBB',
+                         0,          # no image id
+                         0,          # no color map
+                         10 if rle else 2,  # (rle) true color
+                         0, 0, 0,    # color map spec
+                         0, 0,       # origin
+                         width, height,
+                         24,         # bits per pixel
+                         0)          # bottom-left origin, no alpha
+    data = _rgb_to_bgr(to_bytes(pixels))
+    if rle:
+        stride = width * 3
+        encoded = bytearray()
+        for y in range(height):
+            encoded.extend(_rle_row(data[y * stride:(y + 1) * stride]))
+        data = encoded
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(data)
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return (struct.pack('>I', len(data)) + chunk +
+            struct.pack('>I', zlib.crc32(chunk) & 0xffffffff))
+
+
+# Write an 8 or 16 bit RGB PNG
+def write_png(path, pixels, width, height, level=6, depth=8):
+    data = to_bytes(pixels) if depth == 8 else to_words(pixels)
+    stride = width * 3 * depth // 8
+
+    # PNG stores the top row first, every row prefixed by its filter type
+    raw = bytearray()
+    for y in range(height - 1, -1, -1):
+        raw.append(0)
+        raw.extend(data[y * stride:(y + 1) * stride])
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                                depth, 2, 0, 0, 0)))
+        f.write(_png_chunk(b'IDAT', zlib.compress(bytes(raw), level)))
+        f.write(_png_chunk(b'IEND', b''))
+
+
+def _exr_attribute(name, kind, value):
+    return (name.encode('ascii') + b'\0' + kind.encode('ascii') + b'\0' +
+            struct.pack('<i', len(value)) + value)
+
+
+# Scanlines of RGB floats as EXR stores them: top row first, and within a
+# row all B, then all G, then all R samples
+#   half: half floats instead of 32 bit floats
+# Returns: list of bytes, one per scanline
+def _exr_lines(pixels, width, height, half):
+    if numpy is not None:
+        rows = numpy.asarray(pixels, dtype=numpy.float32).reshape(height, width, 3)
+        planes = rows[::-1, :, ::-1].transpose(0, 2, 1).astype('<f2' if half else '<f4')
+        return [line.tobytes() for line in planes]
+
+    lines = []
+    for y in range(height - 1, -1, -1):
+        row = pixels[y * width * 3:(y + 1) * width * 3]
+        values = list(row[2::3]) + list(row[1::3]) + list(row[0::3])
+        data = half_array(values) if half else array.array('f', values)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        lines.append(data.tobytes())
+    return lines
+
+
+# Write an uncompressed scanline OpenEXR with R, G and B channels
+#   half: store half floats, otherwise 32 bit floats
+def write_exr(path, pixels, width, height, half=True):
+    pixel_type = 1 if half else 2
+    channels = b''
+    for name in (b'B', b'G', b'R'):
+        channels += name + b'\0' + struct.pack('<iB3xii', pixel_type, 0, 1, 1)
+    channels += b'\0'
+    window = struct.pack('<iiii', 0, 0, width - 1, height - 1)
+
+    header = bytearray(struct.pack('<ii', 20000630, 2))
+    header += _exr_attribute('channels', 'chlist', channels)
+    header += _exr_attribute('compression', 'compression', b'\0')
+    header += _exr_attribute('dataWindow', 'box2i', window)
+    header += _exr_attribute('displayWindow', 'box2i', window)
+    header += _exr_attribute('lineOrder', 'lineOrder', b'\0')
+    header += _exr_attribute('pixelAspectRatio', 'float', struct.pack('<f', 1.0))
+    header += _exr_attribute('screenWindowCenter', 'v2f', struct.pack('<ff', 0.0, 0.0))
+    header += _exr_attribute('screenWindowWidth', 'float', struct.pack('<f', 1.0))
+    header += b'\0'
+
+    # Offset table of the scanlines, each one is its own chunk
+    lines = _exr_lines(pixels, width, height, half)
+    offsets = bytearray()
+    position = len(header) + 8 * height
+    for line in lines:
+        offsets += struct.pack('<Q', position)
+        position += 8 + len(line)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(offsets)
+        for y, line in enumerate(lines):
+            f.write(struct.pack('<ii', y, len(line)))
+            f.write(line)
+
+
+# Write pixels in one of the formats of EXTENSIONS
+def write_image(path, pixels, width, height, file_format='TGA'):
+    if file_format == 'PNG':
+        write_png(path, pixels, width, height)
+    elif file_format == 'PNG16':
+        write_png(path, pixels, width, height, depth=16)
+    elif file_format == 'EXR_HALF':
+        write_exr(path, pixels, width, height, half=True)
+    elif file_format == 'EXR_FLOAT':
+        write_exr(path, pixels, width, height, half=False)
+    elif file_format == 'TGA_RLE':
+        write_tga(path, pixels, width, height, rle=True)
+    else:
+        write_tga(path, pixels, width, height)
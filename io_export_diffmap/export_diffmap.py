@@ -0,0 +1,1440 @@
+import bpy
+from mathutils import Vector, Color
+import time
+from bpy.props import *
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+import os
+import json
+import cProfile
+import traceback
+import functools
+import array
+
+from . import __version__
+from . import animation
+from . import atlas
+from . import cache
+from . import combine
+from . import delta
+from . import encode
+from . import parallel
+from . import pca
+from . import pipeline
+from . import raster
+from . import snapshot
+from . import steps
+from . import stream
+from . import timing
+from . import vertexdeltas
+from . import writer
+
+# ------------------------------------ core functions -------------------------
+
+# Global variables
+original_materials = []
+mat = None
+original_face_mat_indices = []
+original_selection = []
+original_face_images = []
+original_bake_settings = {}
+original_vcol_index = None
+bake_image = None
+
+ShapeKeyName = []
+MaxDiffStore = []
+RegionStore = []
+AtlasStore = []
+ScaleStore = []
+# (shape name, [(shape name, weight)]) of keys made of other keys
+CombinationStore = []
+# pca.Basis of the export with Basis Compression, None without
+BasisStore = None
+
+# Render settings changed for the bake, restored by post()
+BAKE_SETTINGS = ('bake_type', 'bake_margin', 'use_bake_clear',
+                 'use_bake_selected_to_active', 'bake_quad_split')
+
+
+# Remember and set up things, once per export
+#   Deselect all verts
+#   Put a temp material in the first slot and point all faces at it
+#   Create temp vertex color layer
+#   Assign one bake image to all uv faces (see bake_diffmap)
+# Everything per vertex or face is read and written with foreach_get and
+# foreach_set, post() puts it all back.
+def pre(ob, width=128, height=128, margin=10):
+    print("Prep work started...")
+
+    mesh = ob.data
+    uvtex = mesh.uv_textures.active
+
+    global original_materials, mat
+    global original_face_mat_indices, original_selection, original_face_images
+    global original_bake_settings, original_vcol_index, bake_image
+
+    # Deselect all vertices (to avoid odd artefacts, some bug?)
+    original_selection = [False] * len(mesh.vertices)
+    mesh.vertices.foreach_get('select', original_selection)
+    mesh.vertices.foreach_set('select', [False] * len(mesh.vertices))
+
+    # Store face material indices
+    original_face_mat_indices = array.array('i', bytes(len(mesh.polygons) * 4))
+    mesh.polygons.foreach_get('material_index', original_face_mat_indices)
+    mesh.polygons.foreach_set('material_index', array.array('i', bytes(len(mesh.polygons) * 4)))
+
+    # Create new temp material for baking, it takes the place of the first
+    # material while the others stay in their slots
+    mat = bpy.data.materials.new(name="DiffMap_Bake")
+    mat.use_vertex_color_paint = True
+    mat.diffuse_color = Color([1, 1, 1])
+    mat.diffuse_intensity = 1.0
+    mat.use_shadeless = True
+    if len(mesh.materials) > 0:
+        print("Saving Material: " + (mesh.materials[0].name if mesh.materials[0] else "None"))
+        original_materials = [mesh.materials[0]]
+        mesh.materials[0] = mat
+    else:
+        original_materials = []
+        mesh.materials.append(mat)
+
+    # Add new vertex color layer for baking
+    original_vcol_index = None
+    if len(mesh.vertex_colors) < 8-1:
+        original_vcol_index = mesh.vertex_colors.active_index
+        vcol = mesh.vertex_colors.new(name="DiffMap_Bake")
+        mesh.vertex_colors.active = vcol
+        vcol.active_render = True
+    else:
+        print("Amount limit of vertex color layers exceeded")
+
+    # One image is baked to for every shape, assign it to all uv faces now
+    # instead of around every bake
+    bake_image = bpy.data.images.new(name="DiffMap_Bake", width=width, height=height)
+    bake_image.generated_width = width
+    bake_image.generated_height = height
+    original_face_images = [n.image for n in uvtex.data]
+    for n in uvtex.data:
+        n.image = bake_image
+
+    # Bake settings
+    render = bpy.context.scene.render
+    original_bake_settings = dict((n, getattr(render, n)) for n in BAKE_SETTINGS)
+    render.bake_type = 'TEXTURE'
+    render.bake_margin = margin
+    render.use_bake_clear = True
+    render.use_bake_selected_to_active = False
+    render.bake_quad_split = 'AUTO'
+
+
+# Restore things
+#   Restore the first material, face material indices and selection
+#   Remove temp vertex color layer
+#   Restore uv face images and bake settings
+def post(ob):
+    print("Post work started...")
+
+    global original_materials, mat
+    global original_face_mat_indices, original_selection, original_face_images
+    global original_bake_settings, original_vcol_index, bake_image
+
+    mesh = ob.data
+    uvtex = mesh.uv_textures.active
+
+    # Put the original material back and remove the temp one
+    if original_materials:
+        mesh.materials[0] = original_materials[0]
+    else:
+        mesh.materials.pop()
+    mat.user_clear()
+    bpy.data.materials.remove(mat)
+
+    # Restore face material indices and selection
+    mesh.polygons.foreach_set('material_index', original_face_mat_indices)
+    mesh.vertices.foreach_set('select', original_selection)
+
+    # Remove temp vertex color layer
+    if original_vcol_index is not None:
+        bpy.ops.mesh.vertex_color_remove()
+        mesh.vertex_colors.active_index = original_vcol_index
+
+    # re-assign images to mesh faces and remove the bake image
+    for n, image in zip(uvtex.data, original_face_images):
+        n.image = image
+    bake_image.user_clear()
+    bpy.data.images.remove(bake_image)
+
+    render = bpy.context.scene.render
+    for n, value in original_bake_settings.items():
+        setattr(render, n, value)
+
+    # Refresh UI
+    bpy.context.scene.frame_current = bpy.context.scene.frame_current
+
+    # Free some memory
+    original_materials = []
+    original_face_mat_indices = []
+    original_selection = []
+    original_face_images = []
+    mat = None
+    bake_image = None
+
+
+# Construct complete filepath of the diff map for a shape
+def diffmap_path(filepath, name, shape_name, ext='.tga'):
+    # Adjusted to fix crash in bytes/str issue
+    platform = str(bpy.app.build_platform)
+    if platform.find("Windows") != -1:
+        return filepath + '\\' + name + '-' + shape_name + ext
+
+    elif platform.find("Linux") != -1:
+        return filepath + '/' + name + '-' + shape_name + ext
+
+    else:
+        return filepath + '/' + name + '-' + shape_name + ext
+
+
+# Construct complete filepath of the temporary mesh snapshot, see Disk Snapshot
+def snapshot_path(filepath, name):
+    return os.path.join(filepath, name + '-DiffMapSnapshot.bin')
+
+
+# Unmap and delete a disk snapshot
+#   Arrays still on the mapping keep the file open on Windows, it is then
+#   left behind and reported instead of failing the export.
+def remove_snapshot(self, source):
+    source.close()
+    try:
+        os.remove(source.path)
+    except OSError as e:
+        self.report({'WARNING'}, "Could not remove snapshot %s" % source.path)
+        print("Could not remove snapshot %s: %s" % (source.path, e))
+
+
+# Construct complete filepath of an atlas sheet
+def atlas_path(filepath, name, index, ext='.tga'):
+    return diffmap_path(filepath, name, 'DiffMapAtlas%d' % index, ext)
+
+
+# Save the bake image to a path
+def save_bake_image(path):
+    # filepath_raw doesn't reload the image from the new path like
+    # filepath would
+    bake_image.filepath_raw = path
+    bake_image.save()
+
+
+# Bake the active vertex color layer to a TGA through Blender's texture bake
+#   Needs the material, vertex color, image and bake setup done by pre()
+def bake_diffmap(ob, path):
+    with timing.stage('bake_image'):
+        bpy.ops.object.bake_image()
+
+    # Saved under a temporary name and renamed, like the native maps
+    with timing.stage('image_save'):
+        writer.write_atomic(path, save_bake_image)
+    timing.count_file(path)
+
+
+# Export the diff map of one shape key of a mesh snapshot
+#   index: position of the key in snap.names
+#   nativebake: rasterize and encode the map ourselves instead of baking it
+#               with Blender (which needs the setup done by pre())
+#   file_writer: writer.FileWriter encoding and writing native maps in the
+#                background, written right away if None
+#   plan: raster.RasterPlan native maps are rendered with, see
+#         pipeline.render_key
+def generate_diffmap_from_shape(ob, filepath, name, snap, index, shapeson,
+                                width=128, height=128, margin=10,
+                                nativebake=True, file_format='TGA',
+                                epsilon=0.0, crop=False, manifest=None,
+                                atlas_builder=None, axis_scale=False,
+                                file_writer=None, plan=None):
+    global ShapeKeyName
+    global MaxDiffStore
+    global RegionStore
+    global ScaleStore
+
+    shape_name = snap.names[index]
+    with timing.stage('deltas', shape_name):
+        diffs = snap.deltas(index)
+    timing.count('vertices', snap.vertex_count)
+
+    # Reuse the result of the last export if nothing changed
+    digest = None
+    if manifest is not None:
+        with timing.stage('cache', shape_name):
+            digest = manifest.digest(diffs)
+            entry = manifest.lookup(shape_name, digest)
+        if entry is not None:
+            print(" unchanged %s" % shape_name)
+            timing.count('keys_unchanged')
+            if entry['maxdiff'] > epsilon:
+                ShapeKeyName = ShapeKeyName + [shape_name]
+                MaxDiffStore = MaxDiffStore + [entry['maxdiff']]
+                RegionStore = RegionStore + [entry['region']]
+                ScaleStore = ScaleStore + [tuple(entry['scales'])]
+            return
+
+    # Find biggest distance offset in shape, skip shapes that don't move
+    # anything by more than epsilon
+    axes = delta.axis_maxdiff(diffs)
+    maxdiff = max(axes)
+
+    if maxdiff <= epsilon:
+        print(" skipped %s" % shape_name)
+        timing.count('keys_skipped')
+        if manifest is not None:
+            manifest.store(shape_name, digest, None, maxdiff)
+        return
+
+    # Colors span the offsets of each axis, or the largest one on all axes
+    scales = axes if axis_scale else (maxdiff, maxdiff, maxdiff)
+
+    loop_vertices = snap.loop_vertices
+
+    path = None
+    region = None
+    if shapeson is True:
+        if nativebake:
+            # Rasterize the touched part ourselves and encode the image directly
+            path = diffmap_path(filepath, name, shape_name, encode.EXTENSIONS[file_format])
+            with timing.stage('render', shape_name):
+                pixels, region = pipeline.render_key(diffs, scales, loop_vertices,
+                                                     snap.uvs, snap.triangles(),
+                                                     width, height, margin, epsilon,
+                                                     crop, plan)
+            if crop and region is None:
+                path = None
+            elif atlas_builder is not None:
+                # Packed into a sheet once all keys are rendered
+                path = None
+                if crop:
+                    atlas_builder.add(shape_name, pixels, region[2], region[3])
+                else:
+                    atlas_builder.add(shape_name, pixels, width, height)
+            elif file_writer is not None:
+                with timing.stage('queue', shape_name):
+                    if crop:
+                        file_writer.write_image(path, pixels, region[2], region[3], file_format)
+                    else:
+                        file_writer.write_image(path, pixels, width, height, file_format)
+            else:
+                with timing.stage('encode', shape_name):
+                    if crop:
+                        writer.write_atomic(path, encode.write_image, pixels, region[2], region[3], file_format)
+                    else:
+                        writer.write_atomic(path, encode.write_image, pixels, width, height, file_format)
+                timing.count_file(path)
+        else:
+            # Generate vertex color from shape key offset, apply it to all
+            # connected face corners and bake it
+            path = diffmap_path(filepath, name, shape_name)
+            with timing.stage('colors', shape_name):
+                if epsilon > 0:
+                    diffs = delta.keep_affected(diffs, delta.affected_vertices(diffs, epsilon))
+                colors = delta.loop_colors(delta.delta_colors(diffs, scales), loop_vertices)
+                ob.data.vertex_colors.active.data.foreach_set('color', colors)
+            timing.count('loops_written', len(loop_vertices))
+            with timing.stage('bake', shape_name):
+                bake_diffmap(ob, path)
+
+        # Tell user what was exported
+        if path is not None:
+            print(" exported %s" % path)
+
+    ShapeKeyName = ShapeKeyName + [shape_name]
+    MaxDiffStore = MaxDiffStore + [maxdiff]
+    RegionStore = RegionStore + [region]
+    ScaleStore = ScaleStore + [scales]
+    timing.count('keys_exported')
+
+    if manifest is not None:
+        manifest.store(shape_name, digest, path, maxdiff, region, scales)
+
+
+# Same as generate_diffmap_from_shape for many shapes at once, spread over
+# worker processes (see parallel.export_keys)
+#   Steps of export_steps, one per key a worker finished, so the export
+#   shows progress and can be cancelled between keys.
+#   shared_keys: shared raw array the snapshot keys were read into, if any
+#   executable: python interpreter to start workers with, looked up by the
+#               caller on the main thread
+#   done, total: progress of the export so far
+# Returns: done, counting the keys of this call
+def generate_diffmaps_parallel(self, filepath, name, snap, shapeson,
+                               width, height, margin, file_format='TGA',
+                               epsilon=0.0, crop=False, manifest=None,
+                               atlas_builder=None, axis_scale=False,
+                               shared_keys=None, indices=None, plan=None,
+                               executable=None, done=0, total=0):
+    global ShapeKeyName
+    global MaxDiffStore
+    global RegionStore
+    global ScaleStore
+
+    if indices is None:
+        indices = range(len(snap.names))
+
+    # Place the snapshot the workers need in shared memory and only hand out
+    # keys that changed since the last export
+    def prepare():
+        with timing.stage('share'):
+            data = parallel.share_snapshot(snap, shared_keys)
+
+        digests = {}
+        outcomes = {}
+        jobs = []
+        for i in indices:
+            shape_name = snap.names[i]
+            if manifest is not None:
+                with timing.stage('cache', shape_name):
+                    digests[i] = manifest.digest(snap.deltas(i))
+                    entry = manifest.lookup(shape_name, digests[i])
+                if entry is not None:
+                    print(" unchanged %s" % shape_name)
+                    timing.count('keys_unchanged')
+                    outcomes[i] = (entry['maxdiff'], None, entry['region'], tuple(entry['scales']))
+                    continue
+
+            if shapeson is True:
+                path = diffmap_path(filepath, name, shape_name, encode.EXTENSIONS[file_format])
+                jobs.append((i, path))
+            else:
+                jobs.append((i, None))
+        return data, digests, outcomes, jobs
+
+    data, digests, outcomes, jobs = yield steps.Step("Shape keys", done, total, prepare)
+    done += len(indices) - len(jobs)
+
+    results = None
+    if jobs:
+        results = parallel.export_keys(data, jobs, width, height, margin,
+                                       file_format=file_format,
+                                       epsilon=epsilon, crop=crop,
+                                       keep_pixels=atlas_builder is not None,
+                                       axis_scale=axis_scale,
+                                       timed=self.timingreport,
+                                       workers=self.workers,
+                                       executable=executable,
+                                       plan=plan)
+    try:
+        with timing.stage('workers'):
+            for n in range(len(jobs)):
+                # Wait for the next key any worker finishes
+                result = yield steps.Step("Shape keys (%d of %d)" % (n + 1, len(jobs)), done, total,
+                                          functools.partial(next, results))
+                done += 1
+
+                shape_name = snap.names[result.index]
+                timing.merge(result.timing, shape_name)
+                if result.error is not None:
+                    self.report({'WARNING'}, "Shape key %s failed" % shape_name)
+                    print("Shape key %s failed:\n%s" % (shape_name, result.error))
+                    continue
+
+                outcomes[result.index] = (result.maxdiff, result.path, result.region, result.scales)
+                if result.pixels is not None:
+                    if crop:
+                        atlas_builder.add(shape_name, result.pixels, result.region[2], result.region[3])
+                    else:
+                        atlas_builder.add(shape_name, result.pixels, width, height)
+                if manifest is not None:
+                    manifest.store(shape_name, digests[result.index], result.path,
+                                   result.maxdiff, result.region, result.scales)
+
+                if result.maxdiff <= epsilon:
+                    print(" skipped %s" % shape_name)
+                    timing.count('keys_skipped')
+                else:
+                    timing.count('keys_exported')
+                    if result.path is not None:
+                        print(" exported %s" % result.path)
+    finally:
+        # Stops the workers if the export ends before they are done
+        if results is not None:
+            results.close()
+
+    # Collect results in shape key order
+    for i, shape_name in enumerate(snap.names):
+        if i not in outcomes:
+            continue
+
+        maxdiff, path, region, scales = outcomes[i]
+        if maxdiff > epsilon:
+            ShapeKeyName = ShapeKeyName + [shape_name]
+            MaxDiffStore = MaxDiffStore + [maxdiff]
+            RegionStore = RegionStore + [region]
+            ScaleStore = ScaleStore + [scales]
+
+    return done
+
+
+# Write the offsets of all shapes per vertex, see vertexdeltas
+#   Keys are named like their diff maps (name-shape).
+#   indices: keys to write, all if None
+def write_vertex_deltas(filepath, name, snap, encoding='INT16', epsilon=0.0, indices=None):
+    path = os.path.join(filepath, name + '-DiffMapDeltas.bytes')
+    uvs, vertices = vertexdeltas.uv_entries(snap.uvs, snap.loop_vertices)
+
+    deltas_writer = vertexdeltas.DeltaWriter(path, snap.vertex_count, uvs, vertices, encoding)
+    if indices is None:
+        indices = range(len(snap.names))
+    try:
+        for i in indices:
+            shape_name = snap.names[i]
+            diffs = snap.deltas(i)
+            if delta.maxdiff(diffs) <= epsilon:
+                continue
+            deltas_writer.add(name + '-' + shape_name, diffs, epsilon)
+    except BaseException:
+        deltas_writer.discard()
+        raise
+    deltas_writer.close()
+    timing.count_file(path)
+    print(" exported %s" % path)
+
+
+# Write the coefficients of every key on the basis maps, with how far the
+# maps are from the key
+#   Keys and maps are named like their diff maps (name-shape).
+def write_basis(filepath, name, basis):
+    path = os.path.join(filepath, name + '-DiffMapBasis.json')
+    data = {'Maps': [name + '-' + n for n in basis.names], 'Keys': {}}
+    for row, key in enumerate(basis.keys):
+        entry = {}
+        entry['Coefficients'] = basis.coefficients[row]
+        entry['MaxError'] = basis.max_errors[row]
+        entry['RelativeError'] = basis.relative_errors[row]
+        data['Keys'][name + '-' + key] = entry
+        print(" basis error %s: %0.6f (%0.2f%%)" % (key, basis.max_errors[row], basis.relative_errors[row] * 100))
+
+    def write(temp):
+        with open(temp, 'w') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+
+    writer.write_atomic(path, write)
+    timing.count('basis_maps', len(basis.names))
+    timing.count_file(path)
+    print(" exported %s" % path)
+
+
+# General error checking
+def found_error(self, context):
+
+    ob = context.active_object
+    scene = context.scene
+    filepath = self.filepath
+
+    if ob.type != 'MESH':
+        self.report({'ERROR'}, "Object is not a mesh")
+        print("Object is not a mesh")
+        return True
+    if ob.data.shape_keys == None:
+        self.report({'ERROR'}, "Mesh has no shape keys")
+        print("Mesh has no shape keys")
+        return True
+    if len(ob.data.uv_textures) <= 0:
+        self.report({'ERROR'}, "Mesh has no UVs")
+        print("Mesh has no UVs")
+        return True
+    if not os.path.exists( filepath ):
+        self.report({'ERROR'}, "Invalid dir: %s" % filepath)
+        print("Invalid dir: %s" % filepath)
+        return True
+    if len( ob.data.polygons ) <= 0:
+        self.report({'ERROR'}, "Mesh contains no polygons")
+        print("Mesh contains no polygons")
+        return True
+
+    return False
+
+
+# Export the active object
+#   self: the operator, or anything with the same settings (see batch)
+# Returns: False if the object can't be exported
+def main(self, context):
+    return steps.run(export_steps(self, context))
+
+
+# Export the active object a step at a time (see steps)
+#   Steps come per shape key and per animation range. Fast Bake keys and
+#   the other work that touches no Blender data are the work of a step.
+#   Stopping the steps early leaves every file written whole: the bake
+#   setup is undone, the cache manifest keeps the maps written so far and
+#   the animation can be continued with Resume Animation.
+# Returns: False if the object can't be exported
+def export_steps(self, context):
+
+    global ShapeKeyName
+    global MaxDiffStore
+    global RegionStore
+    global AtlasStore
+    global ScaleStore
+    global CombinationStore
+    global BasisStore
+
+    ob = context.active_object
+
+    print("-----------------------------------------------------")
+    print("Starting Diff-Map export for object %s ..." % ob.name )
+
+    # Error checking
+    if found_error(self, context):
+        print(found_error(self, context))
+        return False
+
+    filepath = self.filepath
+    name = self.name
+    width = self.width
+    height = self.height
+    margin = self.margin
+    animationson = self.animationson
+    shapeson = self.shapeson
+    nativebake = self.nativebake
+    imageformat = self.imageformat
+    epsilon = self.epsilon
+    cropmaps = self.cropmaps
+    axisscale = self.axisscale
+
+    ShapeKeyName = []
+    MaxDiffStore = []
+    RegionStore = []
+    AtlasStore = []
+    ScaleStore = []
+    CombinationStore = []
+    BasisStore = None
+
+    # Maps are only packed into atlas sheets with Fast Bake
+    atlas_builder = None
+    if self.atlas and nativebake and shapeson:
+        atlas_builder = atlas.AtlasBuilder(self.atlassize, background=pipeline.NEUTRAL,
+                                           file_format=imageformat)
+
+    shapes = [n for n in ob.data.shape_keys.key_blocks if n.name != 'Basis'] # Skip the 'Basis' shape
+    use_workers = nativebake and self.workers != 1 and len(shapes) > 1
+
+    # Workers are started from the Runner's thread, look up what they run
+    # with here on the main thread
+    executable = getattr(bpy.app, "binary_path_python", None) if use_workers else None
+
+    # Units of work: reading the mesh, every key and every animation range
+    ranges = len(ob.animation_list) if animationson else 0
+    done = 0
+    total = 1 + len(shapes) + ranges
+
+    # Time every stage and/or profile the whole export if asked for
+    if self.timingreport:
+        timing.start()
+    profiler = None
+    if self.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Diff maps and animation files are written by background threads
+    # while the next key or range is worked on
+    file_writer = None
+    if self.writethreads > 0:
+        file_writer = writer.FileWriter(self.writethreads, self.writebuffer * 1024 * 1024)
+
+    baking = False
+    source = None
+    manifest = None
+    try:
+        # The native rasterizer doesn't need the bake setup
+        if not nativebake:
+            with timing.stage('pre'):
+                pre(ob, width, height, margin)
+            baking = True
+
+        # Read the mesh and all keys in one go, keys go straight to shared
+        # memory when they are handed to worker processes. With Disk Snapshot
+        # they are written to a file one by one and paged in when used.
+        yield steps.Step("Reading mesh", done, total)
+        with timing.stage('read'):
+            shared_keys = keys = None
+            if self.disksnapshot:
+                snap = snapshot.map_mesh(ob.data, shapes, snapshot_path(filepath, name))
+            else:
+                if use_workers:
+                    shared_keys, keys = parallel.new_shared('f', len(ob.data.vertices) * 3 * len(shapes))
+                snap = snapshot.read_mesh(ob.data, shapes, keys)
+        source = snap
+        done += 1
+
+        # With Basis Compression the maps are of the principal components of
+        # all keys, which become the shape keys of the rest of the export
+        if self.basiscompress:
+            with timing.stage('basis'):
+                BasisStore = yield steps.Step("Basis maps", done, total,
+                                              lambda: pca.compress(snap, self.basiscount, epsilon))
+                write_basis(filepath, name, BasisStore)
+            snap = BasisStore.snapshot
+            shared_keys = None
+
+        # Keys that are weighted sums of other keys get no diff map, their
+        # animated weight goes to the keys they are made of (see Write_Animation)
+        combinations = {}
+        if self.combinekeys and BasisStore is None:
+            with timing.stage('combine'):
+                combinations = yield steps.Step("Combining keys", done, total,
+                                                lambda: combine.find_combinations(snap, self.combinetolerance, epsilon))
+            for i, terms in sorted(combinations.items()):
+                CombinationStore = CombinationStore + [(snap.names[i], [(snap.names[j], w) for j, w in terms])]
+                print(" combined %s = %s" % (snap.names[i], " + ".join("%0.4f %s" % (w, snap.names[j]) for j, w in terms)))
+            timing.count('keys_combined', len(combinations))
+        indices = [i for i in range(len(snap.names)) if i not in combinations]
+        total = done + len(indices) + ranges
+
+        # Cache manifest of the last export, keyed on everything maps depend on
+        if self.usecache and atlas_builder is None:
+            settings = {'width': width, 'height': height, 'margin': margin,
+                        'shapeson': shapeson, 'nativebake': nativebake,
+                        'imageformat': imageformat, 'epsilon': epsilon,
+                        'cropmaps': cropmaps, 'axisscale': axisscale}
+            layout = cache.layout_digest(__version__, [snap.uvs, snap.triangles(), snap.loop_vertices], settings)
+            manifest = cache.Manifest(cache.manifest_path(filepath, name), layout)
+
+        # Texels, barycentric weights and margin sources of the UV layout,
+        # worked out once so every key's map is a gather of its colors
+        plan = None
+        if nativebake and shapeson and indices:
+            with timing.stage('plan'):
+                plan = yield steps.Step("Rasterization plan", done, total,
+                                        lambda: raster.RasterPlan(snap.uvs, snap.triangles(), snap.loop_vertices,
+                                                                  width, height, margin))
+
+        with timing.stage('shape_keys'):
+            if use_workers:
+                done = yield from generate_diffmaps_parallel(self, filepath, name, snap, shapeson, width, height, margin, imageformat, epsilon, cropmaps, manifest, atlas_builder, axisscale, shared_keys, indices, plan,
+                                                             executable, done, total)
+            else:
+                for i in indices:
+                    work = functools.partial(generate_diffmap_from_shape, ob, filepath, name, snap, i, shapeson, width, height, margin, nativebake, imageformat, epsilon, cropmaps, manifest, atlas_builder, axisscale, file_writer, plan)
+                    # Blender's bake has to run here, on the main thread
+                    if nativebake:
+                        yield steps.Step("Shape key %s" % snap.names[i], done, total, work)
+                    else:
+                        yield steps.Step("Shape key %s" % snap.names[i], done, total)
+                        work()
+                    done += 1
+        if baking:
+            with timing.stage('post'):
+                post(ob)
+            baking = False
+
+        if self.vertexdeltas:
+            with timing.stage('vertex_deltas'):
+                yield steps.Step("Vertex deltas", done, total,
+                                 functools.partial(write_vertex_deltas, filepath, name, snap, self.deltaencoding, epsilon, indices))
+
+        if self.disksnapshot:
+            remove_snapshot(self, source)
+        source = None
+
+        if manifest is not None:
+            with timing.stage('cache'):
+                if file_writer is not None:
+                    file_writer.wait()
+                    manifest.discard(file_writer.failed)
+                manifest.save()
+            manifest = None
+
+        # Pack the maps into sheets and remember where each one went
+        if atlas_builder is not None:
+            with timing.stage('atlas'):
+                ext = encode.EXTENSIONS[imageformat]
+                placements = yield steps.Step("Atlas", done, total,
+                                              lambda: atlas_builder.write(lambda index: atlas_path(filepath, name, index, ext)))
+                AtlasStore = [placements.get(n) for n in ShapeKeyName]
+            for n in set(p[0] for p in placements.values()):
+                timing.count_file(n)
+
+        if animationson == True:
+            with timing.stage('animation'):
+                for rangeName in Write_Animation(filepath, name, self, ob, file_writer):
+                    yield steps.Step("Animation %s" % rangeName, done, total)
+                    done += 1
+
+        if file_writer is not None:
+            with timing.stage('write'):
+                yield steps.Step("Writing files", done, total, file_writer.close)
+    finally:
+        if baking:
+            post(ob)
+        if source is not None and self.disksnapshot:
+            remove_snapshot(self, source)
+        # Files already queued are written even if the export stops early
+        if file_writer is not None:
+            file_writer.wait()
+        if manifest is not None:
+            if file_writer is not None:
+                manifest.discard(file_writer.failed)
+            manifest.save()
+        if profiler is not None:
+            profiler.disable()
+        report = timing.finish()
+
+    if profiler is not None:
+        profiler.dump_stats(os.path.join(filepath, name + '-DiffMapProfile.prof'))
+
+    if report is not None:
+        info = {'object': ob.name, 'name': name, 'version': __version__,
+                'vertices': len(ob.data.vertices), 'loops': len(ob.data.loops),
+                'shape_keys': len(shapes), 'nativebake': nativebake,
+                'workers': self.workers, 'imageformat': imageformat,
+                'width': width, 'height': height}
+        report.write(os.path.join(filepath, name + '-DiffMapTiming.json'), info)
+
+    print(" Finished.")
+    print("-----------------------------------------------------")
+    return True
+
+
+
+
+# Sample the values of the named shapes on every frame of the ranges
+#   Shapes animated by an action are read straight from their F-curves,
+#   shapes that are driven (or animated through the NLA) need the scene to
+#   be evaluated, which is done once per frame for all of them together.
+# Returns: animation.Samples
+def sample_animation(ob, names, ranges):
+    key = ob.data.shape_keys
+    scene = bpy.context.scene
+    samples = animation.Samples(animation.range_frames(ranges), names)
+
+    anim = key.animation_data
+    fcurves = {}
+    drivers = set()
+    use_nla = False
+    if anim is not None:
+        if anim.action is not None:
+            for fcurve in anim.action.fcurves:
+                fcurves[fcurve.data_path] = fcurve
+        for fcurve in anim.drivers:
+            drivers.add(fcurve.data_path)
+        use_nla = anim.use_nla and len(anim.nla_tracks) > 0
+
+    evaluated = []
+    for column, name in enumerate(names):
+        data_path = 'key_blocks["%s"].value' % name
+        fcurve = fcurves.get(data_path)
+        if data_path in drivers or use_nla:
+            evaluated.append(column)
+        elif fcurve is not None and not fcurve.mute:
+            block = key.key_blocks[name]
+            samples.set_curve(column, fcurve, block.slider_min, block.slider_max)
+        else:
+            samples.set_constant(column, key.key_blocks[name].value)
+
+    if evaluated:
+        blocks = [key.key_blocks[names[column]] for column in evaluated]
+        current = scene.frame_current
+        for frame in samples.frames:
+            scene.frame_set(frame)
+            samples.set_frame(frame, evaluated, [n.value for n in blocks])
+        scene.frame_set(current)
+        timing.count('frame_set', len(samples.frames) + 1)
+
+    return samples
+
+
+# ShapeKeys entry of the animation JSON for one key
+#   index: position of the key in ShapeKeyName
+def shape_key_entry(self, index, imageext):
+    shapeKeyName = self.name + "-" + ShapeKeyName[index]
+    entry = {}
+    entry['ImageName'] = shapeKeyName + imageext
+    # Offset of a full color step per axis, all the same unless
+    # Per Axis Scale is on
+    entry['Scale'] = {}
+    entry['Scale']['x'] = ScaleStore[index][0]
+    entry['Scale']['y'] = ScaleStore[index][1]
+    entry['Scale']['z'] = ScaleStore[index][2]
+
+    # Texel window holding everything the key moves, the rest of
+    # the map is neutral (or not written at all with Crop Maps)
+    region = RegionStore[index]
+    if region is not None:
+        entry['Region'] = {}
+        entry['Region']['x'] = region[0]
+        entry['Region']['y'] = region[1]
+        entry['Region']['width'] = region[2]
+        entry['Region']['height'] = region[3]
+        entry['Region']['cropped'] = self.cropmaps
+
+    # Rect of the map inside its atlas sheet, mapX/mapY is the map
+    # texel at the bottom left corner of the rect
+    placement = AtlasStore[index] if AtlasStore else None
+    if placement is not None:
+        sheet, x, y, rect_width, rect_height = placement
+        entry['ImageName'] = os.path.basename(sheet)
+        entry['Atlas'] = {}
+        entry['Atlas']['x'] = x
+        entry['Atlas']['y'] = y
+        entry['Atlas']['width'] = rect_width
+        entry['Atlas']['height'] = rect_height
+        entry['Atlas']['mapX'] = region[0] if self.cropmaps else 0
+        entry['Atlas']['mapY'] = region[1] if self.cropmaps else 0
+        entry['Atlas']['mapWidth'] = self.width
+        entry['Atlas']['mapHeight'] = self.height
+    return entry
+
+
+# Write the TXT, JSON and binary files of every animation range
+#   Ranges are sampled and written a block of frames at a time (see
+#   stream), with Resume Animation an interrupted export continues from
+#   the last block on disk.
+#   Yields the name of every range before writing it (see export_steps).
+#   ob: object to write, the active one if None
+#   file_writer: writer.FileWriter for the files of every range, see stream
+def Write_Animation(Afilepath, Afilename, self, ob=None, file_writer=None):
+
+    print("-------------------------------")
+    print("Starting writing Animation List")
+    #print("-------------------------------")
+
+    jsonFilename = Afilepath + '/' + Afilename +".json"
+
+    if self.nativebake:
+        imageext = encode.EXTENSIONS[self.imageformat]
+    else:
+        imageext = '.tga'
+
+    MyObject = ob if ob is not None else bpy.context.active_object
+    MyRanges = [(n.name, n.startFrame, n.endFrame) for n in MyObject.animation_list]
+
+    # Everything the files depend on, a resume needs the same
+    settings = {'ranges': MyRanges, 'simplify': self.simplifyanimation,
+                'tolerance': self.simplifytolerance, 'binary': self.binaryanimation,
+                'encoding': self.animationencoding, 'compress': self.animationcompress,
+                'imageext': imageext, 'axisscale': self.axisscale,
+                'combinations': CombinationStore,
+                'basis': BasisStore.coefficients if BasisStore is not None else None,
+                'version': __version__}
+    names = [self.name + "-" + n for n in ShapeKeyName]
+    # With Per Axis Scale the files carry the scale of every axis, MetaMorph
+    # takes the largest as multiplier and the others relative to it
+    scales = ScaleStore if self.axisscale else MaxDiffStore
+    writer = stream.AnimationWriter(jsonFilename, names, scales, settings,
+                                    self.animationbuffer, self.resumeanimation, file_writer)
+    if writer.resumed:
+        print("Resuming after %d written ranges" % writer.resumed)
+
+    # Combined keys are sampled after the exported ones and folded into
+    # the weights of the keys they are made of, terms without a map of
+    # their own (nothing moved) are left out
+    combined = [n for n, terms in CombinationStore]
+    recipes = []
+    for column, (n, terms) in enumerate(CombinationStore):
+        recipes.append((len(ShapeKeyName) + column,
+                        [(ShapeKeyName.index(t), w) for t, w in terms if t in ShapeKeyName]))
+
+    sources = ShapeKeyName + combined
+
+    # With Basis Compression the keys are sampled and turned into weights
+    # of the basis maps written
+    if BasisStore is not None:
+        columns = [BasisStore.names.index(n) for n in ShapeKeyName]
+        coefficients = [[row[c] for c in columns] for row in BasisStore.coefficients]
+        sources = BasisStore.keys
+
+    # Frames of overlapping ranges are sampled once, as long as they fit
+    # in the animation buffer
+    shared = animation.SharedFrames(lambda spans: sample_animation(MyObject, sources, spans),
+                                    sources, [(start, end) for n, start, end in MyRanges],
+                                    self.animationbuffer)
+
+    def sample(index, start, end):
+        samples = shared.sample(index, start, end)
+        if BasisStore is not None:
+            samples = pca.project_samples(samples, coefficients, ShapeKeyName)
+        elif recipes:
+            samples = combine.fold_samples(samples, len(ShapeKeyName), recipes)
+        return samples
+
+    def entry(index):
+        return shape_key_entry(self, index, imageext)
+
+    for index, (rangeName, AnimationStart, AnimationEnd) in enumerate(MyRanges):
+        framestring = str(AnimationStart) + 'to' + str(AnimationEnd)
+        Afileset = Afilepath + '/' + Afilename + '-' + framestring + '-' + rangeName +'-DiffMapAnimation.TXT'
+
+        # The same range in the compact binary format
+        Abinary = None
+        if self.binaryanimation:
+            Abinary = Afilepath + '/' + Afilename + '-' + framestring + '-' + rangeName +'-DiffMapAnimation.bytes'
+
+        yield rangeName
+        writer.write_range(index, rangeName, AnimationStart, AnimationEnd,
+                           functools.partial(sample, index), Afileset, Abinary, entry)
+
+        #print("---------------------------")
+        print("Done writing Animation List")
+        print("---------------------------")
+
+    # And the metadata of all keys, with what combined keys were made of
+    extra = None
+    if CombinationStore:
+        extra = {'Combinations': dict((self.name + "-" + n, dict((self.name + "-" + t, w) for t, w in terms))
+                                      for n, terms in CombinationStore)}
+    writer.close(extra)
+
+
+# ------------------------------------ UI area  ------------------------------------
+
+class AnimationListItem(bpy.types.PropertyGroup):
+    """ Group of properties representing an item in the list """
+
+    name = bpy.props.StringProperty(
+           name="Name",
+           description="Animation Name",
+           default="Timeline")
+
+    startFrame = bpy.props.IntProperty(
+           name="Start Frame",
+           description="Start frame of animation range",
+           default=bpy.context.scene.frame_start,
+           min=bpy.context.scene.frame_start,
+           max=bpy.context.scene.frame_end)
+    endFrame = bpy.props.IntProperty(
+           name="End Frame",
+           description="End frame of animation range",
+           default=bpy.context.scene.frame_end,
+           min=bpy.context.scene.frame_start,
+           max=bpy.context.scene.frame_end)
+"""
+class AnimationEditorPanel(bpy.types.Panel):
+    bl_label = "Shape Key Animation Detail"
+    bl_description = "Define animation timeline ranges for shape keys"
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_context = "object"
+
+    def draw(self, context):
+        layout = self.layout
+        object = context.object
+
+        item = object.animation_list[object.animation_list_index]
+        layout.prop(item, 'name')
+        layout.prop(item, "startFrame")
+        layout.prop(item, "endFrame")
+"""
+
+class AnimationListPanel(bpy.types.Panel):
+    bl_label = "Shape Key Animation Ranges"
+    bl_description = "Define animation timeline ranges for shape keys."
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_context = "object"
+
+    def draw(self, context):
+        layout = self.layout
+        object = context.object
+
+        row = layout.row()
+        row.template_list("ObjectAnimationsList", "The_List", object, "animation_list", object, "animation_list_index" )
+
+        row = layout.row()
+        row.operator('animation_list.new_item')
+        row.operator('animation_list.delete_item')
+        #row.operator('animation_list.move_item', text='UP').direction = 'UP'
+        #row.operator('animation_list.move_item', text='DOWN').direction = 'DOWN'
+
+        if object.animation_list_index >= 0 and len(object.animation_list) > 0:
+            item = object.animation_list[object.animation_list_index]
+
+        row = layout.row()
+        row.prop(item, "name")
+        row.prop(item, "startFrame")
+        row.prop(item, "endFrame")
+
+class LIST_OT_NewItem(bpy.types.Operator):
+    """ Add a new item to the list """
+
+    bl_idname = "animation_list.new_item"
+    bl_label = "Add Range"
+
+    def execute(self, context):
+        context.object.animation_list.add()
+
+        return{'FINISHED'}
+
+
+class LIST_OT_DeleteItem(bpy.types.Operator):
+    """ Delete the selected item from the list """
+
+    bl_idname = "animation_list.delete_item"
+    bl_label = "Delete Range"
+
+    @classmethod
+    def poll(self, context):
+        """ Enable if there's something in the list. """
+
+        return context.object.animation_list > 0
+
+    def move_index(self):
+        """ Move index of an item render queue while clamping it. """
+
+        index = bpy.context.object.animation_list_index
+        list_length = len(bpy.context.object.animation_list) - 1 # (index starts at 0)
+        new_index = 0
+
+        if self.direction == 'UP':
+            new_index = index - 1
+        elif self.direction == 'DOWN':
+            new_index = index + 1
+
+        new_index = max(0, min(new_index, list_length))
+        index = new_index
+
+
+    def execute(self, context):
+        list = context.object.animation_list
+        index = context.object.animation_list_index
+
+        if self.direction == 'DOWN':
+            neighbor = index + 1
+            queue.move(index,neighbor)
+            self.move_index()
+
+        elif self.direction == 'UP':
+            neighbor = index - 1
+            queue.move(neighbor, index)
+            self.move_index()
+        else:
+            return{'CANCELLED'}
+
+        return{'FINISHED'}(context.object.animation_list) > 0
+
+    def execute(self, context):
+        list = context.object.animation_list
+        index = context.object.animation_list_index
+
+        list.remove(index)
+
+        if index > 0:
+            index = index - 1
+
+        return{'FINISHED'}
+
+
+class LIST_OT_MoveItem(bpy.types.Operator):
+    """ Move an item in the list """
+
+    bl_idname = "animation_list.move_item"
+    bl_label = "Move an item in the list"
+
+    direction = bpy.props.EnumProperty(
+                items=(
+                    ('UP', 'Up', ""),
+                    ('DOWN', 'Down', ""),))
+
+    @classmethod
+    def poll(self, context):
+        """ Enable if there's something in the list. """
+
+        return context.object.animation_list > 0
+
+
+    def move_index(self):
+        """ Move index of an item render queue while clamping it. """
+
+        index = bpy.context.object.animation_list_index
+        list_length = len(bpy.context.object.animation_list) - 1 # (index starts at 0)
+        new_index = 0
+
+        if self.direction == 'UP':
+            new_index = index - 1
+        elif self.direction == 'DOWN':
+            new_index = index + 1
+
+        new_index = max(0, min(new_index, list_length))
+        index = new_index
+
+
+    def execute(self, context):
+        list = context.object.animation_list
+        index = context.object.animation_list_index
+
+        if self.direction == 'DOWN':
+            neighbor = index + 1
+            queue.move(index,neighbor)
+            self.move_index()
+
+        elif self.direction == 'UP':
+            neighbor = index - 1
+            queue.move(neighbor, index)
+            self.move_index()
+        else:
+            return{'CANCELLED'}
+
+        return{'FINISHED'}
+
+class ObjectAnimationsList(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        # We could write some code to decide which icon to use here...
+        custom_icon = 'OBJECT_DATAMODE'
+
+        # Make sure your code supports all 3 layout types
+        if self.layout_type in {'DEFAULT', 'COMPACT'}:
+            layout.label(item.name, icon = custom_icon)
+
+        elif self.layout_type in {'GRID'}:
+            layout.alignment = 'CENTER'
+            layout.label("", icon = custom_icon)
+
+
+# Copy of the operator settings for an export running in the background
+#   The operator can't be used from other threads, reports made there are
+#   held in messages and handed to the operator on the main thread.
+class ExportSettings(object):
+
+    def __init__(self, operator):
+        for prop in operator.bl_rna.properties:
+            if prop.identifier != 'rna_type':
+                setattr(self, prop.identifier, getattr(operator, prop.identifier))
+        self.messages = []
+
+    def report(self, level, message):
+        self.messages.append((level, message))
+
+
+class EXPORT_OT_tools_diffmap_exporter(bpy.types.Operator):
+    '''Import from DXF file format (.dxf)'''
+    bl_idname = "object.export_diffmaps_from_shapes"
+    bl_description = 'Export to MetaMorph file format'
+    bl_label = "Export Diff" +' v.'+ __version__
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_context = "data"
+    bl_context = "data"
+
+    filename_ext = ".tga"
+    filter_glob = StringProperty(default="*.tga", options={'HIDDEN'})
+
+    filepath = StringProperty(name="File Path", description="Filepath used for exporting diffmap files", maxlen= 1024, default= "", subtype='FILE_PATH')
+    filename = bpy.props.StringProperty(name="File Name", description="Name of the file",)
+    name = StringProperty( name="Name", description="Name for the file (without tga extension please)", maxlen = 512, default = "Name")
+
+    #try:
+    #    bpy.context.active_object.name
+    #except NameError:
+    #    name = StringProperty( name="Name", description="Name for the file (without tga extension please)", maxlen = 512, default = "Name")
+    #else:
+    #    name = StringProperty( name="Name", description="Name for the file (without tga extension please)", maxlen = 512, default = bpy.context.active_object.name)
+
+    width = IntProperty( name="Width", description="Width of image to export", default = 256, min= 1, max=65535)
+    height = IntProperty( name="Height", description="Height of image to export", default = 256, min= 1, max=65535)
+    shapeson = BoolProperty( name="Export ShapeKeys", description="Save shapekeys as TGA images", default = True)
+    animationson = BoolProperty( name="Export Animation", description="Save shapekeys animation", default = True)
+    binaryanimation = BoolProperty( name="Binary Animation", description="Also save each animation range as a compact binary file (.bytes)", default = False)
+    animationencoding = EnumProperty( name="Weight Encoding", description="Precision of shape key weights in binary animations",
+                                      items=(('UINT8', "8 bit", "Quantized to 256 levels per track"),
+                                             ('UINT16', "16 bit", "Quantized to 65536 levels per track"),
+                                             ('FLOAT16', "Half Float", "Half precision floats")),
+                                      default = 'UINT16')
+    animationcompress = BoolProperty( name="Compress Animation", description="Delta code and zlib compress binary animation tracks", default = True)
+    simplifyanimation = EnumProperty( name="Simplify Animation", description="Reduce animation tracks in the JSON and binary output",
+                                      items=(('NONE', "None", "Keep every frame"),
+                                             ('KEYS', "Sparse Keys", "Keep only the keys needed to interpolate each track linearly within the tolerance"),
+                                             ('SPANS', "Constant Spans", "Run length encode spans that stay within the tolerance")),
+                                      default = 'NONE')
+    simplifytolerance = FloatProperty( name="Tolerance", description="Largest shape key weight error allowed when simplifying animation", default = 0.001, min= 0.0, precision=4)
+    animationbuffer = IntProperty( name="Animation Buffer", description="Frames sampled and held in memory at a time while writing animations", default = 256, min = 1)
+    resumeanimation = BoolProperty( name="Resume Animation", description="Continue the animation files of an interrupted export instead of starting over", default = False)
+    margin = IntProperty( name="Edge Margin", description="sets outside margin around UV edges", default = 10, min= 0, max=64)
+    epsilon = FloatProperty( name="Threshold", description="Skip shape keys and leave vertices neutral that move less than this", default = 0.0, min= 0.0, precision=5)
+    cropmaps = BoolProperty( name="Crop Maps", description="Only write the part of each diff map a shape key touches (see Region in the JSON)", default = False)
+    vertexdeltas = BoolProperty( name="Vertex Deltas", description="Also save the offsets of every shape key per vertex (-DiffMapDeltas.bytes), MetaMorph can load them instead of diff maps", default = False)
+    deltaencoding = EnumProperty( name="Delta Encoding", description="Precision of offsets in the vertex delta file",
+                                  items=(('INT16', "16 bit", "Quantized to 65535 levels per axis and shape key"),
+                                         ('FLOAT16', "Half Float", "Half precision floats")),
+                                  default = 'INT16')
+    axisscale = BoolProperty( name="Per Axis Scale", description="Scale the colors of each axis to its own largest offset (see Scale in the JSON) instead of the largest offset of all axes", default = False)
+    atlas = BoolProperty( name="Atlas", description="Pack diff maps into a few power of two sheets (see Atlas in the JSON), needs Fast Bake", default = False)
+    atlassize = IntProperty( name="Atlas Size", description="Largest width and height of an atlas sheet", default = 4096, min= 64, max=16384)
+    usecache = BoolProperty( name="Reuse Unchanged", description="Keep diff maps of shape keys that didn't change since the last export", default = True)
+    timingreport = BoolProperty( name="Timing Report", description="Save the time spent in every export stage and shape key, with counters, to -DiffMapTiming.json", default = False)
+    profile = BoolProperty( name="Profile", description="Save a cProfile dump of the export to -DiffMapProfile.prof", default = False)
+    nativebake = BoolProperty( name="Fast Bake", description="Rasterize diff maps directly instead of using Blender's texture bake", default = True)
+    imageformat = EnumProperty( name="Image Format", description="File format of diff maps written with Fast Bake",
+                                items=(('TGA', "TGA", "Uncompressed Targa"),
+                                       ('TGA_RLE', "TGA RLE", "Run length encoded Targa"),
+                                       ('PNG', "PNG", "Zlib compressed PNG"),
+                                       ('PNG16', "PNG 16 bit", "Zlib compressed PNG with 16 bits per channel"),
+                                       ('EXR_HALF', "OpenEXR Half", "Uncompressed OpenEXR with half float channels"),
+                                       ('EXR_FLOAT', "OpenEXR Float", "Uncompressed OpenEXR with 32 bit float channels")),
+                                default = 'TGA_RLE')
+    workers = IntProperty( name="Worker Processes", description="Processes exporting shape keys with Fast Bake, 1 exports inside Blender, 0 uses one per core", default = 1, min= 0, max=256)
+    combinekeys = BoolProperty( name="Combine Keys", description="Export no diff map for shape keys that are weighted sums of other keys, their animation drives those keys instead (see Combinations in the JSON)", default = False)
+    combinetolerance = FloatProperty( name="Combine Tolerance", description="Largest offset error allowed on any vertex when combining shape keys", default = 0.0001, min= 0.0, precision=5)
+    basiscompress = BoolProperty( name="Basis Compression", description="Export diff maps of the principal components of all shape keys instead of one per key, animations drive the components (see -DiffMapBasis.json)", default = False)
+    basiscount = IntProperty( name="Basis Maps", description="Most principal components exported with Basis Compression", default = 16, min= 1, max=1024)
+    backgroundexport = BoolProperty( name="Background Export", description="Export a shape key and animation range at a time while Blender stays usable, with progress in the header, Esc cancels", default = False)
+    writethreads = IntProperty( name="Writer Threads", description="Threads encoding and writing diff maps and animation files while the export goes on, 0 writes them on the export thread", default = 2, min= 0, max=32)
+    writebuffer = IntProperty( name="Write Buffer (MB)", description="Most file data waiting to be written at a time, the export waits for the writer threads beyond it", default = 64, min= 1, max=4096)
+    disksnapshot = BoolProperty( name="Disk Snapshot", description="Page shape keys in from a temporary file next to the output instead of holding all of them in memory, for very large key sets", default = False)
+
+
+    ##### DRAW #####
+    def draw(self, context):
+        layout = self.layout
+
+        filepath = os.path.dirname( self.filepath )
+
+        os.path.join(filepath)
+
+        row = layout.row()
+
+        row = layout.row()
+        row.prop(self, "name")
+
+        col = layout.column(align=True)
+        col.prop(self, "width")
+        col.prop(self, "height")
+        col.prop(self, "margin")
+        col.prop(self, "nativebake")
+        col.prop(self, "imageformat")
+        col.prop(self, "axisscale")
+        col.prop(self, "workers")
+        col.prop(self, "backgroundexport")
+        col.prop(self, "writethreads")
+        col.prop(self, "writebuffer")
+        col.prop(self, "disksnapshot")
+        col.prop(self, "epsilon")
+        col.prop(self, "combinekeys")
+        col.prop(self, "combinetolerance")
+        col.prop(self, "basiscompress")
+        col.prop(self, "basiscount")
+        col.prop(self, "cropmaps")
+        col.prop(self, "atlas")
+        col.prop(self, "atlassize")
+        col.prop(self, "usecache")
+        col.prop(self, "timingreport")
+        col.prop(self, "profile")
+
+        me = context.active_object.data
+        col = layout.column(align=False)
+        # Removed, causing crash (klattimer)
+        # col.template_list(me, "uv_textures", me.uv_textures, "active_index", rows=2)
+
+        col = layout.column(align=False)
+        col.prop(self, "shapeson")
+        col.prop(self, "vertexdeltas")
+        col.prop(self, "deltaencoding")
+        col.prop(self, "animationson")
+        col.prop(self, "binaryanimation")
+        col.prop(self, "animationencoding")
+        col.prop(self, "animationcompress")
+        col.prop(self, "simplifyanimation")
+        col.prop(self, "simplifytolerance")
+        col.prop(self, "animationbuffer")
+        col.prop(self, "resumeanimation")
+
+    def execute(self, context):
+        #name = context.active_object.name
+
+        if self.backgroundexport:
+            return self.start_background(context)
+
+        start = time.time()
+        main(self, context)
+        print ("Time elapsed:", time.time() - start, "seconds.")
+
+        return {'FINISHED'}
+
+    # Run the export from a timer a step at a time (see export_steps),
+    # the work of steps on a background thread
+    def start_background(self, context):
+        self._settings = ExportSettings(self)
+        self._runner = steps.Runner(export_steps(self._settings, context))
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.1, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        runner = self._runner
+        if event.type == 'ESC':
+            runner.cancel()
+        elif event.type == 'TIMER':
+            runner.advance(0.1)
+        else:
+            return {'PASS_THROUGH'}
+
+        for level, message in self._settings.messages:
+            self.report(level, message)
+        del self._settings.messages[:]
+
+        wm = context.window_manager
+        if not runner.finished:
+            text = "Diff map export: %s, %d%%" % (runner.step.label, runner.progress * 100)
+            eta = runner.eta
+            if eta is not None:
+                text += ", %d:%02d left" % (eta // 60, eta % 60)
+            wm.progress_update(int(runner.progress * 100))
+            if context.area is not None:
+                context.area.header_text_set(text)
+            return {'RUNNING_MODAL'}
+
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        if context.area is not None:
+            context.area.header_text_set()
+
+        if runner.cancelled:
+            print(" Cancelled.")
+            self.report({'WARNING'}, "Diff map export cancelled")
+            return {'CANCELLED'}
+        if runner.error is not None:
+            traceback.print_exception(type(runner.error), runner.error, runner.error.__traceback__)
+            self.report({'ERROR'}, "Diff map export failed: %s" % runner.error)
+            return {'CANCELLED'}
+        print ("Time elapsed:", time.time() - runner.start, "seconds.")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        wm.fileselect_add(self)
+
+        try:
+            bpy.context.active_object.name
+        except NameError:
+            pass
+        else:
+            self.name = bpy.context.active_object.name
+
+
+        return {'RUNNING_MODAL'}
+
+def menu_func(self, context):
+    if bpy.data.filepath:
+        default_path = os.path.split(bpy.data.filepath)[0] + "/"
+        self.layout.operator(EXPORT_OT_tools_diffmap_exporter.bl_idname, text="Export Shape Key Animation for MetaMorph").filepath = default_path
+    else:
+        self.layout.operator(EXPORT_OT_tools_diffmap_exporter.bl_idname, text="Export Shape Key Animation for MetaMorph")
+
+def register():
+    bpy.utils.register_module(__package__)
+    bpy.types.INFO_MT_file_export.append(menu_func)
+
+    bpy.types.Object.animation_list = bpy.props.CollectionProperty(type = AnimationListItem)
+    bpy.types.Object.animation_list_index = bpy.props.IntProperty(name = "Index for animation_list", default = 0)
+
+    # bpy.utils.register_class(ObjectAnimationsList)
+    #bpy.utils.register_class(LIST_OT_NewItem)
+    #bpy.utils.register_class(LIST_OT_DeleteItem)
+    #bpy.utils.register_class(LIST_OT_MoveItem)
+
+def unregister():
+    bpy.utils.unregister_module(__package__)
+    bpy.types.INFO_MT_file_export.remove(menu_func)
+
+    del bpy.types.Object.animation_list
+    del bpy.types.Object.animation_list_index
+
+    # bpy.utils.unregister_class(ObjectAnimationsList)
+    #bpy.utils.unregister_class(LIST_OT_NewItem)
+    #bpy.utils.unregister_class(LIST_OT_DeleteItem)
+    #bpy.utils.unregister_class(LIST_OT_MoveItem)
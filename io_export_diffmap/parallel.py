@@ -0,0 +1,202 @@
+# Multi-process export of shape keys
+#
+# The mesh snapshot (basis, key coordinates, loop to vertex index, UVs and
+# triangles) is placed once in shared memory, then each key is turned into
+# a diff map by a pool of worker processes. Workers import the package
+# without bpy and rebuild the snapshot on the shared arrays.
+
+import multiprocessing
+import multiprocessing.sharedctypes
+import sys
+import traceback
+
+from . import delta
+from . import encode
+from . import pipeline
+from . import snapshot
+from . import timing
+from . import writer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Shared mesh data and settings of the current worker process
+_shared = {}
+
+
+# Allocate a shared array and a view on it that foreach_get can fill
+#   typecode: 'f' for float32, 'i' for int32
+# Returns: tuple (raw, view)
+def new_shared(typecode, count):
+    raw = multiprocessing.sharedctypes.RawArray(typecode, count)
+    return raw, _view(raw, typecode)
+
+
+# Copy an existing buffer into shared memory
+def share(buf, typecode):
+    raw, view = new_shared(typecode, len(buf))
+    view[:] = buf
+    return raw
+
+
+# Make a snapshot available to worker processes
+#   Snapshots mapped from a file are handed over as they are (workers map
+#   the same file), the arrays of others are placed in shared memory.
+#   keys: shared raw array the key coordinates were already read into (see
+#         snapshot.read_mesh), they are copied if None
+# Returns: the data argument of export_keys
+def share_snapshot(snap, keys=None):
+    if isinstance(snap, snapshot.MappedSnapshot):
+        return snap
+    return {
+        'basis': (share(snap.basis, 'f'), 'f'),
+        'keys': (keys if keys is not None else share(snap.keys, 'f'), 'f'),
+        'loop_vertices': (share(snap.loop_vertices, 'i'), 'i'),
+        'uvs': (share(snap.uvs, 'f'), 'f'),
+        'loop_starts': (share(snap.loop_starts, 'i'), 'i'),
+        'loop_totals': (share(snap.loop_totals, 'i'), 'i'),
+        'triangles': (share(snap.triangles(), 'i'), 'i'),
+        }
+
+
+def _view(raw, typecode):
+    if numpy is not None:
+        dtype = numpy.float32 if typecode == 'f' else numpy.int32
+        return numpy.frombuffer(raw, dtype=dtype)
+    return memoryview(raw).cast('B').cast(typecode)
+
+
+# Result of exporting one shape key
+#   path is None if no map was written, region is the texel window of the
+#   map the key touches (see pipeline.render_key)
+#   scales are the (x, y, z) offsets a full color step stands for
+#   pixels holds the rendered map instead of path with keep_pixels
+#   error is None on success, or the formatted exception of the worker
+#   timing is the timing.Report of the key, if asked for
+class KeyResult(object):
+    __slots__ = ('index', 'maxdiff', 'path', 'region', 'scales', 'pixels',
+                 'error', 'timing')
+
+    def __init__(self, index, maxdiff, path, region=None, scales=None,
+                 pixels=None, error=None):
+        self.index = index
+        self.maxdiff = maxdiff
+        self.path = path
+        self.region = region
+        self.scales = scales
+        self.pixels = pixels
+        self.error = error
+        self.timing = None
+
+
+def _init_worker(data, settings):
+    _shared.clear()
+    _shared.update(settings)
+    if isinstance(data, snapshot.MeshSnapshot):
+        _shared['snapshot'] = data
+        return
+    views = dict((key, _view(raw, typecode)) for key, (raw, typecode) in data.items())
+    _shared['snapshot'] = snapshot.MeshSnapshot(views['basis'], [], views['keys'],
+                                                views['loop_vertices'], views['uvs'],
+                                                views['loop_starts'], views['loop_totals'],
+                                                views['triangles'])
+
+
+# Export one key inside a worker
+#   job: tuple (key index, output path or None to only measure the key)
+def _export_key(job):
+    index, path = job
+    if _shared['timing']:
+        timing.start()
+    try:
+        result = _render_key(index, path)
+    except Exception:
+        result = KeyResult(index, 0.0, path, error=traceback.format_exc())
+    result.timing = timing.finish()
+    return result
+
+
+def _render_key(index, path):
+    snap = _shared['snapshot']
+    with timing.stage('deltas'):
+        diffs = snap.deltas(index)
+        axes = delta.axis_maxdiff(diffs)
+        maxdiff = max(axes)
+        scales = axes if _shared['axis_scale'] else (maxdiff, maxdiff, maxdiff)
+    timing.count('vertices', snap.vertex_count)
+
+    # Keys that don't move anything by more than epsilon are skipped
+    if maxdiff <= _shared['epsilon'] or path is None:
+        return KeyResult(index, maxdiff, None, scales=scales)
+
+    width, height = _shared['width'], _shared['height']
+    crop = _shared['crop']
+    with timing.stage('render'):
+        pixels, region = pipeline.render_key(diffs, scales, snap.loop_vertices,
+                                             snap.uvs, snap.triangles(),
+                                             width, height, _shared['margin'],
+                                             _shared['epsilon'], crop, _shared['plan'])
+    if crop:
+        if region is None:
+            return KeyResult(index, maxdiff, None, scales=scales)
+        width, height = region[2], region[3]
+
+    # Maps packed into an atlas go back to the parent process
+    if _shared['keep_pixels']:
+        return KeyResult(index, maxdiff, None, region, scales, pixels)
+    with timing.stage('encode'):
+        writer.write_atomic(path, encode.write_image, pixels, width, height,
+                            _shared['file_format'])
+    timing.count_file(path)
+
+    return KeyResult(index, maxdiff, path, region, scales)
+
+
+# Export shape keys with a pool of worker processes
+#   data: shared mesh snapshot, see share_snapshot
+#   jobs: list of (key index, output path or None)
+#   file_format: one of encode.EXTENSIONS
+#   epsilon, crop, plan: see pipeline.render_key
+#   keep_pixels: return the pixels of each map instead of writing it
+#   axis_scale: scale colors per axis instead of by the largest offset
+#   timed: time every key, see KeyResult.timing
+#   workers: number of processes, 0 for one per core
+#   executable: python interpreter used to start workers (inside Blender
+#               sys.executable is Blender itself)
+#   Workers start with the first result asked for. Closing the iterator
+#   early stops them.
+# Returns: iterator of KeyResult, in the order workers finish them
+def export_keys(data, jobs, width, height, margin, file_format='TGA',
+                epsilon=0.0, crop=False, keep_pixels=False, axis_scale=False,
+                timed=False, workers=0, executable=None, plan=None):
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(jobs)))
+
+    settings = {'width': width, 'height': height, 'margin': margin,
+                'file_format': file_format, 'epsilon': epsilon, 'crop': crop,
+                'keep_pixels': keep_pixels, 'axis_scale': axis_scale,
+                'timing': timed, 'plan': plan}
+
+    # Spawn fresh interpreters instead of forking the host application
+    ctx = multiprocessing.get_context('spawn')
+    if executable is not None:
+        ctx.set_executable(executable)
+
+    pool = ctx.Pool(workers, _init_worker, (data, settings))
+    finished = False
+    try:
+        for result in pool.imap_unordered(_export_key, jobs):
+            yield result
+        finished = True
+    finally:
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+        if executable is not None:
+            ctx.set_executable(sys.executable)
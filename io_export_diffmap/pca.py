@@ -0,0 +1,194 @@
+# Basis compression of shape keys
+#
+# With many keys most of their offsets are shared, so a few principal
+# components of the offsets of all keys rebuild every key closely. The
+# export can write one diff map per component (basis map) instead of one
+# per key, with a table of how much of every component a key is made of.
+# Key weights are linear, so animated weights turn into component weights
+# by the same table (project_samples) and MetaMorph blends as many maps as
+# there are components, however many keys there are.
+#
+# Components come from the eigenvectors of the Gram matrix of the key
+# offsets (see combine.gram_matrix). The offsets are not centered: a key at
+# weight 0 must move nothing, which a mean offset would break.
+#
+# Every component is scaled so its largest coefficient is 1, so a key at
+# weight 1 gives component weights within -1..1. How far the components
+# are from every key is kept per key: the largest offset error on any
+# vertex and axis, and the length of the error relative to the key.
+
+import array
+import math
+
+from . import combine
+from . import delta
+from . import snapshot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Components much smaller than the largest one are only rounding noise
+RELATIVE_LIMIT = 1e-12
+
+
+# Basis maps of the keys of a snapshot
+#   names: names of the components, one map each
+#   keys: names of the keys the components are made from
+#   coefficients: one row per key, one column per component
+#   max_errors: largest offset error of every key
+#   relative_errors: length of the error of every key over its own length
+#   snapshot: MeshSnapshot with the components as shape keys
+class Basis(object):
+
+    def __init__(self, names, keys, coefficients, max_errors, relative_errors, snap):
+        self.names = names
+        self.keys = keys
+        self.coefficients = coefficients
+        self.max_errors = max_errors
+        self.relative_errors = relative_errors
+        self.snapshot = snap
+
+
+# Eigenvalues and eigenvectors of a symmetric matrix, largest first
+# Returns: tuple (values, vectors), vectors[row][column] with one column
+#          per value
+def _eigen(matrix):
+    if numpy is not None:
+        values, vectors = numpy.linalg.eigh(numpy.asarray(matrix, dtype=numpy.float64))
+        order = numpy.argsort(values)[::-1]
+        return values[order].tolist(), vectors[:, order].tolist()
+
+    # Cyclic Jacobi rotations
+    n = len(matrix)
+    a = [[float(x) for x in row] for row in matrix]
+    v = [[1.0 if i == j else 0.0 for j in range(n)] for i in range(n)]
+    total = sum(x * x for row in a for x in row)
+    for sweep in range(50):
+        off = sum(a[p][q] * a[p][q] for p in range(n) for q in range(p + 1, n))
+        if off <= total * 1e-24:
+            break
+        for p in range(n):
+            for q in range(p + 1, n):
+                if a[p][q] == 0.0:
+                    continue
+                theta = (a[q][q] - a[p][p]) / (2.0 * a[p][q])
+                t = (1.0 if theta >= 0 else -1.0) / (abs(theta) + math.sqrt(theta * theta + 1.0))
+                c = 1.0 / math.sqrt(t * t + 1.0)
+                s = t * c
+                for row in a:
+                    row[p], row[q] = c * row[p] - s * row[q], s * row[p] + c * row[q]
+                a[p], a[q] = ([c * x - s * y for x, y in zip(a[p], a[q])],
+                              [s * x + c * y for x, y in zip(a[p], a[q])])
+                for row in v:
+                    row[p], row[q] = c * row[p] - s * row[q], s * row[p] + c * row[q]
+    order = sorted(range(n), key=lambda i: -a[i][i])
+    return [a[i][i] for i in order], [[row[i] for i in order] for row in v]
+
+
+# Copy of a snapshot buffer, a file mapped snapshot can be closed while
+# the basis is still used
+def _copy(buf):
+    if numpy is not None and isinstance(buf, numpy.ndarray):
+        return numpy.array(buf)
+    return buf
+
+
+# Compute the basis maps of a snapshot
+#   count: most components to keep
+#   epsilon: keys moving nothing by more than this take no part
+#   name: format of the component names
+# Returns: Basis
+def compress(snap, count, epsilon=0.0, name='PC%d'):
+    gram, maxdiffs = combine.gram_matrix(snap)
+    keys = [i for i in range(len(snap.names)) if maxdiffs[i] > epsilon]
+    values, vectors = _eigen([[gram[i][j] for j in keys] for i in keys])
+
+    # Coefficients of key k: sqrt(value n) * vector[k][n], component n is
+    # the sum of the keys times vector[k][n] / sqrt(value n)
+    components = [n for n in range(len(values))
+                  if values[n] > values[0] * RELATIVE_LIMIT][:max(0, count)]
+    coefficients = [[0.0] * len(components) for k in keys]
+    weights = [[0.0] * len(components) for k in keys]
+    for column, n in enumerate(components):
+        root = math.sqrt(values[n])
+        column_values = [vectors[k][n] * root for k in range(len(keys))]
+        largest = max(column_values, key=abs)
+        for k in range(len(keys)):
+            coefficients[k][column] = column_values[k] / largest
+            weights[k][column] = vectors[k][n] / root * largest
+
+    size = len(snap.basis)
+    width = len(components)
+    coords = delta.new_coord_buffer(size // 3 * width)
+    max_errors = [0.0] * len(keys)
+    step = max(3, combine.BLOCK_FLOATS // max(1, len(keys) + width) // 3 * 3)
+
+    # Components and the error of every key, a block of vertices at a time
+    if numpy is not None:
+        basis = numpy.asarray(snap.basis, dtype=numpy.float64)
+        w = numpy.asarray(weights, dtype=numpy.float64).reshape(len(keys), width)
+        c = numpy.asarray(coefficients, dtype=numpy.float64).reshape(len(keys), width)
+        errors = numpy.zeros(len(keys))
+        for first in range(0, size, step):
+            last = min(size, first + step)
+            block = numpy.empty((len(keys), last - first))
+            for row, k in enumerate(keys):
+                block[row] = basis[first:last] - numpy.asarray(snap.key_coords(k)[first:last])
+            parts = w.T.dot(block)
+            for column in range(width):
+                coords[column * size + first:column * size + last] = basis[first:last] - parts[column]
+            if len(keys) and last > first:
+                errors = numpy.maximum(errors, numpy.abs(block - c.dot(parts)).max(axis=1))
+        max_errors = errors.tolist()
+    else:
+        for first in range(0, size, step):
+            last = min(size, first + step)
+            block = [[b - x for b, x in zip(snap.basis[first:last], snap.key_coords(k)[first:last])]
+                     for k in keys]
+            parts = []
+            for column in range(width):
+                part = [0.0] * (last - first)
+                for row, offsets in zip(weights, block):
+                    f = row[column]
+                    part = [p + f * o for p, o in zip(part, offsets)]
+                parts.append(part)
+                coords[column * size + first:column * size + last] = array.array(
+                    'f', [b - p for b, p in zip(snap.basis[first:last], part)])
+            for k, offsets in enumerate(block):
+                for i, o in enumerate(offsets):
+                    rebuilt = sum(f * part[i] for f, part in zip(coefficients[k], parts))
+                    max_errors[k] = max(max_errors[k], abs(o - rebuilt))
+
+    # The part of a key the components miss, from its length
+    relative_errors = []
+    for row, k in enumerate(keys):
+        length = float(gram[k][k])
+        kept = sum(values[n] * vectors[row][n] ** 2 for n in components)
+        relative_errors.append(math.sqrt(max(0.0, length - kept) / length) if length > 0 else 0.0)
+
+    names = [name % i for i in range(width)]
+    basis_snap = snapshot.MeshSnapshot(_copy(snap.basis), names, coords,
+                                       _copy(snap.loop_vertices), _copy(snap.uvs),
+                                       _copy(snap.loop_starts), _copy(snap.loop_totals),
+                                       _copy(snap.triangles()))
+    return Basis(names, [snap.names[k] for k in keys], coefficients, max_errors,
+                 relative_errors, basis_snap)
+
+
+# Turn sampled key weights into component weights
+#   samples: animation.Samples of the keys of a Basis (Basis.keys)
+#   coefficients: one row per key, one column per component written
+#   names: names of the components written
+# Returns: animation.Samples of the components
+def project_samples(samples, coefficients, names):
+    projected = type(samples)(samples.frames, names)
+    if numpy is not None:
+        c = numpy.asarray(coefficients, dtype=numpy.float64).reshape(len(samples.names), len(names))
+        projected.values = numpy.asarray(samples.values, dtype=numpy.float64).dot(c)
+        return projected
+
+    projected.values = [[sum(v * row[column] for v, row in zip(values, coefficients))
+                         for column in range(len(names))] for values in samples.values]
+    return projected
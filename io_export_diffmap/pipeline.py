@@ -0,0 +1,44 @@
+# Per-key diff map pipeline
+#
+# Turns the deltas of one shape key into diff map pixels. Shared by the
+# in-process export and the worker processes, and free of bpy.
+
+from . import delta
+from . import raster
+
+# Color of a texel without any offset
+NEUTRAL = (0.5, 0.5, 0.5)
+
+
+# Render the diff map of one key
+#   Vertices moved by less than epsilon are left neutral, like the vertex
+#   deltas leave them out, and only the texels around the others are
+#   rasterized. The rest of the map stays neutral.
+#   maxdiff: scale of the colors, one for all axes or per axis, see
+#            delta.delta_colors
+#   crop: return only the touched region instead of the full map
+#   plan: raster.RasterPlan of the UV layout shared by all keys, the map
+#         is rasterized from scratch if None
+# Returns: tuple (pixels, region), region being the (x, y, width, height)
+#          texel window that was rasterized, or None if no polygon moves
+def render_key(diffs, maxdiff, loop_vertices, uvs, triangles,
+               width, height, margin, epsilon=0.0, crop=False, plan=None):
+    affected = delta.affected_vertices(diffs, epsilon)
+    region = raster.touched_region(uvs, triangles, loop_vertices, affected,
+                                   width, height, margin)
+    if region is None:
+        if crop:
+            return [], None
+        return raster.place([], (0, 0, 0, 0), width, height, NEUTRAL), None
+    if epsilon > 0:
+        diffs = delta.keep_affected(diffs, affected)
+
+    if plan is not None:
+        pixels = plan.render(delta.delta_colors(diffs, maxdiff), region, NEUTRAL)
+    else:
+        colors = delta.loop_colors(delta.delta_colors(diffs, maxdiff), loop_vertices)
+        pixels = raster.rasterize(uvs, triangles, colors, width, height, margin,
+                                  NEUTRAL, region)
+    if not crop:
+        pixels = raster.place(pixels, region, width, height, NEUTRAL)
+    return pixels, region
@@ -0,0 +1,547 @@
+# Software UV rasterizer for diff maps
+#
+# Replaces Blender's texture bake: polygons are triangulated in UV space,
+# per-loop colors are interpolated with barycentric coordinates at every
+# texel center and written to a flat RGB float buffer of width * height
+# texels, bottom row first (the layout of Image.pixels and TGA).
+# An edge margin is then grown around the UV islands like bake_margin does.
+
+import array
+import bisect
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Per-loop UV coordinates of a uv layer, flat [u0, v0, u1, v1, ...]
+#   uv_layer: mesh.uv_layers.active
+def read_uvs(uv_layer):
+    count = len(uv_layer.data) * 2
+    if numpy is not None:
+        buf = numpy.zeros(count, dtype=numpy.float32)
+    else:
+        buf = array.array('f', bytes(count * 4))
+    uv_layer.data.foreach_get('uv', buf)
+    return buf
+
+
+# First loop and loop count of every polygon
+# Returns: tuple (loop_starts, loop_totals)
+def read_polygons(polygons):
+    result = []
+    for attr in ('loop_start', 'loop_total'):
+        if numpy is not None:
+            buf = numpy.zeros(len(polygons), dtype=numpy.int32)
+        else:
+            buf = array.array('i', bytes(len(polygons) * 4))
+        polygons.foreach_get(attr, buf)
+        result.append(buf)
+    return tuple(result)
+
+
+# Split polygons into triangles of loop indices
+#   Quads are cut along their shorter UV diagonal (like bake_quad_split
+#   'AUTO'), other polygons are fanned from their first loop.
+# Returns: flat array [a0, b0, c0, a1, b1, c1, ...]
+def triangulate(loop_starts, loop_totals, uvs):
+    tris = array.array('i')
+    for start, total in zip(loop_starts, loop_totals):
+        start = int(start)
+        if total == 4:
+            a, b, c, d = start, start + 1, start + 2, start + 3
+            if _uv_dist(uvs, a, c) <= _uv_dist(uvs, b, d):
+                tris.extend((a, b, c, a, c, d))
+            else:
+                tris.extend((a, b, d, b, c, d))
+        else:
+            for i in range(1, int(total) - 1):
+                tris.extend((start, start + i, start + i + 1))
+    if numpy is not None:
+        return numpy.frombuffer(tris, dtype=numpy.int32).copy()
+    return tris
+
+
+def _uv_dist(uvs, a, b):
+    du = uvs[a * 2] - uvs[b * 2]
+    dv = uvs[a * 2 + 1] - uvs[b * 2 + 1]
+    return du * du + dv * dv
+
+
+# Rasterize per-loop colors into a width x height RGB float buffer
+#   uvs: per-loop UVs as returned by read_uvs
+#   triangles: loop index triples as returned by triangulate
+#   colors: per-loop RGB, as returned by delta.loop_colors
+#   margin: texels to extend the islands by, like render.bake_margin
+#   background: color of texels outside the UV islands and margin
+#   region: optional (x, y, width, height) window of the map to rasterize,
+#           the returned buffer then only covers that window
+def rasterize(uvs, triangles, colors, width, height, margin=0,
+              background=(0.0, 0.0, 0.0), region=None):
+    if region is None:
+        region = (0, 0, width, height)
+    if numpy is not None:
+        pixels, mask = _fill_numpy(uvs, triangles, colors, width, height, region)
+        pixels, mask = _dilate_numpy(pixels, mask, region[2], region[3], margin)
+        pixels[~mask] = background
+        return pixels.ravel()
+    pixels, mask = _fill_python(uvs, triangles, colors, width, height, region)
+    _dilate_python(pixels, mask, region[2], region[3], margin)
+    for i in range(region[2] * region[3]):
+        if not mask[i]:
+            pixels[i * 3:i * 3 + 3] = array.array('f', background)
+    return pixels
+
+
+# Texel window around the triangles that use any of the flagged vertices,
+# grown by the margin
+#   affected: one flag per vertex, see delta.affected_vertices
+# Returns: tuple (x, y, width, height), or None if no triangle is touched
+def touched_region(uvs, triangles, loop_vertices, affected, width, height,
+                   margin=0):
+    if numpy is not None:
+        tris = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+        verts = numpy.asarray(loop_vertices)[tris]
+        loops = tris[numpy.asarray(affected, dtype=bool)[verts].any(axis=1)].ravel()
+        if len(loops) == 0:
+            return None
+        uvs = numpy.asarray(uvs).reshape(-1, 2)
+        minu, minv = uvs[loops].min(axis=0)
+        maxu, maxv = uvs[loops].max(axis=0)
+    else:
+        minu = minv = float('inf')
+        maxu = maxv = float('-inf')
+        for t in range(0, len(triangles), 3):
+            loops = triangles[t:t + 3]
+            if not any(affected[loop_vertices[l]] for l in loops):
+                continue
+            for l in loops:
+                minu = min(minu, uvs[l * 2])
+                maxu = max(maxu, uvs[l * 2])
+                minv = min(minv, uvs[l * 2 + 1])
+                maxv = max(maxv, uvs[l * 2 + 1])
+        if minu > maxu:
+            return None
+
+    x0 = max(int(math.floor(minu * width)) - margin - 1, 0)
+    y0 = max(int(math.floor(minv * height)) - margin - 1, 0)
+    x1 = min(int(math.ceil(maxu * width)) + margin + 1, width)
+    y1 = min(int(math.ceil(maxv * height)) + margin + 1, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+# Put the pixels of a window back into a full width x height buffer
+def place(pixels, region, width, height, background=(0.0, 0.0, 0.0)):
+    x0, y0, rw, rh = region
+    if numpy is not None:
+        full = numpy.empty((height, width, 3), dtype=numpy.float32)
+        full[:] = background
+        full[y0:y0 + rh, x0:x0 + rw] = numpy.asarray(pixels).reshape(rh, rw, 3)
+        return full.ravel()
+    full = array.array('f', background) * (width * height)
+    for y in range(rh):
+        i = ((y0 + y) * width + x0) * 3
+        full[i:i + rw * 3] = pixels[y * rw * 3:(y + 1) * rw * 3]
+    return full
+
+
+# Texels whose centers are covered by each triangle, for all triangles at
+# once: every texel of every triangle's bounding box becomes a candidate,
+# candidates outside the triangle are dropped. Texels are counted within
+# the region window.
+# Returns: tuple (triangle, texel, w0, w1, w2) arrays
+def _coverage_numpy(uvs, triangles, width, height, region):
+    ox, oy, rw, rh = region
+    uvs = numpy.asarray(uvs, dtype=numpy.float64).reshape(-1, 2)
+    tris = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    x = uvs[tris, 0] * width - ox
+    y = uvs[tris, 1] * height - oy
+
+    x0 = numpy.clip(numpy.ceil(x.min(axis=1) - 0.5), 0, rw).astype(numpy.int64)
+    x1 = numpy.clip(numpy.floor(x.max(axis=1) - 0.5), -1, rw - 1).astype(numpy.int64)
+    y0 = numpy.clip(numpy.ceil(y.min(axis=1) - 0.5), 0, rh).astype(numpy.int64)
+    y1 = numpy.clip(numpy.floor(y.max(axis=1) - 0.5), -1, rh - 1).astype(numpy.int64)
+    bw = numpy.maximum(x1 - x0 + 1, 0)
+    bh = numpy.maximum(y1 - y0 + 1, 0)
+    area = ((x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) -
+            (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0]))
+    counts = numpy.where(area != 0, bw * bh, 0)
+
+    tri = numpy.repeat(numpy.arange(len(tris)), counts)
+    local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    px = x0[tri] + local % bw[tri]
+    py = y0[tri] + local // bw[tri]
+    cx = px + 0.5
+    cy = py + 0.5
+
+    tx, ty, ta = x[tri], y[tri], area[tri]
+    w0 = ((tx[:, 1] - cx) * (ty[:, 2] - cy) - (tx[:, 2] - cx) * (ty[:, 1] - cy)) / ta
+    w1 = ((tx[:, 2] - cx) * (ty[:, 0] - cy) - (tx[:, 0] - cx) * (ty[:, 2] - cy)) / ta
+    w2 = 1.0 - w0 - w1
+    eps = -1e-6
+    inside = (w0 >= eps) & (w1 >= eps) & (w2 >= eps)
+    return (tri[inside], (py * rw + px)[inside],
+            w0[inside], w1[inside], w2[inside])
+
+
+def _fill_numpy(uvs, triangles, colors, width, height, region):
+    tri, texel, w0, w1, w2 = _coverage_numpy(uvs, triangles, width, height, region)
+    tris = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)[tri]
+    colors = numpy.asarray(colors, dtype=numpy.float32).reshape(-1, 3)
+
+    count = region[2] * region[3]
+    pixels = numpy.zeros((count, 3), dtype=numpy.float32)
+    mask = numpy.zeros(count, dtype=bool)
+    pixels[texel] = (colors[tris[:, 0]] * w0[:, None] +
+                     colors[tris[:, 1]] * w1[:, None] +
+                     colors[tris[:, 2]] * w2[:, None])
+    mask[texel] = True
+    return pixels, mask
+
+
+def _fill_python(uvs, triangles, colors, width, height, region):
+    ox, oy, rw, rh = region
+    pixels = array.array('f', bytes(rw * rh * 3 * 4))
+    mask = bytearray(rw * rh)
+    for t in range(0, len(triangles), 3):
+        a, b, c = triangles[t], triangles[t + 1], triangles[t + 2]
+        x0, y0 = uvs[a * 2] * width - ox, uvs[a * 2 + 1] * height - oy
+        x1, y1 = uvs[b * 2] * width - ox, uvs[b * 2 + 1] * height - oy
+        x2, y2 = uvs[c * 2] * width - ox, uvs[c * 2 + 1] * height - oy
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        if area == 0:
+            continue
+        minx = max(int(math.ceil(min(x0, x1, x2) - 0.5)), 0)
+        maxx = min(int(math.floor(max(x0, x1, x2) - 0.5)), rw - 1)
+        miny = max(int(math.ceil(min(y0, y1, y2) - 0.5)), 0)
+        maxy = min(int(math.floor(max(y0, y1, y2) - 0.5)), rh - 1)
+        ca, cb, cc = colors[a * 3:a * 3 + 3], colors[b * 3:b * 3 + 3], colors[c * 3:c * 3 + 3]
+        for py in range(miny, maxy + 1):
+            cy = py + 0.5
+            for px in range(minx, maxx + 1):
+                cx = px + 0.5
+                w0 = ((x1 - cx) * (y2 - cy) - (x2 - cx) * (y1 - cy)) / area
+                w1 = ((x2 - cx) * (y0 - cy) - (x0 - cx) * (y2 - cy)) / area
+                w2 = 1.0 - w0 - w1
+                if w0 < -1e-6 or w1 < -1e-6 or w2 < -1e-6:
+                    continue
+                i = py * rw + px
+                for k in range(3):
+                    pixels[i * 3 + k] = ca[k] * w0 + cb[k] * w1 + cc[k] * w2
+                mask[i] = 1
+    return pixels, mask
+
+
+# Grow the filled area by one texel per margin pass, every empty texel
+# next to filled ones takes the average of its filled 8 neighbours.
+def _dilate_numpy(pixels, mask, width, height, margin):
+    pixels = pixels.reshape(height, width, 3)
+    mask = mask.reshape(height, width)
+    for n in range(margin):
+        if mask.all():
+            break
+        total = numpy.zeros_like(pixels)
+        count = numpy.zeros((height, width), dtype=numpy.float32)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                ys = slice(max(dy, 0), height + min(dy, 0))
+                yd = slice(max(-dy, 0), height + min(-dy, 0))
+                xs = slice(max(dx, 0), width + min(dx, 0))
+                xd = slice(max(-dx, 0), width + min(-dx, 0))
+                src = mask[ys, xs]
+                total[yd, xd] += pixels[ys, xs] * src[..., None]
+                count[yd, xd] += src
+        grow = ~mask & (count > 0)
+        pixels[grow] = total[grow] / count[grow][:, None]
+        mask = mask | grow
+    return pixels.reshape(-1, 3), mask.ravel()
+
+
+def _dilate_python(pixels, mask, width, height, margin):
+    for n in range(margin):
+        grown = []
+        for y in range(height):
+            for x in range(width):
+                i = y * width + x
+                if mask[i]:
+                    continue
+                total = [0.0, 0.0, 0.0]
+                count = 0
+                for ny in (y - 1, y, y + 1):
+                    for nx in (x - 1, x, x + 1):
+                        if 0 <= nx < width and 0 <= ny < height and mask[ny * width + nx]:
+                            j = (ny * width + nx) * 3
+                            total[0] += pixels[j]
+                            total[1] += pixels[j + 1]
+                            total[2] += pixels[j + 2]
+                            count += 1
+                if count:
+                    grown.append((i, [c / count for c in total]))
+        if not grown:
+            break
+        for i, color in grown:
+            pixels[i * 3:i * 3 + 3] = array.array('f', color)
+            mask[i] = 1
+
+
+# ------------------------------------ rasterization plan -------------------
+
+# What rasterize does with a UV layout, worked out once for every key
+#   The texels every triangle covers with their barycentric weights, and
+#   the texels every margin pass fills with the neighbours they average,
+#   only depend on the UVs, so they are the same for all keys of an export.
+#   Rendering a key (see render) is then a gather of its vertex colors.
+#   The plan covers the whole map, texels are sorted so the rows of a
+#   window are one slice.
+#   loop_vertices: vertex of every loop, see delta.read_loop_vertices
+#   other arguments: see rasterize
+class RasterPlan(object):
+
+    def __init__(self, uvs, triangles, loop_vertices, width, height, margin=0):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        if numpy is not None:
+            self._build_numpy(uvs, triangles, loop_vertices)
+        else:
+            self._build_python(uvs, triangles, loop_vertices)
+
+    def _build_numpy(self, uvs, triangles, loop_vertices):
+        width, height = self.width, self.height
+        tri, texel, w0, w1, w2 = _coverage_numpy(uvs, triangles, width, height,
+                                                 (0, 0, width, height))
+        # A texel covered twice (shared edges) keeps the last triangle, as
+        # in rasterize
+        order = numpy.argsort(texel, kind='mergesort')
+        texel = texel[order]
+        last = numpy.ones(len(texel), dtype=bool)
+        last[:-1] = texel[1:] != texel[:-1]
+        keep = order[last]
+        tris = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+        vertices = numpy.asarray(loop_vertices, dtype=numpy.int64)
+        self.texels = texel[last]
+        self.vertices = vertices[tris[tri[keep]]].astype(numpy.int32)
+        self.weights = numpy.stack((w0[keep], w1[keep], w2[keep]), axis=1).astype(numpy.float32)
+        self.rows = numpy.searchsorted(self.texels, numpy.arange(height + 1) * width)
+
+        # Margin passes, as _dilate_numpy grows the mask
+        self.passes = []
+        mask = numpy.zeros(width * height, dtype=bool)
+        mask[self.texels] = True
+        mask = mask.reshape(height, width)
+        for n in range(self.margin):
+            if mask.all():
+                break
+            count = numpy.zeros((height, width), dtype=numpy.int32)
+            for dy, dx in _NEIGHBOURS:
+                count[_shift(dy, height), _shift(dx, width)] += mask[_shift(-dy, height), _shift(-dx, width)]
+            grow = ~mask & (count > 0)
+            ys, xs = numpy.nonzero(grow)
+            if not len(ys):
+                break
+            neighbours = numpy.empty((len(ys), len(_NEIGHBOURS)), dtype=numpy.int64)
+            for k, (dy, dx) in enumerate(_NEIGHBOURS):
+                ny = ys + dy
+                nx = xs + dx
+                ok = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+                ok[ok] = mask[ny[ok], nx[ok]]
+                neighbours[:, k] = numpy.where(ok, ny * width + nx, -1)
+            texels = ys.astype(numpy.int64) * width + xs
+            rows = numpy.searchsorted(texels, numpy.arange(height + 1) * width)
+            self.passes.append((texels, neighbours, rows))
+            mask = mask | grow
+
+    def _build_python(self, uvs, triangles, loop_vertices):
+        width, height = self.width, self.height
+        covered = {}
+        for t in range(0, len(triangles), 3):
+            a, b, c = triangles[t], triangles[t + 1], triangles[t + 2]
+            x0, y0 = uvs[a * 2] * width, uvs[a * 2 + 1] * height
+            x1, y1 = uvs[b * 2] * width, uvs[b * 2 + 1] * height
+            x2, y2 = uvs[c * 2] * width, uvs[c * 2 + 1] * height
+            area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+            if area == 0:
+                continue
+            minx = max(int(math.ceil(min(x0, x1, x2) - 0.5)), 0)
+            maxx = min(int(math.floor(max(x0, x1, x2) - 0.5)), width - 1)
+            miny = max(int(math.ceil(min(y0, y1, y2) - 0.5)), 0)
+            maxy = min(int(math.floor(max(y0, y1, y2) - 0.5)), height - 1)
+            for py in range(miny, maxy + 1):
+                cy = py + 0.5
+                for px in range(minx, maxx + 1):
+                    cx = px + 0.5
+                    w0 = ((x1 - cx) * (y2 - cy) - (x2 - cx) * (y1 - cy)) / area
+                    w1 = ((x2 - cx) * (y0 - cy) - (x0 - cx) * (y2 - cy)) / area
+                    w2 = 1.0 - w0 - w1
+                    if w0 < -1e-6 or w1 < -1e-6 or w2 < -1e-6:
+                        continue
+                    covered[py * width + px] = (loop_vertices[a], loop_vertices[b],
+                                                loop_vertices[c], w0, w1, w2)
+
+        self.texels = array.array('i', sorted(covered))
+        self.vertices = array.array('i')
+        self.weights = array.array('f')
+        for texel in self.texels:
+            entry = covered[texel]
+            self.vertices.extend(entry[:3])
+            self.weights.extend(entry[3:])
+        self.rows = [bisect.bisect_left(self.texels, y * width) for y in range(height + 1)]
+
+        self.passes = []
+        mask = bytearray(width * height)
+        for texel in self.texels:
+            mask[texel] = 1
+        for n in range(self.margin):
+            texels = array.array('i')
+            neighbours = array.array('i')
+            for y in range(height):
+                for x in range(width):
+                    if mask[y * width + x]:
+                        continue
+                    found = [(y + dy) * width + x + dx if 0 <= y + dy < height and
+                             0 <= x + dx < width and mask[(y + dy) * width + x + dx] else -1
+                             for dy, dx in _NEIGHBOURS]
+                    if max(found) >= 0:
+                        texels.append(y * width + x)
+                        neighbours.extend(found)
+            if not texels:
+                break
+            for texel in texels:
+                mask[texel] = 1
+            rows = [bisect.bisect_left(texels, y * width) for y in range(height + 1)]
+            self.passes.append((texels, neighbours, rows))
+
+    # Render per vertex colors like rasterize does
+    #   colors: RGB per vertex, see delta.delta_colors
+    #   region: (x, y, width, height) window of the map to render, all of
+    #           it if None
+    # Returns: RGB float buffer of the window
+    def render(self, colors, region=None, background=(0.0, 0.0, 0.0)):
+        width, height, margin = self.width, self.height, self.margin
+        if region is None:
+            region = (0, 0, width, height)
+        x, y, rw, rh = region
+        # Margin texels take their color from texels up to margin away
+        window = (max(x - margin, 0), max(y - margin, 0),
+                  min(x + rw + margin, width), min(y + rh + margin, height))
+        if numpy is not None:
+            pixels = self._render_numpy(colors, window, background)
+        else:
+            pixels = self._render_python(colors, window, background)
+
+        wx0, wy0, wx1, wy1 = window
+        if window == (x, y, x + rw, y + rh):
+            return pixels
+        if numpy is not None:
+            pixels = pixels.reshape(wy1 - wy0, wx1 - wx0, 3)
+            return pixels[y - wy0:y - wy0 + rh, x - wx0:x - wx0 + rw].ravel()
+        result = array.array('f')
+        ww = wx1 - wx0
+        for row in range(y - wy0, y - wy0 + rh):
+            start = (row * ww + x - wx0) * 3
+            result.extend(pixels[start:start + rw * 3])
+        return result
+
+    # Plan entries within a window and their texels in it
+    def _window_numpy(self, texels, rows, window):
+        wx0, wy0, wx1, wy1 = window
+        first, last = rows[wy0], rows[wy1]
+        texels = texels[first:last]
+        tx = texels % self.width
+        inside = (tx >= wx0) & (tx < wx1)
+        local = (texels[inside] // self.width - wy0) * (wx1 - wx0) + tx[inside] - wx0
+        return numpy.flatnonzero(inside) + first, local
+
+    def _render_numpy(self, colors, window, background):
+        wx0, wy0, wx1, wy1 = window
+        ww = wx1 - wx0
+        count = ww * (wy1 - wy0)
+        colors = numpy.asarray(colors, dtype=numpy.float32).reshape(-1, 3)
+        pixels = numpy.zeros((count, 3), dtype=numpy.float32)
+        mask = numpy.zeros(count, dtype=bool)
+
+        entries, local = self._window_numpy(self.texels, self.rows, window)
+        vertices = self.vertices[entries]
+        weights = self.weights[entries]
+        pixels[local] = (colors[vertices[:, 0]] * weights[:, 0, None] +
+                         colors[vertices[:, 1]] * weights[:, 1, None] +
+                         colors[vertices[:, 2]] * weights[:, 2, None])
+        mask[local] = True
+
+        for texels, neighbours, rows in self.passes:
+            entries, local = self._window_numpy(texels, rows, window)
+            neighbours = neighbours[entries]
+            total = numpy.zeros((len(entries), 3), dtype=numpy.float32)
+            found = numpy.zeros(len(entries), dtype=numpy.float32)
+            for k in range(neighbours.shape[1]):
+                source = neighbours[:, k]
+                sx = source % self.width
+                sy = source // self.width
+                ok = (source >= 0) & (sx >= wx0) & (sx < wx1) & (sy >= wy0) & (sy < wy1)
+                total[ok] += pixels[(sy[ok] - wy0) * ww + sx[ok] - wx0]
+                found[ok] += 1
+            ok = found > 0
+            pixels[local[ok]] = total[ok] / found[ok][:, None]
+            mask[local[ok]] = True
+
+        pixels[~mask] = background
+        return pixels.ravel()
+
+    def _render_python(self, colors, window, background):
+        wx0, wy0, wx1, wy1 = window
+        width = self.width
+        ww = wx1 - wx0
+        pixels = array.array('f', background) * (ww * (wy1 - wy0))
+
+        def inside(texel):
+            tx = texel % width
+            ty = texel // width
+            if wx0 <= tx < wx1 and wy0 <= ty < wy1:
+                return (ty - wy0) * ww + tx - wx0
+            return -1
+
+        for i in range(self.rows[wy0], self.rows[wy1]):
+            local = inside(self.texels[i])
+            if local < 0:
+                continue
+            a, b, c = self.vertices[i * 3:i * 3 + 3]
+            w0, w1, w2 = self.weights[i * 3:i * 3 + 3]
+            for k in range(3):
+                pixels[local * 3 + k] = colors[a * 3 + k] * w0 + colors[b * 3 + k] * w1 + colors[c * 3 + k] * w2
+
+        step = len(_NEIGHBOURS)
+        for texels, neighbours, rows in self.passes:
+            grown = []
+            for i in range(rows[wy0], rows[wy1]):
+                local = inside(texels[i])
+                if local < 0:
+                    continue
+                total = [0.0, 0.0, 0.0]
+                found = 0
+                for source in neighbours[i * step:(i + 1) * step]:
+                    j = inside(source) if source >= 0 else -1
+                    if j >= 0:
+                        total[0] += pixels[j * 3]
+                        total[1] += pixels[j * 3 + 1]
+                        total[2] += pixels[j * 3 + 2]
+                        found += 1
+                if found:
+                    grown.append((local, [n / found for n in total]))
+            for local, color in grown:
+                pixels[local * 3:local * 3 + 3] = array.array('f', color)
+        return pixels
+
+
+# Neighbour offsets (dy, dx) in the order margin passes add them up
+_NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+
+# Slice of an axis of the given size shifted by an offset, see _dilate_numpy
+def _shift(offset, size):
+    return slice(max(-offset, 0), size + min(-offset, 0))
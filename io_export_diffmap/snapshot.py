@@ -0,0 +1,251 @@
+# Mesh snapshot
+#
+# Everything the export computes on is read from the mesh once, with bulk
+# foreach_get calls, into flat contiguous buffers: the basis, the
+# coordinates of every shape key one after another, the vertex of every
+# loop, the loop UVs and the polygons. The diff map code past this point
+# only sees the snapshot, never bpy, so it runs the same inside Blender, in
+# worker processes and on made up meshes (see benchmark).
+#
+# For very large key sets the snapshot can live in a file instead, mapped
+# into memory (MappedSnapshot): keys are written one at a time and paged
+# in by the OS when a key is used, so only about one key is held at once.
+#
+# File format (little endian, blocks aligned to 64 bytes):
+#   char[4]  magic 'MMSN'
+#   uint16   version
+#   uint16   flags (unused, 0)
+#   uint32   vertex count, loop count, polygon count, triangle count
+#   uint32   key count
+#   uint64   offsets of the basis, loop vertices, UVs, loop starts, loop
+#            totals and triangles blocks
+#   per key: uint64 offset of its coordinates, uint16 name length, utf-8 name
+#   blocks:  float32 basis (vertices * 3), int32 loop vertices, float32 UVs
+#            (loops * 2), int32 loop starts and totals, int32 triangles
+#            (triangles * 3), float32 coordinates of every key (vertices * 3)
+
+import array
+import mmap
+import struct
+import sys
+
+from . import delta
+from . import raster
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SNAPSHOT_MAGIC = b'MMSN'
+SNAPSHOT_VERSION = 1
+
+_HEADER = '<4sHHIIIII6Q'
+_ALIGN = 64
+
+
+# Contiguous copy of the mesh data of an export
+#   basis: flat basis coordinates, see delta.read_coords
+#   names: shape key names, one per key
+#   keys: coordinates of all keys one after another, same layout as basis
+#   loop_vertices: see delta.read_loop_vertices
+#   uvs: see raster.read_uvs
+#   loop_starts, loop_totals: see raster.read_polygons
+#   triangles: see raster.triangulate, made when first asked for if None
+class MeshSnapshot(object):
+
+    def __init__(self, basis, names, keys, loop_vertices, uvs, loop_starts,
+                 loop_totals, triangles=None):
+        self.basis = basis
+        self.names = list(names)
+        self.keys = keys
+        self.loop_vertices = loop_vertices
+        self.uvs = uvs
+        self.loop_starts = loop_starts
+        self.loop_totals = loop_totals
+        self._triangles = triangles
+
+    @property
+    def vertex_count(self):
+        return len(self.basis) // 3
+
+    # Coordinates of one key
+    def key_coords(self, index):
+        count = len(self.basis)
+        return self.keys[index * count:(index + 1) * count]
+
+    # Offsets (basis - shape) of one key, see delta.compute_deltas
+    def deltas(self, index):
+        return delta.compute_deltas(self.basis, self.key_coords(index))
+
+    # UV triangles of the polygons, see raster.triangulate
+    def triangles(self):
+        if self._triangles is None:
+            self._triangles = raster.triangulate(self.loop_starts, self.loop_totals, self.uvs)
+        return self._triangles
+
+    # Views on shared memory can't be pickled, copies of them are
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for key, value in state.items():
+            if isinstance(value, memoryview):
+                state[key] = array.array(value.format, value)
+        return state
+
+
+# Snapshot a mesh and some of its shape keys
+#   mesh: bpy mesh, or anything with the same foreach_get collections
+#   shapes: shape key blocks to read
+#   keys: buffer of vertex count * 3 * len(shapes) floats to read the keys
+#         into (e.g. shared memory, see parallel.new_shared), allocated if None
+def read_mesh(mesh, shapes, keys=None):
+    basis = delta.read_coords(mesh.vertices)
+    count = len(basis)
+    if keys is None:
+        keys = delta.new_coord_buffer(count // 3 * len(shapes))
+    for i, shape in enumerate(shapes):
+        if isinstance(keys, array.array):
+            keys[i * count:(i + 1) * count] = delta.read_coords(shape.data, count // 3)
+        else:
+            shape.data.foreach_get('co', keys[i * count:(i + 1) * count])
+
+    loop_starts, loop_totals = raster.read_polygons(mesh.polygons)
+    return MeshSnapshot(basis, [shape.name for shape in shapes], keys,
+                        delta.read_loop_vertices(mesh.loops),
+                        raster.read_uvs(mesh.uv_layers.active),
+                        loop_starts, loop_totals)
+
+
+def _little(buf, typecode):
+    if numpy is not None:
+        return numpy.asarray(buf, dtype='<f4' if typecode == 'f' else '<i4').tobytes()
+    data = array.array(typecode, buf)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _pad(f):
+    f.write(bytes(-f.tell() % _ALIGN))
+
+
+# Write a snapshot file, one key at a time
+#   keys: function (index) -> coordinates of a key, one per name
+#   other arguments: see MeshSnapshot
+def write_file(path, basis, names, keys, loop_vertices, uvs, loop_starts,
+               loop_totals, triangles):
+    encoded = [name.encode('utf-8') for name in names]
+    table = struct.calcsize(_HEADER) + sum(10 + len(n) for n in encoded)
+    blocks = [(basis, 'f'), (loop_vertices, 'i'), (uvs, 'f'), (loop_starts, 'i'),
+              (loop_totals, 'i'), (triangles, 'i')]
+
+    with open(path, 'wb') as f:
+        f.write(bytes(table))
+        offsets = []
+        for buf, typecode in blocks:
+            _pad(f)
+            offsets.append(f.tell())
+            f.write(_little(buf, typecode))
+        key_offsets = []
+        for i in range(len(names)):
+            _pad(f)
+            key_offsets.append(f.tell())
+            f.write(_little(keys(i), 'f'))
+
+        f.seek(0)
+        f.write(struct.pack(_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+                            len(basis) // 3, len(loop_vertices), len(loop_starts),
+                            len(triangles) // 3, len(names), *offsets))
+        for offset, name in zip(key_offsets, encoded):
+            f.write(struct.pack('<QH', offset, len(name)) + name)
+
+
+# Snapshot of a file written by write_file, keys are read when used
+#   Pickles as its path, so worker processes map the file themselves.
+class MappedSnapshot(MeshSnapshot):
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack_from(_HEADER, self._map)
+        magic, version, flags, vertices, loops, polygons, triangles, count = header[:8]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self._map.close()
+            raise ValueError("Not a mesh snapshot: %s" % self.path)
+
+        pos = struct.calcsize(_HEADER)
+        names = []
+        self._keys = []
+        for i in range(count):
+            offset, length = struct.unpack_from('<QH', self._map, pos)
+            names.append(self._map[pos + 10:pos + 10 + length].decode('utf-8'))
+            self._keys.append(offset)
+            pos += 10 + length
+
+        sizes = [(vertices * 3, 'f'), (loops, 'i'), (loops * 2, 'f'), (polygons, 'i'),
+                 (polygons, 'i'), (triangles * 3, 'i')]
+        blocks = [self._block(offset, typecode, size)
+                  for offset, (size, typecode) in zip(header[8:], sizes)]
+        MeshSnapshot.__init__(self, blocks[0], names, None, blocks[1], blocks[2],
+                              blocks[3], blocks[4], blocks[5])
+
+    # Array on a block of the file, a view of the mapping with NumPy and a
+    # copy without
+    def _block(self, offset, typecode, count):
+        if numpy is not None:
+            dtype = '<f4' if typecode == 'f' else '<i4'
+            return numpy.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+        data = array.array(typecode, self._map[offset:offset + count * 4])
+        if sys.byteorder != 'little':
+            data.byteswap()
+        return data
+
+    def key_coords(self, index):
+        return self._block(self._keys[index], 'f', len(self.basis))
+
+    # Unmap the file, the snapshot can't be used afterwards
+    def close(self):
+        self.basis = self.loop_vertices = self.uvs = None
+        self.loop_starts = self.loop_totals = self._triangles = None
+        try:
+            self._map.close()
+        except BufferError:
+            # Arrays on the mapping are still around, it is closed once
+            # they are gone
+            pass
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
+
+
+# Snapshot a mesh into a file, reading one shape key at a time
+#   mesh, shapes: see read_mesh
+# Returns: MappedSnapshot of the file
+def map_mesh(mesh, shapes, path):
+    basis = delta.read_coords(mesh.vertices)
+    uvs = raster.read_uvs(mesh.uv_layers.active)
+    loop_starts, loop_totals = raster.read_polygons(mesh.polygons)
+
+    def keys(index):
+        return delta.read_coords(shapes[index].data, len(basis) // 3)
+
+    write_file(path, basis, [shape.name for shape in shapes], keys,
+               delta.read_loop_vertices(mesh.loops), uvs, loop_starts, loop_totals,
+               raster.triangulate(loop_starts, loop_totals, uvs))
+    return MappedSnapshot(path)
+
+
+# Write an existing snapshot to a file
+# Returns: MappedSnapshot of the file
+def save(snap, path):
+    write_file(path, snap.basis, snap.names, snap.key_coords, snap.loop_vertices,
+               snap.uvs, snap.loop_starts, snap.loop_totals, snap.triangles())
+    return MappedSnapshot(path)
@@ -0,0 +1,146 @@
+# Time sliced exports
+#
+# An export is written as a generator yielding a Step between units of
+# work (a shape key, an animation range, ...). run() drives it to the end
+# in one go; a Runner drives it a slice of time at a time, so Blender can
+# keep its UI alive in between (see the modal export operator), and can
+# cancel it between two steps.
+#
+# A step may carry work that touches no Blender data (rasterizing a key,
+# writing its files). A Runner does that work on a background thread and
+# only goes on with the export once it is done; either way its result is
+# sent back into the generator, and its errors are raised inside it so the
+# export cleans up after itself (try/finally around the steps).
+
+import concurrent.futures
+import time
+
+
+# Progress of an export
+#   label: what is done next
+#   done, total: units of work done and in all
+#   work: function to call before going on, or None
+class Step(object):
+
+    def __init__(self, label, done, total, work=None):
+        self.label = label
+        self.done = done
+        self.total = total
+        self.work = work
+
+
+# Run the steps of an export to the end, work included
+# Returns: what the generator returned
+def run(steps):
+    value = None
+    error = None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value = error = None
+        if step.work is not None:
+            try:
+                value = step.work()
+            except Exception as e:
+                error = e
+
+
+# Runs the steps of an export a slice of time at a time
+#   threaded: do the work of steps on a background thread
+class Runner(object):
+
+    def __init__(self, steps, threaded=True):
+        self.steps = steps
+        self.step = None
+        self.finished = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.start = time.time()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if threaded else None
+        self._future = None
+
+    # Go on with the export for about some seconds, or until work is
+    # handed to the background thread
+    # Returns: True while the export isn't finished
+    def advance(self, seconds=0.1):
+        end = time.time() + seconds
+        value = error = None
+        while not self.finished:
+            if self._future is not None and not self._future.done():
+                return True
+            if self.step is not None and time.time() >= end:
+                return True
+            if self._future is not None:
+                future, self._future = self._future, None
+                try:
+                    value = future.result()
+                except Exception as e:
+                    error = e
+
+            self._resume(value, error)
+            value = error = None
+            step = self.step
+            if self.finished or step.work is None:
+                continue
+            if self._executor is not None:
+                self._future = self._executor.submit(step.work)
+            else:
+                # Done in place, kept like background work so its result
+                # outlives the slice
+                self._future = concurrent.futures.Future()
+                try:
+                    self._future.set_result(step.work())
+                except Exception as e:
+                    self._future.set_exception(e)
+        return False
+
+    def _resume(self, value, error):
+        try:
+            if error is not None:
+                self.step = self.steps.throw(error)
+            else:
+                self.step = self.steps.send(value)
+        except StopIteration as stop:
+            self._finish(result=stop.value)
+        except Exception as e:
+            self._finish(error=e)
+
+    def _finish(self, result=None, error=None):
+        self.finished = True
+        self.result = result
+        self.error = error
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    # Stop the export between two steps, after the work of the current one
+    # is done, so every file written is whole
+    def cancel(self):
+        if self.finished:
+            return
+        if self._future is not None:
+            concurrent.futures.wait([self._future])
+            self._future = None
+        self.steps.close()
+        self.cancelled = True
+        self._finish()
+
+    # Part of the export done, 0..1
+    @property
+    def progress(self):
+        if self.finished:
+            return 1.0
+        if self.step is None or not self.step.total:
+            return 0.0
+        return min(1.0, float(self.step.done) / self.step.total)
+
+    # Seconds the export is expected to take still, None until a unit of
+    # work is done
+    @property
+    def eta(self):
+        progress = self.progress
+        if progress <= 0.0:
+            return None
+        return (time.time() - self.start) * (1.0 - progress) / progress
@@ -0,0 +1,337 @@
+# Streaming animation output
+#
+# Writes the animation ranges of an export (the TXT, JSON and binary files
+# of Write_Animation) without holding a whole range in memory. A range is
+# sampled 'buffer' frames at a time and every block is appended as double
+# rows (all keys) to a part file next to the JSON, then the part file is
+# read back block by block to write the text outputs and track by track
+# for the binary file and simplified tracks.
+#
+# The outputs of a range (its TXT and binary files and its entry of the
+# JSON, kept in a file of its own) can be written in the background (see
+# writer) while the next range is sampled. A range's part file is only
+# removed once all of them are in place. close() puts the JSON together
+# from the range entries under a temporary name, and only then replaces
+# the JSON of the last export, so a stopped export leaves it as it was.
+#
+# A progress file (JSON path + '.progress') records the ranges written and
+# the frames spilled to the part file of the current one, after every
+# flush. An export started again with resume picks up at the first frame
+# not on disk instead of starting over, and writes the outputs of ranges
+# whose part file is still there again. The progress file and range
+# entries are removed once every output is complete.
+
+import array
+import json
+import os
+import shutil
+import threading
+
+from . import animation
+from . import timing
+from . import writer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PROGRESS_VERSION = 3
+
+
+# Writes the animation ranges of one object, in order
+#   json_path: path of the JSON file of all ranges
+#   names: shape key names as written (one column each)
+#   scales: MaxDiffStore value of every key, or its (x, y, z) ScaleStore
+#           value with Per Axis Scale (see animation.FLAG_AXIS_SCALES)
+#   settings: dict of the export settings the output depends on, a resume
+#             only continues files written with the same settings
+#   buffer: frames sampled and held at a time
+#   resume: continue from the progress file if there is a matching one
+#   file_writer: writer.FileWriter for the outputs of every range, written
+#                right away if None
+class AnimationWriter(object):
+
+    def __init__(self, json_path, names, scales, settings, buffer=256, resume=False,
+                 file_writer=None):
+        self.json_path = json_path
+        self.progress_path = json_path + '.progress'
+        self.names = list(names)
+        self.scales = [list(s) if isinstance(s, (tuple, list)) else s for s in scales]
+        self.settings = settings
+        self.buffer = max(1, int(buffer))
+        self.file_writer = file_writer
+
+        state = self._load() if resume else None
+        if state is None:
+            state = {'version': PROGRESS_VERSION, 'names': self.names,
+                     'settings': settings, 'done': 0, 'frames': 0,
+                     'peaks': [0.0] * len(self.names), 'shape_keys': {},
+                     'outputs': []}
+        self.state = state
+        self._save()
+
+        # Outputs an interrupted export didn't finish
+        for output in self._pending():
+            self._write_outputs(*output)
+
+    # Ranges already written by an earlier, interrupted export
+    @property
+    def resumed(self):
+        return self.state['done']
+
+    def _load(self):
+        if not os.path.exists(self.progress_path):
+            return None
+        try:
+            with open(self.progress_path, 'r') as f:
+                state = json.load(f)
+        except ValueError:
+            return None
+        if (state.get('version') != PROGRESS_VERSION or state.get('names') != self.names or
+                state.get('settings') != json.loads(json.dumps(self.settings))):
+            return None
+        return state
+
+    # Written to a temporary file first, so a crash never leaves half a state
+    def _save(self):
+        temp = self.progress_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(temp, self.progress_path)
+
+    def _part_path(self, index):
+        return '%s.%d.part' % (self.json_path, index)
+
+    # JSON entry of a range, until close() puts the JSON together
+    def _entry_path(self, index):
+        return '%s.%d.entry' % (self.json_path, index)
+
+    # Outputs of ranges whose part file is still there
+    def _pending(self):
+        return [output for output in self.state['outputs']
+                if os.path.exists(self._part_path(output[0]))]
+
+    # Write one animation range
+    #   index: position of the range, ranges are written in order
+    #   sample: function (first frame, last frame) -> animation.Samples of
+    #           every key on those frames
+    #   txt_path, binary_path: outputs of the range, no binary file if None
+    #   shape_entry: function (column) -> ShapeKeys entry of the JSON
+    # Returns: columns of the keys active in the range, or None if it was
+    #          already written before a resume
+    def write_range(self, index, name, start, end, sample, txt_path,
+                    binary_path=None, shape_entry=None):
+        state = self.state
+        if index < state['done']:
+            return None
+        state['outputs'] = self._pending()
+        frames = max(0, end - start + 1)
+        part_path = self._part_path(index)
+        width = len(self.names)
+
+        # Sample blocks of frames to the part file
+        done = state['frames'] if os.path.exists(part_path) else 0
+        if not done:
+            state['peaks'] = [0.0] * width
+        with open(part_path, 'r+b' if done else 'wb') as part:
+            part.truncate(done * width * 8)
+            part.seek(0, 2)
+            for first in range(start + done, end + 1, self.buffer):
+                last = min(end, first + self.buffer - 1)
+                with timing.stage('sample_animation'):
+                    values = sample(first, last).values
+                if numpy is not None:
+                    values = numpy.asarray(values, dtype=numpy.float64).reshape(-1, width)
+                    part.write(values.tobytes())
+                    peaks = numpy.abs(values).max(axis=0).tolist() if len(values) else []
+                else:
+                    part.write(array.array('d', [v for row in values for v in row]).tobytes())
+                    peaks = [max(abs(row[c]) for row in values) for c in range(width)] if values else []
+                part.flush()
+                for column, peak in enumerate(peaks):
+                    state['peaks'][column] = max(state['peaks'][column], float(peak))
+                state['frames'] = last - start + 1
+                self._save()
+
+        active = [c for c, peak in enumerate(state['peaks'])
+                  if peak > animation.ACTIVE_THRESHOLD]
+        for column in active:
+            if shape_entry is not None:
+                state['shape_keys'][self.names[column]] = shape_entry(column)
+        output = [index, name, frames, active, txt_path, binary_path]
+        state['outputs'].append(output)
+        state['done'] = index + 1
+        state['frames'] = 0
+        state['peaks'] = [0.0] * width
+        self._save()
+
+        self._write_outputs(*output)
+        timing.count('frames_written', frames)
+        return active
+
+    # Write the outputs of a range from its part file, then remove the part
+    # file
+    def _write_outputs(self, index, name, frames, active, txt_path, binary_path):
+        part_path = self._part_path(index)
+        args = (part_path, frames, active)
+        outputs = [(self._entry_path(index), self._write_entry, (name,) + args),
+                   (txt_path, self._write_txt, args)]
+        if binary_path is not None:
+            outputs.append((binary_path, self._write_binary, args))
+
+        # The last output written removes the part file
+        left = [len(outputs)]
+        lock = threading.Lock()
+
+        def done():
+            with lock:
+                left[0] -= 1
+                last = not left[0]
+            if last:
+                os.remove(part_path)
+
+        size = frames * len(active) * 8
+        for path, write, write_args in outputs:
+            if self.file_writer is not None:
+                self.file_writer.submit(path, write, write_args, size, done)
+            else:
+                writer.write_atomic(path, write, *write_args)
+                done()
+                if path != self._entry_path(index):
+                    timing.count_file(path)
+
+    # Write the JSON entry of a range
+    def _write_entry(self, path, name, part_path, frames, active):
+        names = [self.names[c] for c in active]
+        simplify = self.settings.get('simplify', 'NONE')
+        tolerance = self.settings.get('tolerance', 0.0)
+
+        with open(path, 'wb') as out:
+            entry = '\n        %s: {\n            "ShapeKeys": %s,\n            "StartShape": ' % (
+                json.dumps(name), json.dumps(names))
+            out.write(entry.encode('utf-8'))
+
+            # Frames in blocks, all of them if not simplified
+            if not frames:
+                out.write(b'[]')
+            for offset, block in self._blocks(part_path, frames, active):
+                for i, values in enumerate(block):
+                    row = [float("%0.4f" % (v)) for v in values]
+                    if offset + i == 0:
+                        out.write(json.dumps(row).encode('utf-8'))
+                        if simplify == 'NONE':
+                            out.write(b',\n            "Frames": [')
+                    if simplify == 'NONE':
+                        out.write(((',' if offset + i else '') + '\n                ' +
+                                   json.dumps(row)).encode('utf-8'))
+                if simplify != 'NONE':
+                    break
+            if simplify == 'NONE':
+                if not frames:
+                    out.write(b',\n            "Frames": [')
+                out.write(b'\n            ]')
+
+            if simplify != 'NONE':
+                out.write((',\n            "FrameCount": %d,\n            "Interpolation": %s,'
+                           '\n            "Tracks": {' %
+                           (frames, json.dumps('STEP' if simplify == 'SPANS' else 'LINEAR'))
+                           ).encode('utf-8'))
+                for i, values in enumerate(self._tracks(part_path, frames, active)):
+                    keys = [[frame, float("%0.4f" % (value))] for frame, value in
+                            animation.simplify_track(values, tolerance, simplify)]
+                    out.write(('%s\n                %s: %s' % (',' if i else '', json.dumps(names[i]),
+                                                            json.dumps(keys))).encode('utf-8'))
+                out.write(b'\n            }')
+            out.write(b'\n        }')
+
+    # Write the TXT file of a range
+    def _write_txt(self, path, part_path, frames, active):
+        with open(path, 'w') as txt:
+            txt.write(str([self.names[c] for c in active]) + "\n")
+            txt.write(str([self.scales[c] for c in active]) + "\n")
+            for offset, block in self._blocks(part_path, frames, active):
+                for values in block:
+                    txt.write(str([float("%0.4f" % (v)) for v in values]) + "\n")
+
+    # Write the binary file of a range
+    def _write_binary(self, path, part_path, frames, active):
+        animation.write_tracks(path, [self.names[c] for c in active],
+                               [self.scales[c] for c in active],
+                               self._tracks(part_path, frames, active), frames,
+                               self.settings.get('encoding', 'UINT16'),
+                               self.settings.get('compress', True),
+                               self.settings.get('simplify', 'NONE'),
+                               self.settings.get('tolerance', 0.0))
+
+    # Rows of some columns of a part file, 'buffer' frames at a time
+    # Returns: iterator of (first frame offset, list of rows)
+    def _blocks(self, part_path, frames, columns):
+        width = len(self.names)
+        with open(part_path, 'rb') as part:
+            for offset in range(0, frames, self.buffer):
+                count = min(self.buffer, frames - offset)
+                if numpy is not None:
+                    block = numpy.fromfile(part, dtype=numpy.float64, count=count * width)
+                    yield offset, block.reshape(-1, width)[:, columns].tolist()
+                else:
+                    block = array.array('d')
+                    block.fromfile(part, count * width)
+                    yield offset, [[block[r * width + c] for c in columns] for r in range(count)]
+
+    # Every value of some columns of a part file, one column at a time
+    #   Without NumPy the whole part file is read in once.
+    def _tracks(self, part_path, frames, columns):
+        width = len(self.names)
+        if not frames:
+            for column in columns:
+                yield []
+            return
+        if numpy is not None:
+            data = numpy.memmap(part_path, dtype=numpy.float64, mode='r', shape=(frames, width))
+            for column in columns:
+                yield numpy.array(data[:, column])
+            del data
+            return
+        data = array.array('d')
+        with open(part_path, 'rb') as part:
+            data.fromfile(part, frames * width)
+        for column in columns:
+            yield data[column::width].tolist()
+
+    # Put the JSON together from the entries of all ranges and the
+    # ShapeKeys of all of them, once every entry is written
+    #   extra: dict of more top level entries, written before ShapeKeys
+    def close(self, extra=None):
+        if self.file_writer is not None:
+            self.file_writer.wait()
+        entries = [self._entry_path(index) for index in range(self.state['done'])]
+        # A resume writes the entries that failed
+        if not all(os.path.exists(path) for path in entries):
+            return
+
+        shape_keys = json.dumps(self.state['shape_keys'], indent=4).replace('\n', '\n    ')
+
+        def write(path):
+            with open(path, 'wb') as out:
+                out.write(b'{\n    "Animations": {')
+                for index, entry in enumerate(entries):
+                    if index:
+                        out.write(b',')
+                    with open(entry, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                out.write(b'\n    }')
+                for key, value in sorted((extra or {}).items()):
+                    value = json.dumps(value, indent=4, sort_keys=True).replace('\n', '\n    ')
+                    out.write((',\n    %s: %s' % (json.dumps(key), value)).encode('utf-8'))
+                out.write((',\n    "ShapeKeys": %s\n}\n' % shape_keys).encode('utf-8'))
+
+        writer.write_atomic(self.json_path, write)
+        timing.count_file(self.json_path)
+
+        # Keep the progress and entries while outputs are missing, a resume
+        # writes them
+        if not self._pending():
+            for entry in entries:
+                os.remove(entry)
+            os.remove(self.progress_path)
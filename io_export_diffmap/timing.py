@@ -0,0 +1,108 @@
+# Timing and counters of an export
+#
+# Code of every export stage is wrapped in stage(...) and bumps counters
+# with count(...). Both do nothing unless a report was started, so they can
+# stay in place for normal exports. Worker processes start their own report
+# per key and hand it back to be merged (see parallel).
+
+import contextlib
+import json
+import os
+import time
+
+# Report of the running export, if any
+_active = None
+
+
+# Timing and counters of one export
+class Report(object):
+
+    def __init__(self):
+        self.start = time.time()
+        self.seconds = 0.0
+        # stage -> [seconds, calls]
+        self.stages = {}
+        # key -> {stage -> seconds}
+        self.keys = {}
+        self.counters = {}
+
+    def add(self, name, seconds, key=None, calls=1):
+        entry = self.stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+        if key is not None:
+            stages = self.keys.setdefault(key, {})
+            stages[name] = stages.get(name, 0.0) + seconds
+
+    # Merge the stages and counters of a report made elsewhere
+    #   key: shape key the other report was about, if any
+    def merge(self, other, key=None):
+        for name, (seconds, calls) in other.stages.items():
+            self.add(name, seconds, key, calls)
+        for name, amount in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Write the report as JSON
+    #   info: dict of extra top level entries (object, settings, ...)
+    def write(self, path, info=None):
+        data = dict(info or {})
+        data['seconds'] = self.seconds or time.time() - self.start
+        data['stages'] = dict((name, {'seconds': s, 'calls': c})
+                              for name, (s, c) in sorted(self.stages.items()))
+        data['counters'] = self.counters
+        data['keys'] = self.keys
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+
+
+# Start collecting timing and counters
+# Returns: the new Report
+def start():
+    global _active
+    _active = Report()
+    return _active
+
+
+# Stop collecting
+# Returns: the finished Report, or None if none was started
+def finish():
+    global _active
+    report, _active = _active, None
+    if report is not None:
+        report.seconds = time.time() - report.start
+    return report
+
+
+# Time a block of code
+#   key: shape key the time is spent on, if any
+@contextlib.contextmanager
+def stage(name, key=None):
+    if _active is None:
+        yield
+        return
+    report = _active
+    begin = time.time()
+    try:
+        yield
+    finally:
+        report.add(name, time.time() - begin, key)
+
+
+# Add to a counter
+def count(name, amount=1):
+    if _active is not None:
+        _active.counters[name] = _active.counters.get(name, 0) + amount
+
+
+# Merge a report made elsewhere (e.g. by a worker) into the running one
+def merge(report, key=None):
+    if _active is not None and report is not None:
+        _active.merge(report, key)
+
+
+# Count the size of a file written
+def count_file(path):
+    if _active is not None and path is not None and os.path.exists(path):
+        count('bytes_written', os.path.getsize(path))
+        count('files_written')
+
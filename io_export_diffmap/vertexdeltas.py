@@ -0,0 +1,206 @@
+# Direct per-vertex delta export
+#
+# Instead of going through diff map images, the offsets of every shape key
+# are written per vertex to a sparse binary file that MetaMorph loads
+# without any texture sampling.
+#
+# Format (little endian):
+#   char[4]  magic 'MMVD'
+#   uint16   version
+#   uint8    encoding (see ENCODINGS)
+#   uint8    flags (unused, 0)
+#   uint32   vertex count
+#   uint32   UV entry count
+#   uint32   key count
+#   per UV entry: float32 u, float32 v, uint32 vertex
+#   per key: uint16 name length, utf-8 name, float32 scale x, y, z,
+#            uint32 moved vertex count n, n uint32 vertex indices
+#            (ascending), n * 3 offsets
+#
+# The UV entries link the vertices of the Blender mesh to those of the
+# Unity mesh, which are split along UV seams: each Unity vertex takes the
+# offsets of the vertex listed under its UV. Offsets are basis - shape like
+# the diff maps, divided by the scale of their axis, and stored as int16
+# (-32767..32767 for -1..1) or as half floats.
+
+import array
+import os
+import struct
+import sys
+
+from . import delta
+from . import encode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DELTAS_MAGIC = b'MMVD'
+DELTAS_VERSION = 1
+
+ENCODINGS = {
+    'INT16': 0,
+    'FLOAT16': 1,
+    }
+
+_HEADER = '<4sHBBIII'
+
+
+# Every distinct (u, v, vertex) of the mesh loops
+#   uvs: flat loop UVs, see raster.read_uvs
+#   loop_vertices: see delta.read_loop_vertices
+# Returns: tuple (uv floats [u0, v0, u1, v1, ...], vertex indices)
+def uv_entries(uvs, loop_vertices):
+    if numpy is not None:
+        bits = numpy.asarray(uvs, dtype=numpy.float32).view(numpy.uint32).reshape(-1, 2)
+        table = numpy.column_stack((bits, numpy.asarray(loop_vertices, dtype=numpy.uint32)))
+        table = table[numpy.lexsort(table.T[::-1])]
+        keep = numpy.ones(len(table), dtype=bool)
+        keep[1:] = (table[1:] != table[:-1]).any(axis=1)
+        table = table[keep]
+        return (numpy.ascontiguousarray(table[:, :2]).view(numpy.float32).ravel(),
+                numpy.ascontiguousarray(table[:, 2]))
+
+    entries = sorted(set((uvs[i * 2], uvs[i * 2 + 1], v) for i, v in enumerate(loop_vertices)))
+    coords = array.array('f')
+    vertices = array.array('I')
+    for u, v, vertex in entries:
+        coords.extend((u, v))
+        vertices.append(vertex)
+    return coords, vertices
+
+
+# Sparse, quantized offsets of one key
+#   epsilon: vertices moving less than this on every axis are left out
+# Returns: tuple (scales, vertex indices, array of encoded offsets)
+def encode_key(deltas, encoding='INT16', epsilon=0.0):
+    scales = delta.axis_maxdiff(deltas)
+    inverse = [1.0 / s if s > 0 else 0.0 for s in scales]
+    affected = delta.affected_vertices(deltas, epsilon)
+
+    if numpy is not None:
+        indexes = numpy.flatnonzero(affected).astype(numpy.uint32)
+        values = numpy.asarray(deltas, dtype=numpy.float64).reshape(-1, 3)[indexes] * inverse
+        if ENCODINGS[encoding] == 0:
+            data = array.array('h', numpy.rint(values * 32767).astype(numpy.int16).tobytes())
+        else:
+            data = encode.half_array(values.ravel())
+        return scales, array.array('I', indexes.tobytes()), data
+
+    indexes = array.array('I', [i for i, flag in enumerate(affected) if flag])
+    values = [deltas[i * 3 + axis] * inverse[axis] for i in indexes for axis in range(3)]
+    if ENCODINGS[encoding] == 0:
+        data = array.array('h', [int(round(n * 32767)) for n in values])
+    else:
+        data = encode.half_array(values)
+    return scales, indexes, data
+
+
+def _little(data):
+    if sys.byteorder != 'little':
+        data = array.array(data.typecode, data)
+        data.byteswap()
+    return data.tobytes()
+
+
+# UV entries as stored in the file
+def _entries(uvs, vertices):
+    if numpy is not None:
+        table = numpy.empty(len(vertices), dtype=[('u', '<f4'), ('v', '<f4'), ('vertex', '<u4')])
+        uvs = numpy.asarray(uvs, dtype=numpy.float32).reshape(-1, 2)
+        table['u'] = uvs[:, 0]
+        table['v'] = uvs[:, 1]
+        table['vertex'] = vertices
+        return table.tobytes()
+    entries = bytearray()
+    for i, vertex in enumerate(vertices):
+        entries += struct.pack('<ffI', uvs[i * 2], uvs[i * 2 + 1], vertex)
+    return bytes(entries)
+
+
+# Writes a delta file key by key, so only one key is held at a time
+#   The file is written under a temporary name and renamed by close(), so
+#   it appears whole or not at all.
+#   vertex_count: vertices of the mesh
+#   uvs, vertices: see uv_entries
+#   encoding: one of ENCODINGS
+class DeltaWriter(object):
+
+    def __init__(self, path, vertex_count, uvs, vertices, encoding='INT16'):
+        self.encoding = encoding
+        self.count = 0
+        self.path = path
+        self.file = open(path + '.tmp', 'wb')
+        self.file.write(struct.pack(_HEADER, DELTAS_MAGIC, DELTAS_VERSION,
+                                    ENCODINGS[encoding], 0, vertex_count,
+                                    len(vertices), 0))
+        self.file.write(_entries(uvs, vertices))
+
+    # Add the offsets (basis - shape) of one key
+    # Returns: tuple (scales, number of vertices stored)
+    def add(self, name, deltas, epsilon=0.0):
+        scales, indexes, data = encode_key(deltas, self.encoding, epsilon)
+        encoded = name.encode('utf-8')
+        self.file.write(struct.pack('<H', len(encoded)) + encoded)
+        self.file.write(struct.pack('<fffI', scales[0], scales[1], scales[2], len(indexes)))
+        self.file.write(_little(indexes))
+        self.file.write(_little(data))
+        self.count += 1
+        return scales, len(indexes)
+
+    # Fill in the key count, close the file and put it in place
+    def close(self):
+        self.file.seek(struct.calcsize(_HEADER) - 4)
+        self.file.write(struct.pack('<I', self.count))
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    # Close and remove the file without putting it in place
+    def discard(self):
+        self.file.close()
+        os.remove(self.path + '.tmp')
+
+
+# Read a file written by DeltaWriter
+# Returns: tuple (vertex count, uvs, vertices, keys) with keys a list of
+#          (name, scales, vertex indices, offsets as flat floats)
+def read_deltas(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, code, flags, vertex_count, entries, count = struct.unpack_from(_HEADER, data)
+    if magic != DELTAS_MAGIC or version != DELTAS_VERSION:
+        raise ValueError("Not a MetaMorph delta file: %s" % path)
+    pos = struct.calcsize(_HEADER)
+
+    uvs, vertices = [], []
+    for i in range(entries):
+        u, v, vertex = struct.unpack_from('<ffI', data, pos)
+        uvs.extend((u, v))
+        vertices.append(vertex)
+        pos += 12
+
+    keys = []
+    for n in range(count):
+        length = struct.unpack_from('<H', data, pos)[0]
+        name = data[pos + 2:pos + 2 + length].decode('utf-8')
+        pos += 2 + length
+        sx, sy, sz, moved = struct.unpack_from('<fffI', data, pos)
+        pos += 16
+
+        indexes = array.array('I', data[pos:pos + moved * 4])
+        pos += moved * 4
+        values = array.array('h' if code == 0 else 'H', data[pos:pos + moved * 6])
+        pos += moved * 6
+        if sys.byteorder != 'little':
+            indexes.byteswap()
+            values.byteswap()
+
+        scales = (sx, sy, sz)
+        if code == 0:
+            offsets = [n / 32767.0 * scales[i % 3] for i, n in enumerate(values)]
+        else:
+            offsets = [encode.half_to_float(n) * scales[i % 3] for i, n in enumerate(values)]
+        keys.append((name, scales, list(indexes), offsets))
+    return vertex_count, uvs, vertices, keys
@@ -0,0 +1,115 @@
+# Background file writing
+#
+# Diff maps and animation files are encoded and written by a pool of
+# threads while the export goes on with the next key or animation range
+# (zlib and file writes let other threads run meanwhile). Every file is
+# written under a temporary name next to it and renamed once complete, so
+# it appears whole or not at all.
+#
+# Data handed to the pool counts against a byte budget. Submitting more
+# waits until enough of it is written, which caps the memory held by files
+# waiting to be written however slow the disk is.
+
+import concurrent.futures
+import os
+import threading
+
+from . import encode
+from . import timing
+
+# Bytes of queued file data held at most
+BUFFER_BYTES = 64 * 1024 * 1024
+
+
+# Write a file through a temporary one, renamed once complete
+#   write: function (path, *args) writing the file
+def write_atomic(path, write, *args):
+    temp = path + '.tmp'
+    try:
+        write(temp, *args)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+# Bytes held by a buffer (NumPy array, array.array, bytes, ...)
+def _size(buf):
+    if hasattr(buf, 'nbytes'):
+        return buf.nbytes
+    return len(buf) * getattr(buf, 'itemsize', 1)
+
+
+# Pool of threads writing files
+#   threads: number of writer threads
+#   buffer: bytes of queued data held at most, see submit
+class FileWriter(object):
+
+    def __init__(self, threads=2, buffer=BUFFER_BYTES):
+        self.buffer = max(1, int(buffer))
+        self.pending = 0
+        self.queued = 0
+        # Paths written and paths that failed, in the order they finished
+        self.written = []
+        self.failed = []
+        self.errors = []
+        self._lock = threading.Condition()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads))
+
+    # Write a file in the background
+    #   write: function (path, *args) writing the file, it is handed a
+    #          temporary path
+    #   size: bytes held by args until the file is written
+    #   done: function called on the writer thread once the file is in place
+    def submit(self, path, write, args=(), size=0, done=None):
+        with self._lock:
+            # Wait for earlier files if over budget, a file bigger than the
+            # whole budget waits for all of them
+            while self.pending and self.pending + size > self.buffer:
+                self._lock.wait()
+            self.pending += size
+            self.queued += 1
+        timing.count('bytes_queued', size)
+        self._executor.submit(self._write, path, write, args, size, done)
+
+    def _write(self, path, write, args, size, done):
+        try:
+            write_atomic(path, write, *args)
+            if done is not None:
+                done()
+        except Exception as e:
+            with self._lock:
+                self.failed.append(path)
+                self.errors.append(e)
+        else:
+            with self._lock:
+                self.written.append(path)
+        finally:
+            with self._lock:
+                self.pending -= size
+                self.queued -= 1
+                self._lock.notify_all()
+
+    # Encode and write a diff map in the background, see encode.write_image
+    def write_image(self, path, pixels, width, height, file_format='TGA'):
+        self.submit(path, encode.write_image, (pixels, width, height, file_format),
+                    _size(pixels))
+
+    # Wait until every file submitted so far is written (or failed)
+    def wait(self):
+        with self._lock:
+            while self.queued:
+                self._lock.wait()
+
+    # Wait for every file to be written and count them
+    #   Raises the first error of a file that couldn't be written.
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for path in self.written:
+            timing.count_file(path)
+        del self.written[:]
+        if self.errors:
+            error = self.errors[0]
+            del self.errors[:]
+            raise error
@@ -0,0 +1,5 @@
+# Tests of the bpy free parts of the exporter
+#
+#   python -m unittest discover tests
+#
+# run from the repository root, with or without NumPy installed.
@@ -0,0 +1,126 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from io_export_diffmap import atlas
+from io_export_diffmap import encode
+from io_export_diffmap import raster
+
+
+def _power_of_two(n):
+    return n > 0 and n & (n - 1) == 0
+
+
+class PackTest(unittest.TestCase):
+
+    def check(self, sizes, max_size, padding):
+        placements, sheets = atlas.pack(sizes, max_size, padding)
+        self.assertEqual(len(placements), len(sizes))
+        for width, height in sheets:
+            self.assertTrue(_power_of_two(width) and _power_of_two(height), (width, height))
+        rects = [(sheet, x, y, w, h) for (sheet, x, y), (w, h) in zip(placements, sizes)]
+        for sheet, x, y, w, h in rects:
+            self.assertLessEqual(x + w, sheets[sheet][0])
+            self.assertLessEqual(y + h, sheets[sheet][1])
+        # Rects grown by the padding never overlap
+        for i, (sheet, x, y, w, h) in enumerate(rects):
+            for other, ox, oy, ow, oh in rects[i + 1:]:
+                if other != sheet:
+                    continue
+                apart = (x + w + padding <= ox or ox + ow + padding <= x or
+                         y + h + padding <= oy or oy + oh + padding <= y)
+                self.assertTrue(apart, ((x, y, w, h), (ox, oy, ow, oh)))
+        return placements, sheets
+
+    def test_no_overlap(self):
+        rng = random.Random(1)
+        sizes = [(rng.randint(1, 60), rng.randint(1, 60)) for i in range(40)]
+        self.check(sizes, 256, 2)
+        self.check(sizes, 256, 0)
+
+    def test_shrinks_to_power_of_two(self):
+        placements, sheets = self.check([(20, 10), (30, 5)], 1024, 2)
+        self.assertEqual(sheets, [(64, 16)])
+
+    def test_overflow(self):
+        # Four 100x100 rects fill a 256 sheet, the fifth starts another
+        placements, sheets = self.check([(100, 100)] * 5, 256, 2)
+        self.assertEqual(len(sheets), 2)
+        self.assertEqual(sorted(sheet for sheet, x, y in placements), [0, 0, 0, 0, 1])
+        self.assertEqual(sheets, [(256, 256), (128, 128)])
+
+    def test_oversized(self):
+        placements, sheets = self.check([(300, 10), (10, 10)], 256, 2)
+        self.assertEqual(placements[0], (0, 0, 0))
+        self.assertEqual(sheets[0], (512, 16))
+
+
+class AtlasBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        # Maps are held quantized, dequantizing them encodes the same again
+        rng = random.Random(2)
+        pixels = [rng.uniform(0.0, 1.0) for i in range(48)] + [0.0, 0.5, 1.0]
+        steps = {'PNG16': 1.0 / 65535, 'EXR_HALF': 1.0 / 2048, 'EXR_FLOAT': 0.0}
+        for file_format in sorted(encode.EXTENSIONS):
+            data = atlas._quantize(pixels, file_format)
+            values = list(atlas._dequantize(data, file_format))
+            self.assertEqual(len(values), len(pixels))
+            self.assertEqual(bytes(atlas._quantize(values, file_format)), bytes(data), file_format)
+            step = steps.get(file_format, 1.0 / 255)
+            for value, pixel in zip(values, pixels):
+                self.assertLessEqual(abs(value - pixel), step / 2 + 1e-6, file_format)
+
+    def test_write(self):
+        builder = atlas.AtlasBuilder(max_size=64, padding=1, background=(0.5, 0.5, 0.5))
+        builder.add('Red', [1.0, 0.0, 0.0] * 8, 4, 2)
+        builder.add('Blue', [0.0, 0.0, 1.0] * 9, 3, 3)
+        paths = []
+
+        def path_for_sheet(index):
+            paths.append(os.path.join(self.dir, 'sheet%d.tga' % index))
+            return paths[-1]
+
+        with mock.patch('sys.stdout'):
+            result = builder.write(path_for_sheet)
+        path = os.path.join(self.dir, 'sheet0.tga')
+        self.assertEqual(set(paths), {path})
+        self.assertEqual(os.listdir(self.dir), ['sheet0.tga'])
+        self.assertEqual(result['Blue'], (path, 0, 0, 3, 3))
+        self.assertEqual(result['Red'], (path, 4, 0, 4, 2))
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[12:16], b'\x08\x00\x04\x00')
+        texels = data[18:]
+
+        def bgr(x, y):
+            i = (y * 8 + x) * 3
+            return tuple(bytearray(texels[i:i + 3]))
+
+        self.assertEqual(bgr(0, 0), (255, 0, 0))
+        self.assertEqual(bgr(2, 2), (255, 0, 0))
+        self.assertEqual(bgr(4, 0), (0, 0, 255))
+        self.assertEqual(bgr(7, 1), (0, 0, 255))
+        self.assertEqual(bgr(3, 0), (128, 128, 128))
+        self.assertEqual(bgr(4, 2), (128, 128, 128))
+
+
+# Same cases on the pure Python paths
+class AtlasBuilderNoNumpyTest(AtlasBuilderTest):
+
+    def setUp(self):
+        AtlasBuilderTest.setUp(self)
+        for module in (atlas, encode, raster):
+            patch = mock.patch.object(module, 'numpy', None)
+            patch.start()
+            self.addCleanup(patch.stop)
@@ -0,0 +1,112 @@
+import array
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from io_export_diffmap import cache
+
+
+class ManifestTest(unittest.TestCase):
+
+    deltas = array.array('f', [0.5, -1.0, 0.0, 0.25, 0.0, 0.0])
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = cache.manifest_path(self.dir, 'Mesh')
+        self.map = os.path.join(self.dir, 'Mesh-Smile.tga')
+        with open(self.map, 'wb') as f:
+            f.write(b'map')
+        self.layout = cache.layout_digest('1.0', [array.array('f', [0.0, 1.0])], {'width': 64})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    # Manifest of a previous export holding one written map
+    def saved(self):
+        manifest = cache.Manifest(self.path, self.layout)
+        digest = manifest.digest(self.deltas)
+        manifest.store('Smile', digest, self.map, 1.0, (0, 0, 4, 4), (0.5, 1.0, 0.0))
+        manifest.save()
+        return digest
+
+    def test_unchanged(self):
+        digest = self.saved()
+        entry = cache.Manifest(self.path, self.layout).lookup('Smile', digest)
+        self.assertEqual(entry['path'], self.map)
+        self.assertEqual(entry['maxdiff'], 1.0)
+        self.assertEqual(entry['region'], [0, 0, 4, 4])
+        self.assertEqual(entry['scales'], [0.5, 1.0, 0.0])
+
+    def test_deltas_changed(self):
+        self.saved()
+        manifest = cache.Manifest(self.path, self.layout)
+        moved = array.array('f', self.deltas)
+        moved[0] += 0.001
+        self.assertIsNone(manifest.lookup('Smile', manifest.digest(moved)))
+        self.assertIsNone(manifest.lookup('Blink', manifest.digest(self.deltas)))
+
+    def test_layout_changed(self):
+        self.saved()
+        for layout in (cache.layout_digest('1.0', [array.array('f', [0.0, 1.0])], {'width': 128}),
+                       cache.layout_digest('1.1', [array.array('f', [0.0, 1.0])], {'width': 64}),
+                       cache.layout_digest('1.0', [array.array('f', [0.0, 0.5])], {'width': 64})):
+            self.assertNotEqual(layout, self.layout)
+            manifest = cache.Manifest(self.path, layout)
+            self.assertIsNone(manifest.lookup('Smile', manifest.digest(self.deltas)))
+
+    def test_map_deleted(self):
+        digest = self.saved()
+        os.remove(self.map)
+        self.assertIsNone(cache.Manifest(self.path, self.layout).lookup('Smile', digest))
+
+    def test_skipped_key(self):
+        # A key without a map stays cached with no file to check
+        manifest = cache.Manifest(self.path, self.layout)
+        digest = manifest.digest(self.deltas)
+        manifest.store('Still', digest, None, 0.0)
+        manifest.save()
+        entry = cache.Manifest(self.path, self.layout).lookup('Still', digest)
+        self.assertIsNone(entry['path'])
+        self.assertEqual(entry['scales'], [0.0, 0.0, 0.0])
+
+    def test_discard(self):
+        digest = self.saved()
+        manifest = cache.Manifest(self.path, self.layout)
+        manifest.discard([self.map])
+        self.assertIsNone(manifest.lookup('Smile', digest))
+
+    def test_version_mismatch(self):
+        digest = self.saved()
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertEqual(data['version'], cache.MANIFEST_VERSION)
+        data['version'] = cache.MANIFEST_VERSION - 1
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        manifest = cache.Manifest(self.path, self.layout)
+        self.assertEqual(manifest.entries, {})
+        self.assertIsNone(manifest.lookup('Smile', digest))
+
+    def test_broken(self):
+        with open(self.path, 'w') as f:
+            f.write('{"version": ')
+        with mock.patch('sys.stdout'):
+            manifest = cache.Manifest(self.path, self.layout)
+        self.assertEqual(manifest.entries, {})
+
+    def test_atomic_save(self):
+        digest = self.saved()
+        with open(self.path) as f:
+            before = f.read()
+        # A value JSON can't hold fails the save half way through
+        manifest = cache.Manifest(self.path, self.layout)
+        manifest.store('Blink', digest, self.map, object())
+        with self.assertRaises(TypeError):
+            manifest.save()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted([os.path.basename(self.map),
+                                                               os.path.basename(self.path)]))
@@ -0,0 +1,96 @@
+import array
+import random
+import unittest
+from unittest import mock
+
+from io_export_diffmap import animation
+from io_export_diffmap import combine
+from io_export_diffmap import delta
+from io_export_diffmap import snapshot
+
+
+# Snapshot of keys moving a random basis by the given offsets
+def _snapshot(offsets):
+    rng = random.Random(3)
+    basis = [rng.uniform(-1.0, 1.0) for i in range(len(offsets[0]))]
+    keys = []
+    for offset in offsets:
+        keys.extend(b - d for b, d in zip(basis, offset))
+    return snapshot.MeshSnapshot(array.array('f', basis), ['Key %d' % i for i in range(len(offsets))],
+                                 array.array('f', keys), [], [], [], [], [])
+
+
+def _random_offsets(seed, vertices=60):
+    rng = random.Random(seed)
+    return [rng.uniform(-0.5, 0.5) for i in range(vertices * 3)]
+
+
+def _mix(terms):
+    return [sum(w * o[n] for w, o in terms) for n in range(len(terms[0][1]))]
+
+
+class FindCombinationsTest(unittest.TestCase):
+
+    a = _random_offsets(1)
+    b = _random_offsets(2)
+
+    def assertRecipe(self, recipe, expected):
+        recipe = sorted(recipe)
+        self.assertEqual([i for i, w in recipe], [i for i, w in expected])
+        for (i, w), (j, v) in zip(recipe, expected):
+            self.assertAlmostEqual(w, v, places=3)
+
+    def test_sum(self):
+        snap = _snapshot([self.a, self.b, _mix([(1.0, self.a), (1.0, self.b)])])
+        found = combine.find_combinations(snap, 1e-4)
+        self.assertEqual(list(found), [2])
+        self.assertRecipe(found[2], [(0, 1.0), (1, 1.0)])
+
+    def test_weighted_sum(self):
+        snap = _snapshot([self.a, self.b, _mix([(0.5, self.a), (2.0, self.b)])])
+        found = combine.find_combinations(snap, 1e-4)
+        self.assertEqual(list(found), [2])
+        self.assertRecipe(found[2], [(0, 0.5), (1, 2.0)])
+
+    def test_not_a_combination(self):
+        snap = _snapshot([self.a, self.b, _random_offsets(3)])
+        self.assertEqual(combine.find_combinations(snap, 1e-4), {})
+
+    def test_terms_are_not_combined(self):
+        # The independent key comes last and is tried first, it must not
+        # stop the combination before it from being found
+        snap = _snapshot([self.a, self.b, _mix([(0.5, self.a), (2.0, self.b)]), _random_offsets(4)])
+        found = combine.find_combinations(snap, 1e-4)
+        self.assertEqual(list(found), [2])
+        self.assertRecipe(found[2], [(0, 0.5), (1, 2.0)])
+
+    def test_tolerance(self):
+        # A small corrective on top of the sum is only folded when allowed
+        corrective = [0.01 * d for d in _random_offsets(5)]
+        mixed = [m + c for m, c in zip(_mix([(1.0, self.a), (1.0, self.b)]), corrective)]
+        snap = _snapshot([self.a, self.b, mixed])
+        self.assertEqual(combine.find_combinations(snap, 1e-4), {})
+        self.assertEqual(list(combine.find_combinations(snap, 0.01)), [2])
+
+    def test_fold_samples(self):
+        samples = animation.Samples([1, 2, 3], ['A', 'B', 'AB'])
+        for frame, values in zip(samples.frames, [(1.0, 0.0, 0.0), (0.0, 0.5, 1.0), (0.25, 0.0, 0.5)]):
+            samples.set_frame(frame, [0, 1, 2], values)
+        folded = combine.fold_samples(samples, 2, [(2, [(0, 0.5), (1, 2.0)])])
+        self.assertEqual(folded.names, ['A', 'B'])
+        self.assertEqual(folded.frames, [1, 2, 3])
+        expected = [(1.0, 0.0), (0.5, 2.5), (0.5, 1.0)]
+        for row, values in zip(folded.values, expected):
+            self.assertEqual(len(row), 2)
+            for value, v in zip(row, values):
+                self.assertAlmostEqual(value, v)
+
+
+# Same cases on the pure Python paths
+class FindCombinationsNoNumpyTest(FindCombinationsTest):
+
+    def setUp(self):
+        for module in (animation, combine, delta):
+            patch = mock.patch.object(module, 'numpy', None)
+            patch.start()
+            self.addCleanup(patch.stop)
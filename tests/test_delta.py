@@ -0,0 +1,64 @@
+import unittest
+
+from io_export_diffmap import delta
+
+
+def _close(test, a, b):
+    a, b = list(a), list(b)
+    test.assertEqual(len(a), len(b))
+    for x, y in zip(a, b):
+        test.assertAlmostEqual(x, y, places=6)
+
+
+class DeltaColorsTest(unittest.TestCase):
+
+    deltas = [0.5, -1.0, 0.0,
+              -0.25, 0.5, 0.0]
+
+    def test_compute_deltas(self):
+        basis = [1.0, 2.0, 3.0, 0.0, 0.0, 0.0]
+        coords = [0.5, 3.0, 3.0, 0.25, -0.5, 0.0]
+        _close(self, delta.compute_deltas(basis, coords), [0.5, -1.0, 0.0, -0.25, 0.5, 0.0])
+
+    def test_axis_maxdiff(self):
+        self.assertEqual(delta.axis_maxdiff(self.deltas), (0.5, 1.0, 0.0))
+        self.assertEqual(delta.maxdiff(self.deltas), 1.0)
+        self.assertEqual(delta.axis_maxdiff([]), (0.0, 0.0, 0.0))
+
+    def test_single_scale(self):
+        # color = 1.0 - ((diff / maxdiff + 1.0) * 0.5)
+        colors = delta.delta_colors(self.deltas, 1.0)
+        _close(self, colors, [0.25, 1.0, 0.5, 0.625, 0.25, 0.5])
+
+    def test_axis_scales(self):
+        # Every axis spans the full range, an axis without offset stays 0.5
+        colors = delta.delta_colors(self.deltas, delta.axis_maxdiff(self.deltas))
+        _close(self, colors, [0.0, 1.0, 0.5, 0.75, 0.25, 0.5])
+
+    def test_equal_axis_scales(self):
+        _close(self, delta.delta_colors(self.deltas, (1.0, 1.0, 1.0)),
+               delta.delta_colors(self.deltas, 1.0))
+
+    def test_no_offset(self):
+        # A shape without any offset gives black
+        _close(self, delta.delta_colors([0.0] * 6, 0.0), [0.0] * 6)
+        _close(self, delta.delta_colors([0.0] * 6, (0.0, 0.0, 0.0)), [0.0] * 6)
+
+    def test_keep_affected(self):
+        deltas = [0.5, 0.0, 0.0,
+                  0.001, -0.001, 0.0]
+        affected = delta.affected_vertices(deltas, 0.01)
+        self.assertEqual([bool(n) for n in affected], [True, False])
+        kept = delta.keep_affected(deltas, affected)
+        _close(self, kept, [0.5, 0.0, 0.0, 0.0, 0.0, 0.0])
+        # Vertices left out are neutral in the map
+        _close(self, delta.delta_colors(kept, 0.5)[3:], [0.5, 0.5, 0.5])
+
+    def test_loop_colors(self):
+        colors = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]
+        _close(self, delta.loop_colors(colors, [1, 0, 1]),
+               [0.4, 0.5, 0.6, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from io_export_diffmap import encode
+
+WIDTH = 5
+HEIGHT = 3
+
+
+# Decoders of what encode writes, kept to the subset it uses
+#   All return the image size and its flat RGB samples, bottom row first.
+
+def read_tga(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    kind, width, height, depth, descriptor = (data[2],) + struct.unpack_from('<HHBB', data, 12)
+    assert kind in (2, 10) and depth == 24 and descriptor == 0
+    pos = 18
+    bgr = bytearray()
+    if kind == 2:
+        bgr = data[pos:pos + width * height * 3]
+    else:
+        while len(bgr) < width * height * 3:
+            packet = data[pos]
+            count = (packet & 0x7f) + 1
+            if packet & 0x80:
+                bgr += data[pos + 1:pos + 4] * count
+                pos += 4
+            else:
+                bgr += data[pos + 1:pos + 1 + count * 3]
+                pos += 1 + count * 3
+        assert pos == len(data)
+    rgb = bytearray(bgr)
+    rgb[0::3], rgb[2::3] = bgr[2::3], bgr[0::3]
+    return width, height, list(rgb)
+
+
+def read_png(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos = 8
+    chunks = []
+    while pos < len(data):
+        length = struct.unpack_from('>I', data, pos)[0]
+        kind = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        crc = struct.unpack_from('>I', data, pos + 8 + length)[0]
+        assert zlib.crc32(kind + body) & 0xffffffff == crc
+        chunks.append((kind, body))
+        pos += 12 + length
+    assert [c[0] for c in chunks] == [b'IHDR', b'IDAT', b'IEND']
+    width, height, depth, color, _, _, _ = struct.unpack('>IIBBBBB', chunks[0][1])
+    assert color == 2
+    raw = zlib.decompress(chunks[1][1])
+    stride = width * 3 * depth // 8
+    samples = []
+    # Rows are stored top first, each after a filter byte (always 0)
+    for y in range(height - 1, -1, -1):
+        row = raw[y * (stride + 1):(y + 1) * (stride + 1)]
+        assert row[0] == 0
+        if depth == 8:
+            samples += list(row[1:])
+        else:
+            samples += list(struct.unpack('>%dH' % (width * 3), row[1:]))
+    return width, height, depth, samples
+
+
+def read_exr(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = struct.unpack_from('<ii', data)
+    assert magic == 20000630 and version == 2
+    pos = 8
+    attributes = {}
+    while data[pos:pos + 1] != b'\0':
+        end = data.index(b'\0', pos)
+        name = data[pos:end].decode('ascii')
+        kind_end = data.index(b'\0', end + 1)
+        size = struct.unpack_from('<i', data, kind_end + 1)[0]
+        attributes[name] = data[kind_end + 5:kind_end + 5 + size]
+        pos = kind_end + 5 + size
+    pos += 1
+    x0, y0, x1, y1 = struct.unpack('<iiii', attributes['dataWindow'])
+    width, height = x1 - x0 + 1, y1 - y0 + 1
+    pixel_type = struct.unpack_from('<i', attributes['channels'], 2)[0]
+    half = pixel_type == 1
+
+    offsets = struct.unpack_from('<%dQ' % height, data, pos)
+    rows = []
+    for y, offset in enumerate(offsets):
+        line, length = struct.unpack_from('<ii', data, offset)
+        assert line == y
+        count = width * 3
+        if half:
+            values = [encode.half_to_float(n) for n in struct.unpack_from('<%dH' % count, data, offset + 8)]
+        else:
+            values = list(struct.unpack_from('<%df' % count, data, offset + 8))
+        b, g, r = values[:width], values[width:2 * width], values[2 * width:]
+        rows.append([n for x in range(width) for n in (r[x], g[x], b[x])])
+    # Top row first in the file
+    return width, height, half, [n for row in reversed(rows) for n in row]
+
+
+class EncodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # Runs of equal pixels and single ones, out of range values clipped
+        row = [0.0, 0.5, 1.0, 0.0, 0.5, 1.0, 0.25, 0.75, 0.125, 1.5, -0.5, 0.5, 0.2, 0.4, 0.6]
+        self.pixels = row + row[::-1] + [0.5] * (WIDTH * 3)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, file_format):
+        return os.path.join(self.dir, 'map' + encode.EXTENSIONS[file_format])
+
+    def expected_bytes(self):
+        return [int(min(max(n, 0.0), 1.0) * 255.0 + 0.5) for n in self.pixels]
+
+    def test_tga(self):
+        path = self.path('TGA')
+        encode.write_image(path, self.pixels, WIDTH, HEIGHT, 'TGA')
+        self.assertEqual(os.path.getsize(path), 18 + WIDTH * HEIGHT * 3)
+        self.assertEqual(read_tga(path), (WIDTH, HEIGHT, self.expected_bytes()))
+
+    def test_tga_rle(self):
+        path = self.path('TGA_RLE')
+        encode.write_image(path, self.pixels, WIDTH, HEIGHT, 'TGA_RLE')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(3), b'\0\0\x0a')
+        self.assertEqual(read_tga(path), (WIDTH, HEIGHT, self.expected_bytes()))
+
+    def test_tga_rle_long_rows(self):
+        # Runs and raw stretches longer than a packet holds
+        width = 300
+        pixels = [0.5] * (200 * 3) + [(i % 7) / 7.0 for i in range(100 * 3)]
+        path = self.path('TGA_RLE')
+        encode.write_tga(path, pixels, width, 1, rle=True)
+        expected = [int(min(max(n, 0.0), 1.0) * 255.0 + 0.5) for n in pixels]
+        self.assertEqual(read_tga(path), (width, 1, expected))
+
+    def test_png8(self):
+        path = self.path('PNG')
+        encode.write_image(path, self.pixels, WIDTH, HEIGHT, 'PNG')
+        self.assertEqual(read_png(path), (WIDTH, HEIGHT, 8, self.expected_bytes()))
+
+
+    def test_png16(self):
+        path = self.path('PNG16')
+        encode.write_image(path, self.pixels, WIDTH, HEIGHT, 'PNG16')
+        expected = [int(min(max(n, 0.0), 1.0) * 65535.0 + 0.5) for n in self.pixels]
+        self.assertEqual(read_png(path), (WIDTH, HEIGHT, 16, expected))
+
+    def test_exr_half(self):
+        path = self.path('EXR_HALF')
+        encode.write_image(path, self.pixels, WIDTH, HEIGHT, 'EXR_HALF')
+        width, height, half, samples = read_exr(path)
+        self.assertEqual((width, height, half), (WIDTH, HEIGHT, True))
+        for got, value in zip(samples, self.pixels):
+            self.assertAlmostEqual(got, value, places=3)
+
+    def test_exr_float(self):
+        path = self.path('EXR_FLOAT')
+        pixels = [n + 1.0 / 3.0 for n in self.pixels]
+        encode.write_image(path, pixels, WIDTH, HEIGHT, 'EXR_FLOAT')
+        width, height, half, samples = read_exr(path)
+        self.assertEqual((width, height, half), (WIDTH, HEIGHT, False))
+        for got, value in zip(samples, pixels):
+            self.assertAlmostEqual(got, value, places=6)
+
+    def test_half_floats(self):
+        values = [0.0, 1.0, -2.5, 0.333, 65504.0, 1e-7]
+        halves = encode.half_array(values)
+        self.assertEqual([encode.float_to_half(v) for v in values], list(halves))
+        self.assertEqual(encode.half_to_float(halves[1]), 1.0)
+        self.assertEqual(encode.half_to_float(halves[2]), -2.5)
+        self.assertAlmostEqual(encode.half_to_float(halves[3]), 0.333, places=3)
+        self.assertEqual(encode.half_to_float(halves[4]), 65504.0)
+        self.assertEqual(encode.float_to_half(1e6), 0x7c00)
+
+
+if __name__ == '__main__':
+    unittest.main()
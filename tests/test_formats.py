@@ -0,0 +1,214 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from io_export_diffmap import animation
+from io_export_diffmap import vertexdeltas
+
+# Largest error of a value per encoding, as a fraction of the track range
+STEPS = {'UINT8': 1.0 / 255, 'UINT16': 1.0 / 65535, 'FLOAT16': 1.0 / 1024}
+
+
+# Binary animation files (MMAN): write_binary and read_binary
+class BinaryAnimationTest(unittest.TestCase):
+
+    names = ['Smile', 'Blink', 'Jaw']
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'range.bytes')
+        # A ramp, steps and a key that never moves
+        self.rows = [[f / 19.0, 1.0 if 5 <= f < 12 else 0.25, 0.0] for f in range(20)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, scales, encoding, compress, simplify):
+        animation.write_binary(self.path, self.names, scales, self.rows, encoding,
+                               compress, simplify, 0.0)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(4), animation.BINARY_MAGIC)
+        names, got_scales, rows = animation.read_binary(self.path)
+        self.assertEqual(names, self.names)
+        self.assertEqual(len(rows), len(self.rows))
+        for got, expected in zip(got_scales, scales):
+            if isinstance(expected, tuple):
+                self.assertEqual(len(got), 3)
+                for a, b in zip(got, expected):
+                    self.assertAlmostEqual(a, b, places=6)
+            else:
+                self.assertAlmostEqual(got, expected, places=6)
+        for got, expected in zip(rows, self.rows):
+            for a, b in zip(got, expected):
+                self.assertLessEqual(abs(a - b), STEPS[encoding],
+                                     (encoding, compress, simplify))
+
+    def test_round_trip(self):
+        for encoding in sorted(animation.ENCODINGS):
+            for compress in (False, True):
+                for simplify in animation.SIMPLIFY_MODES:
+                    self.check([0.5, 0.25, 1.0], encoding, compress, simplify)
+
+    def test_other_byte_order(self):
+        # Files are little endian whatever the host, delta coding works on
+        # the values before they are swapped to that order
+        other = 'big' if sys.byteorder == 'little' else 'little'
+        with mock.patch.object(sys, 'byteorder', other):
+            for encoding in sorted(animation.ENCODINGS):
+                for simplify in animation.SIMPLIFY_MODES:
+                    self.check([0.5, 0.25, 1.0], encoding, True, simplify)
+
+    def test_sparse_tracks(self):
+        # Simplified tracks only store the frames they need
+        dense = os.path.join(self.dir, 'dense.bytes')
+        animation.write_binary(dense, self.names, [1.0] * 3, self.rows, 'UINT16', False)
+        animation.write_binary(self.path, self.names, [1.0] * 3, self.rows, 'UINT16', False,
+                               'KEYS', 0.0)
+        self.assertLess(os.path.getsize(self.path), os.path.getsize(dense))
+
+    def test_axis_scales(self):
+        scales = [(0.5, 0.25, 0.125), (1.0, 0.0, 0.5), (0.0, 0.0, 0.0)]
+        self.check(scales, 'UINT16', True, 'NONE')
+        with open(self.path, 'rb') as f:
+            flags = struct.unpack_from('<4sHBB', f.read())[3]
+        self.assertTrue(flags & animation.FLAG_AXIS_SCALES)
+
+    def test_single_scales(self):
+        self.check([0.5, 0.25, 1.0], 'UINT16', True, 'NONE')
+        with open(self.path, 'rb') as f:
+            flags = struct.unpack_from('<4sHBB', f.read())[3]
+        self.assertFalse(flags & animation.FLAG_AXIS_SCALES)
+
+    def test_not_an_animation(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'MMVD' + bytes(16))
+        self.assertRaises(ValueError, animation.read_binary, self.path)
+
+
+
+# A curve overshooting the 0..1 slider range, like an eased F-curve
+class _Curve(object):
+
+    def evaluate(self, frame):
+        return frame * 0.5 - 0.75
+
+
+class SamplesTest(unittest.TestCase):
+
+    def test_set_curve(self):
+        samples = animation.Samples(range(5), ['Smile', 'Blink'])
+        samples.set_curve(0, _Curve())
+        samples.set_curve(1, _Curve(), 0.0, 1.0)
+        self.assertEqual([row[0] for row in samples.values], [-0.75, -0.25, 0.25, 0.75, 1.25])
+        self.assertEqual([row[1] for row in samples.values], [0.0, 0.0, 0.25, 0.75, 1.0])
+
+    def test_set_curve_slider_range(self):
+        # Slider ranges other than 0..1 clamp at their own limits
+        samples = animation.Samples(range(5), ['Smile'])
+        samples.set_curve(0, _Curve(), -0.5, 1.0)
+        self.assertEqual([row[0] for row in samples.values], [-0.5, -0.25, 0.25, 0.75, 1.0])
+
+
+class SimplifyTest(unittest.TestCase):
+
+    def test_keys(self):
+        # A ramp needs its ends, a bump its corners
+        self.assertEqual(animation.simplify_keys([0.0, 1.0, 2.0, 3.0, 4.0], 0.0), [0, 4])
+        values = [0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0]
+        keys = animation.simplify_keys(values, 0.01)
+        self.assertEqual(keys, [0, 2, 3, 4, 5, 6])
+        track = [(i, values[i]) for i in keys]
+        self.assertEqual(animation.expand_track(track, len(values)), values)
+
+    def test_keys_tolerance(self):
+        values = [0.0, 0.004, 0.0, 0.5, 1.0]
+        self.assertEqual(animation.simplify_keys(values, 0.01), [0, 2, 4])
+        track = animation.simplify_track(values, 0.01, 'KEYS')
+        for got, value in zip(animation.expand_track(track, len(values)), values):
+            self.assertLessEqual(abs(got - value), 0.01)
+
+    def test_spans(self):
+        values = [0.0, 0.01, 0.0, 1.0, 1.0, 0.5]
+        spans = animation.constant_spans(values, 0.01)
+        self.assertEqual(spans, [(0, 0.005), (3, 1.0), (5, 0.5)])
+        for got, value in zip(animation.expand_track(spans, len(values), step=True), values):
+            self.assertLessEqual(abs(got - value), 0.01)
+
+    def test_tracks(self):
+        rows = [[0.0, 1.0], [0.5, 1.0], [1.0, 1.0]]
+        self.assertEqual(animation.simplify_tracks(rows, 0.0, 'KEYS'),
+                         [[(0, 0.0), (2, 1.0)], [(0, 1.0), (2, 1.0)]])
+        self.assertEqual(animation.simplify_tracks(rows, 0.0, 'SPANS'),
+                         [[(0, 0.0), (1, 0.5), (2, 1.0)], [(0, 1.0)]])
+
+
+
+# Vertex delta files (MMVD): DeltaWriter and read_deltas
+class VertexDeltasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'mesh.mmvd')
+        # Four vertices, vertex 1 split by a UV seam
+        self.uvs = [0.0, 0.0, 0.5, 0.0, 0.5, 0.5, 0.75, 0.0, 0.0, 0.5]
+        self.loop_vertices = [0, 1, 2, 1, 3]
+        self.keys = [
+            ('Smile', [0.0, 0.0, 0.0, 0.5, -0.25, 0.0, 0.0, 0.0, 0.0, 0.001, 0.0, 0.0]),
+            ('Blink', [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]),
+            ]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, encoding, epsilon):
+        uvs, vertices = vertexdeltas.uv_entries(self.uvs, self.loop_vertices)
+        writer = vertexdeltas.DeltaWriter(self.path, 4, uvs, vertices, encoding)
+        for name, deltas in self.keys:
+            writer.add(name, deltas, epsilon)
+        self.assertFalse(os.path.exists(self.path))
+        writer.close()
+        self.assertEqual(os.listdir(self.dir), ['mesh.mmvd'])
+        return vertexdeltas.read_deltas(self.path)
+
+    def check(self, encoding, epsilon, moved, tolerance):
+        count, uvs, vertices, keys = self.write(encoding, epsilon)
+        self.assertEqual(count, 4)
+        self.assertEqual(sorted(zip(uvs[0::2], uvs[1::2], vertices)),
+                         sorted(set(zip(self.uvs[0::2], self.uvs[1::2], self.loop_vertices))))
+        self.assertEqual([k[0] for k in keys], ['Smile', 'Blink'])
+
+        name, scales, indexes, offsets = keys[0]
+        deltas = self.keys[0][1]
+        self.assertEqual(indexes, moved)
+        for axis, expected in enumerate((0.5, 0.25, 0.0)):
+            self.assertAlmostEqual(scales[axis], expected, places=6)
+        for i, vertex in enumerate(indexes):
+            for axis in range(3):
+                self.assertLessEqual(abs(offsets[i * 3 + axis] - deltas[vertex * 3 + axis]),
+                                     tolerance)
+        # A key without offsets stores no vertex
+        self.assertEqual(keys[1][2], [])
+
+    def test_int16(self):
+        self.check('INT16', 0.0, [1, 3], 0.5 / 32767)
+
+    def test_float16(self):
+        self.check('FLOAT16', 0.0, [1, 3], 0.5 / 1024)
+
+    def test_epsilon(self):
+        self.check('INT16', 0.01, [1], 0.5 / 32767)
+
+    def test_discard(self):
+        uvs, vertices = vertexdeltas.uv_entries(self.uvs, self.loop_vertices)
+        writer = vertexdeltas.DeltaWriter(self.path, 4, uvs, vertices)
+        writer.add(*self.keys[0])
+        writer.discard()
+        self.assertEqual(os.listdir(self.dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
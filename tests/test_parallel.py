@@ -0,0 +1,82 @@
+import array
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from io_export_diffmap import benchmark
+from io_export_diffmap import parallel
+from io_export_diffmap import snapshot
+
+
+# The pool spawns fresh interpreters that import the package (and this
+# module when unpickling), so nothing here may run work at import time
+class ExportKeysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        mesh = benchmark.SyntheticMesh(100, 6, 0.25, 7)
+        keys = array.array('f')
+        for i in range(len(mesh.names)):
+            keys.extend(array.array('f', mesh.key_coords(i)))
+        self.mesh = snapshot.MeshSnapshot(mesh.basis, mesh.names, keys, mesh.loop_vertices,
+                                          mesh.uvs, mesh.loop_starts, mesh.loop_totals)
+        self.data = parallel.share_snapshot(self.mesh)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def export(self, workers, folder, **kwargs):
+        os.mkdir(os.path.join(self.dir, folder))
+        jobs = [(i, os.path.join(self.dir, folder, '%d.tga' % i)) for i in range(len(self.mesh.names))]
+        results = list(parallel.export_keys(self.data, jobs, 32, 32, 2, workers=workers, **kwargs))
+        return sorted(results, key=lambda result: result.index)
+
+    def files(self, folder):
+        contents = {}
+        for name in os.listdir(os.path.join(self.dir, folder)):
+            with open(os.path.join(self.dir, folder, name), 'rb') as f:
+                contents[name] = f.read()
+        return contents
+
+    def test_workers_match(self):
+        one = self.export(1, 'one')
+        two = self.export(2, 'two')
+        self.assertEqual([r.index for r in one], list(range(6)))
+        self.assertEqual([r.index for r in two], list(range(6)))
+        for a, b in zip(one, two):
+            self.assertIsNone(a.error)
+            self.assertIsNone(b.error)
+            self.assertEqual(float(a.maxdiff), float(b.maxdiff))
+            self.assertEqual([float(s) for s in a.scales], [float(s) for s in b.scales])
+            self.assertEqual(os.path.basename(a.path), os.path.basename(b.path))
+        self.assertEqual(len(self.files('one')), 6)
+        self.assertEqual(self.files('one'), self.files('two'))
+
+    def test_crop(self):
+        one = self.export(1, 'one', crop=True, axis_scale=True)
+        two = self.export(2, 'two', crop=True, axis_scale=True)
+        for a, b in zip(one, two):
+            self.assertEqual(tuple(int(n) for n in a.region), tuple(int(n) for n in b.region))
+        self.assertEqual(self.files('one'), self.files('two'))
+
+    def test_worker_error(self):
+        # A map the worker can't write comes back with its traceback
+        jobs = [(i, os.path.join(self.dir, 'missing', '%d.tga' % i)) for i in range(3)]
+        results = list(parallel.export_keys(self.data, jobs, 32, 32, 2, workers=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2])
+        for result in results:
+            self.assertIn('Error', result.error)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_close_early(self):
+        os.mkdir(os.path.join(self.dir, 'early'))
+        jobs = [(i % 6, os.path.join(self.dir, 'early', '%d.tga' % i)) for i in range(200)]
+        results = parallel.export_keys(self.data, jobs, 32, 32, 2, workers=2)
+        first = next(results)
+        self.assertIsNone(first.error)
+        self.assertTrue(multiprocessing.active_children())
+        results.close()
+        # The pool is terminated and joined, no worker is left
+        self.assertEqual(multiprocessing.active_children(), [])
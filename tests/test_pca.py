@@ -0,0 +1,110 @@
+import random
+import unittest
+from unittest import mock
+
+from io_export_diffmap import animation
+from io_export_diffmap import combine
+from io_export_diffmap import delta
+from io_export_diffmap import pca
+
+from tests.test_combine import _mix, _random_offsets, _snapshot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class CompressTest(unittest.TestCase):
+
+    a = _random_offsets(1)
+    b = _random_offsets(2)
+    c = _random_offsets(3)
+
+    # Four keys made of two
+    def rank_two(self):
+        return _snapshot([self.a, self.b, _mix([(1.0, self.a), (1.0, self.b)]),
+                          _mix([(0.5, self.a), (-1.0, self.b)])])
+
+    def assertRebuilt(self, snap, basis, places):
+        for k in range(len(snap.names)):
+            rebuilt = [0.0] * len(snap.basis)
+            for column, f in enumerate(basis.coefficients[k]):
+                rebuilt = [r + f * d for r, d in zip(rebuilt, basis.snapshot.deltas(column))]
+            for r, d in zip(rebuilt, snap.deltas(k)):
+                self.assertAlmostEqual(r, d, places=places)
+
+    def test_rank_rebuilds_exactly(self):
+        snap = self.rank_two()
+        basis = pca.compress(snap, 2)
+        self.assertEqual(basis.names, ['PC0', 'PC1'])
+        self.assertEqual(basis.keys, snap.names)
+        self.assertEqual(len(basis.snapshot.names), 2)
+        for error in basis.max_errors + basis.relative_errors:
+            self.assertAlmostEqual(error, 0.0, places=4)
+        self.assertRebuilt(snap, basis, 4)
+
+    def test_coefficients_scaled(self):
+        basis = pca.compress(self.rank_two(), 2)
+        for column in range(2):
+            largest = max((row[column] for row in basis.coefficients), key=abs)
+            self.assertAlmostEqual(largest, 1.0)
+
+    def test_truncation(self):
+        snap = _snapshot([self.a, self.b, self.c])
+        basis = pca.compress(snap, 1)
+        self.assertEqual(len(basis.names), 1)
+        for error in basis.max_errors + basis.relative_errors:
+            self.assertGreater(error, 0.01)
+        for error in basis.relative_errors:
+            self.assertLess(error, 1.0)
+        # Every key rebuilds from as many components as there are keys
+        self.assertRebuilt(snap, pca.compress(snap, 3), 4)
+
+    def test_epsilon(self):
+        still = [0.0] * len(self.a)
+        basis = pca.compress(_snapshot([self.a, still, self.b]), 3, epsilon=1e-6)
+        self.assertEqual(basis.keys, ['Key 0', 'Key 2'])
+        self.assertEqual(len(basis.coefficients), 2)
+
+    def test_project_samples(self):
+        snap = self.rank_two()
+        basis = pca.compress(snap, 2)
+        samples = animation.Samples([1, 2], basis.keys)
+        samples.set_frame(1, [0], [1.0])
+        samples.set_frame(2, [2, 3], [0.5, 0.25])
+        projected = pca.project_samples(samples, basis.coefficients, basis.names)
+        self.assertEqual(projected.names, basis.names)
+        for row, weights in zip(projected.values, ([1.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.5, 0.25])):
+            expected = [sum(w * c[column] for w, c in zip(weights, basis.coefficients))
+                        for column in range(2)]
+            for value, e in zip(row, expected):
+                self.assertAlmostEqual(value, e)
+
+
+# Same cases on the pure Python paths
+class CompressNoNumpyTest(CompressTest):
+
+    def setUp(self):
+        for module in (animation, combine, delta, pca):
+            patch = mock.patch.object(module, 'numpy', None)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+@unittest.skipIf(numpy is None, 'NumPy is needed to check against')
+class EigenTest(unittest.TestCase):
+
+    def test_jacobi_matches_eigh(self):
+        rng = random.Random(5)
+        rows = [[rng.uniform(-1.0, 1.0) for j in range(6)] for i in range(6)]
+        matrix = [[sum(a * b for a, b in zip(rows[i], rows[j])) for j in range(6)] for i in range(6)]
+        with mock.patch.object(pca, 'numpy', None):
+            values, vectors = pca._eigen(matrix)
+        expected, expected_vectors = numpy.linalg.eigh(numpy.asarray(matrix))
+        order = numpy.argsort(expected)[::-1]
+        numpy.testing.assert_allclose(values, expected[order], atol=1e-9)
+        # Vectors only match up to their sign
+        for n, m in enumerate(order):
+            dot = numpy.dot(numpy.asarray(vectors)[:, n], expected_vectors[:, m])
+            self.assertAlmostEqual(abs(dot), 1.0, places=9)
@@ -0,0 +1,166 @@
+import unittest
+
+from io_export_diffmap import benchmark
+from io_export_diffmap import delta
+from io_export_diffmap import pipeline
+from io_export_diffmap import raster
+
+SIZE = 48
+MARGIN = 3
+
+RED = [1.0, 0.0, 0.0]
+GREY = (0.5, 0.5, 0.5)
+
+
+def _max_error(a, b):
+    a, b = list(a), list(b)
+    if len(a) != len(b):
+        raise AssertionError("%d != %d samples" % (len(a), len(b)))
+    return max(abs(x - y) for x, y in zip(a, b))
+
+
+def _texel(pixels, width, x, y):
+    i = (y * width + x) * 3
+    return [float(n) for n in pixels[i:i + 3]]
+
+
+class RasterizeTest(unittest.TestCase):
+
+    # One triangle in the bottom left corner, covering the texels with
+    # x + y <= 3 on a 16 x 16 map
+    uvs = [0.0, 0.0, 0.25, 0.0, 0.0, 0.25]
+
+    def test_triangulate(self):
+        # A quad is cut along its shorter UV diagonal, a pentagon is fanned
+        uvs = [0.0, 0.0, 1.0, 0.0, 1.0, 0.1, 0.0, 0.1,
+               0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.5, 1.5, 0.0, 1.0]
+        tris = raster.triangulate([0, 4], [4, 5], uvs)
+        self.assertEqual(list(tris), [0, 1, 2, 0, 2, 3,
+                                      4, 5, 6, 4, 6, 7, 4, 7, 8])
+
+    def test_background(self):
+        pixels = raster.rasterize(self.uvs, [0, 1, 2], RED * 3, 16, 16, 0, GREY)
+        self.assertEqual(len(pixels), 16 * 16 * 3)
+        self.assertEqual(_texel(pixels, 16, 0, 0), RED)
+        self.assertEqual(_texel(pixels, 16, 3, 0), RED)
+        self.assertEqual(_texel(pixels, 16, 4, 0), list(GREY))
+        self.assertEqual(_texel(pixels, 16, 15, 15), list(GREY))
+
+    def test_margin(self):
+        # Texels next to the island take its color, up to margin away
+        pixels = raster.rasterize(self.uvs, [0, 1, 2], RED * 3, 16, 16, 2, GREY)
+        self.assertEqual(_texel(pixels, 16, 4, 0), RED)
+        self.assertEqual(_texel(pixels, 16, 5, 0), RED)
+        self.assertEqual(_texel(pixels, 16, 6, 0), list(GREY))
+        self.assertEqual(_texel(pixels, 16, 15, 15), list(GREY))
+
+    def test_interpolation(self):
+        # Colors are blended across the triangle
+        colors = [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+        uvs = [0.0, 0.0, 1.0, 0.0, 0.0, 1.0]
+        pixels = raster.rasterize(uvs, [0, 1, 2], colors, 8, 8, 0, GREY)
+        r, g, b = _texel(pixels, 8, 0, 0)
+        self.assertAlmostEqual(r, 0.5 / 8, places=5)
+        self.assertAlmostEqual(g, 0.5 / 8, places=5)
+        r, g, b = _texel(pixels, 8, 6, 0)
+        self.assertAlmostEqual(r, 6.5 / 8, places=5)
+        self.assertAlmostEqual(g, 0.5 / 8, places=5)
+
+
+    def test_touched_region(self):
+        # Only triangles using a moved vertex count, grown by the margin
+        region = raster.touched_region(self.uvs, [0, 1, 2], [0, 1, 2], [True, False, False],
+                                       16, 16, 2)
+        self.assertEqual(region, (0, 0, 7, 7))
+        self.assertIsNone(raster.touched_region(self.uvs, [0, 1, 2], [0, 1, 2],
+                                                [False, False, False], 16, 16, 2))
+
+    def test_region(self):
+        # The touched region of a map is rasterized like the same texels of
+        # the whole map, the rest of which is background
+        full = raster.rasterize(self.uvs, [0, 1, 2], RED * 3, 16, 16, 2, GREY)
+        region = raster.touched_region(self.uvs, [0, 1, 2], [0, 1, 2], [True, True, True],
+                                       16, 16, 2)
+        x0, y0, width, height = region
+        pixels = raster.rasterize(self.uvs, [0, 1, 2], RED * 3, 16, 16, 2, GREY, region)
+        self.assertEqual(len(pixels), width * height * 3)
+        for y in range(height):
+            for x in range(width):
+                self.assertEqual(_texel(pixels, width, x, y), _texel(full, 16, x + x0, y + y0))
+        self.assertEqual(list(raster.place(pixels, region, 16, 16, GREY)), list(full))
+
+
+
+# RasterPlan.render has to give what rasterize gives for every key
+class RasterPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mesh = benchmark.SyntheticMesh(400, 4, 0.25, 7)
+        cls.triangles = cls.mesh.triangles()
+        cls.plan = raster.RasterPlan(cls.mesh.uvs, cls.triangles, cls.mesh.loop_vertices,
+                                     SIZE, SIZE, MARGIN)
+
+    def colors(self, index):
+        deltas = self.mesh.deltas(index)
+        return deltas, delta.delta_colors(deltas, delta.maxdiff(deltas))
+
+    def test_full_map(self):
+        mesh = self.mesh
+        for k in range(len(mesh.names)):
+            deltas, colors = self.colors(k)
+            expected = raster.rasterize(mesh.uvs, self.triangles,
+                                        delta.loop_colors(colors, mesh.loop_vertices),
+                                        SIZE, SIZE, MARGIN, pipeline.NEUTRAL)
+            got = self.plan.render(colors, None, pipeline.NEUTRAL)
+            self.assertLess(_max_error(expected, got), 1e-5, mesh.names[k])
+
+    def test_region(self):
+        mesh = self.mesh
+        for k in range(len(mesh.names)):
+            deltas, colors = self.colors(k)
+            affected = delta.affected_vertices(deltas)
+            region = raster.touched_region(mesh.uvs, self.triangles, mesh.loop_vertices,
+                                           affected, SIZE, SIZE, MARGIN)
+            self.assertIsNotNone(region)
+            expected = raster.rasterize(mesh.uvs, self.triangles,
+                                        delta.loop_colors(colors, mesh.loop_vertices),
+                                        SIZE, SIZE, MARGIN, pipeline.NEUTRAL, region)
+            got = self.plan.render(colors, region, pipeline.NEUTRAL)
+            self.assertEqual(len(got), region[2] * region[3] * 3)
+            self.assertLess(_max_error(expected, got), 1e-5, mesh.names[k])
+
+    def test_region_matches_full_map(self):
+        mesh = self.mesh
+        deltas, colors = self.colors(1)
+        region = raster.touched_region(mesh.uvs, self.triangles, mesh.loop_vertices,
+                                       delta.affected_vertices(deltas), SIZE, SIZE, MARGIN)
+        full = self.plan.render(colors, None, pipeline.NEUTRAL)
+        placed = raster.place(self.plan.render(colors, region, pipeline.NEUTRAL), region,
+                              SIZE, SIZE, pipeline.NEUTRAL)
+        self.assertLess(_max_error(full, placed), 1e-5)
+
+    def test_render_key(self):
+        # Maps and regions of pipeline.render_key don't depend on the plan
+        mesh = self.mesh
+        for k in range(len(mesh.names)):
+            deltas = mesh.deltas(k)
+            scales = delta.axis_maxdiff(deltas)
+            for crop in (False, True):
+                expected = pipeline.render_key(deltas, scales, mesh.loop_vertices, mesh.uvs,
+                                               self.triangles, SIZE, SIZE, MARGIN, 0.01, crop)
+                got = pipeline.render_key(deltas, scales, mesh.loop_vertices, mesh.uvs,
+                                          self.triangles, SIZE, SIZE, MARGIN, 0.01, crop,
+                                          self.plan)
+                self.assertEqual(got[1], expected[1])
+                self.assertLess(_max_error(expected[0], got[0]), 1e-5, mesh.names[k])
+
+    def test_single_triangle(self):
+        uvs = RasterizeTest.uvs
+        expected = raster.rasterize(uvs, [0, 1, 2], RED * 3, 16, 16, 2, GREY)
+        plan = raster.RasterPlan(uvs, [0, 1, 2], [0, 1, 2], 16, 16, 2)
+        self.assertEqual(list(plan.render(RED * 3, None, GREY)), list(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
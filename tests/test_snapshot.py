@@ -0,0 +1,99 @@
+import array
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from io_export_diffmap import benchmark
+from io_export_diffmap import delta
+from io_export_diffmap import raster
+from io_export_diffmap import snapshot
+
+
+def _list(buf):
+    return [float(n) for n in buf]
+
+
+# Mesh snapshot files (MMSN): write_file and MappedSnapshot
+class MappedSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'mesh.mmsn')
+        self.mesh = benchmark.SyntheticMesh(100, 3, 0.25, 7)
+        self.mesh.names[1] = 'Smïle'
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self):
+        mesh = self.mesh
+        snapshot.write_file(self.path, mesh.basis, mesh.names, mesh.key_coords,
+                            mesh.loop_vertices, mesh.uvs, mesh.loop_starts,
+                            mesh.loop_totals, mesh.triangles())
+        mapped = snapshot.MappedSnapshot(self.path)
+        self.addCleanup(mapped.close)
+        return mapped
+
+    def assertSame(self, mapped):
+        mesh = self.mesh
+        self.assertEqual(mapped.names, mesh.names)
+        self.assertEqual(mapped.vertex_count, mesh.vertex_count)
+        for name in ('basis', 'loop_vertices', 'uvs', 'loop_starts', 'loop_totals'):
+            self.assertEqual(_list(getattr(mapped, name)), _list(getattr(mesh, name)), name)
+        self.assertEqual(_list(mapped.triangles()), _list(mesh.triangles()))
+        for i in range(len(mesh.names)):
+            self.assertEqual(_list(mapped.key_coords(i)), _list(mesh.key_coords(i)))
+            self.assertEqual(_list(mapped.deltas(i)), _list(mesh.deltas(i)))
+
+    def test_round_trip(self):
+        self.assertSame(self.write())
+
+    def test_aligned(self):
+        mapped = self.write()
+        for offset in mapped._keys:
+            self.assertEqual(offset % 64, 0)
+
+    def test_save(self):
+        mapped = snapshot.save(self.mesh, self.path)
+        self.addCleanup(mapped.close)
+        self.assertSame(mapped)
+
+    def test_pickle(self):
+        # Pickles as its path and maps the file again
+        mapped = self.write()
+        self.assertEqual(mapped.__getstate__(), {'path': self.path})
+        copy = pickle.loads(pickle.dumps(mapped))
+        self.addCleanup(copy.close)
+        self.assertSame(copy)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'MMAN' + bytes(200))
+        with self.assertRaises(ValueError):
+            snapshot.MappedSnapshot(self.path)
+
+    def test_memoryview_pickle(self):
+        # Views on shared memory are pickled as copies
+        mesh = self.mesh
+        keys = array.array('f', [float(n) for i in range(len(mesh.names)) for n in mesh.key_coords(i)])
+        snap = snapshot.MeshSnapshot(mesh.basis, mesh.names, memoryview(keys),
+                                     mesh.loop_vertices, mesh.uvs, mesh.loop_starts,
+                                     mesh.loop_totals, mesh.triangles())
+        state = snap.__getstate__()
+        self.assertIsInstance(state['keys'], array.array)
+        self.assertIsInstance(snap.keys, memoryview)
+        self.assertSame(pickle.loads(pickle.dumps(snap)))
+
+
+# Same cases on the pure Python paths
+class MappedSnapshotNoNumpyTest(MappedSnapshotTest):
+
+    def setUp(self):
+        for module in (benchmark, delta, raster, snapshot):
+            patch = mock.patch.object(module, 'numpy', None)
+            patch.start()
+            self.addCleanup(patch.stop)
+        MappedSnapshotTest.setUp(self)
@@ -0,0 +1,165 @@
+import threading
+import time
+import unittest
+
+from io_export_diffmap import steps
+
+
+# An export of a few keys with the protocol of export_steps: work is handed
+# out with every step, its result or error comes back into the generator
+# and the finally block cleans up however the export ends
+def _export(log, keys=4, work=None):
+    try:
+        for i in range(keys):
+            try:
+                value = yield steps.Step('Key %d' % i, i, keys,
+                                         (lambda i=i: work(i)) if work is not None else None)
+            except KeyError as e:
+                value = 'error %s' % e
+            log.append(value)
+        return 'done'
+    finally:
+        log.append('cleanup')
+
+
+def _square(i):
+    return i * i
+
+
+# Work outlasting the slices the tests advance by, so every slice goes
+# one step further
+def _slow(i):
+    time.sleep(0.002)
+    return i * i
+
+
+def _fail_odd(i):
+    if i % 2:
+        raise KeyError(i)
+    return i
+
+
+class RunTest(unittest.TestCase):
+
+    def test_run(self):
+        log = []
+        self.assertEqual(steps.run(_export(log, work=_square)), 'done')
+        self.assertEqual(log, [0, 1, 4, 9, 'cleanup'])
+
+    def test_errors_raised_inside(self):
+        log = []
+        self.assertEqual(steps.run(_export(log, work=_fail_odd)), 'done')
+        self.assertEqual(log, [0, 'error 1', 2, 'error 3', 'cleanup'])
+
+    def test_uncaught_error(self):
+        log = []
+        with self.assertRaises(ZeroDivisionError):
+            steps.run(_export(log, work=lambda i: 1 // (2 - i)))
+        self.assertEqual(log, [0, 1, 'cleanup'])
+
+
+class RunnerTest(unittest.TestCase):
+
+    threaded = False
+
+    def runner(self, log, **kwargs):
+        return steps.Runner(_export(log, **kwargs), threaded=self.threaded)
+
+    def finish(self, runner, seconds=0.1):
+        while runner.advance(seconds):
+            time.sleep(0.001)
+
+    def advance_to(self, runner, progress):
+        while runner.progress < progress:
+            self.assertTrue(runner.advance(0.001))
+
+    def test_advance(self):
+        log = []
+        runner = self.runner(log, work=_square)
+        self.finish(runner)
+        self.assertTrue(runner.finished)
+        self.assertFalse(runner.cancelled)
+        self.assertEqual(runner.result, 'done')
+        self.assertIsNone(runner.error)
+        self.assertEqual(log, [0, 1, 4, 9, 'cleanup'])
+        self.assertFalse(runner.advance())
+
+    def test_errors_raised_inside(self):
+        log = []
+        runner = self.runner(log, work=_fail_odd)
+        self.finish(runner)
+        self.assertEqual(runner.result, 'done')
+        self.assertEqual(log, [0, 'error 1', 2, 'error 3', 'cleanup'])
+
+    def test_uncaught_error(self):
+        log = []
+        runner = self.runner(log, work=lambda i: 1 // (2 - i))
+        self.finish(runner)
+        self.assertTrue(runner.finished)
+        self.assertIsInstance(runner.error, ZeroDivisionError)
+        self.assertEqual(log, [0, 1, 'cleanup'])
+
+    def test_progress(self):
+        # Without time to spare every advance goes one step further
+        log = []
+        runner = self.runner(log, work=_slow)
+        self.assertEqual(runner.progress, 0.0)
+        self.assertIsNone(runner.eta)
+        seen = []
+        while runner.advance(0.001):
+            seen.append(runner.progress)
+        self.assertEqual(sorted(set(seen)), [0.0, 0.25, 0.5, 0.75])
+        self.assertEqual(seen, sorted(seen))
+        # Results of work are kept from one slice to the next
+        self.assertEqual(log, [0, 1, 4, 9, 'cleanup'])
+        self.assertEqual(runner.progress, 1.0)
+        self.assertEqual(runner.eta, 0.0)
+
+    def test_eta(self):
+        log = []
+        runner = self.runner(log, work=_slow)
+        self.advance_to(runner, 0.25)
+        self.assertEqual(runner.progress, 0.25)
+        runner.start -= 1.0
+        # A quarter done in a second leaves three seconds
+        self.assertAlmostEqual(runner.eta, 3.0, places=1)
+
+    def test_cancel(self):
+        log = []
+        runner = self.runner(log, work=_slow)
+        self.advance_to(runner, 0.5)
+        runner.cancel()
+        self.assertTrue(runner.finished)
+        self.assertTrue(runner.cancelled)
+        self.assertIsNone(runner.result)
+        self.assertEqual(log, [0, 1, 'cleanup'])
+        self.assertEqual(runner.progress, 1.0)
+        self.assertFalse(runner.advance())
+        runner.cancel()
+        self.assertEqual(log.count('cleanup'), 1)
+
+
+class ThreadedRunnerTest(RunnerTest):
+
+    threaded = True
+
+    def test_cancel_during_work(self):
+        # Cancelling waits for the work of the current step, then the
+        # generator cleans up
+        started = threading.Event()
+        log = []
+
+        def work(i):
+            if i == 1:
+                started.set()
+                time.sleep(0.05)
+                log.append('worked')
+            return i
+
+        runner = self.runner(log, work=work)
+        while not started.is_set():
+            self.assertTrue(runner.advance(0.001))
+            time.sleep(0.001)
+        runner.cancel()
+        self.assertTrue(runner.cancelled)
+        self.assertEqual(log, [0, 'worked', 'cleanup'])
@@ -0,0 +1,185 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from io_export_diffmap import animation
+from io_export_diffmap import stream
+from io_export_diffmap import writer
+
+NAMES = ['Face-K%d' % i for i in range(5)]
+SCALES = [(0.5, 0.5, 0.25), (0.25, 0.5, 0.125), (1.0, 1.0, 1.0), (0.75, 0.0, 0.5), (1.0, 1.0, 0.5)]
+RANGES = [('Talk', 1, 97), ('Blink', 98, 250), ('Idle', 251, 300), ('Again', 10, 60)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+# Animation values of every key, keys 2 and 4 never move
+def _values():
+    rand = random.Random(3)
+    values = {}
+    for frame in range(1, 301):
+        values[frame] = [0.0 if c in (2, 4) else
+                         (rand.random() if (frame // 40 + c) % 3 else 0.0)
+                         for c in range(len(NAMES))]
+    return values
+
+VALUES = _values()
+
+
+def sample(start, end):
+    samples = animation.Samples(range(start, end + 1), NAMES)
+    for frame in range(start, end + 1):
+        samples.set_frame(frame, range(len(NAMES)), VALUES[frame])
+    return samples
+
+
+# AnimationWriter picking up an export that stopped half way
+class ResumeTest(unittest.TestCase):
+
+    settings = {'simplify': 'KEYS', 'tolerance': 0.01, 'ranges': RANGES}
+
+    def setUp(self):
+        self.expected = tempfile.mkdtemp()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.expected)
+        shutil.rmtree(self.dir)
+
+    def export(self, directory, sample, resume=False, file_writer=None):
+        out = stream.AnimationWriter(os.path.join(directory, 'Face.json'), NAMES, SCALES,
+                                     self.settings, buffer=32, resume=resume,
+                                     file_writer=file_writer)
+        for index, (name, start, end) in enumerate(RANGES):
+            out.write_range(index, name, start, end, sample,
+                            os.path.join(directory, name + '.TXT'),
+                            os.path.join(directory, name + '.bytes'),
+                            lambda column: {'Scale': column})
+        return out
+
+    def files(self, directory):
+        result = {}
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), 'rb') as f:
+                result[name] = f.read()
+        return result
+
+    def check(self, file_writer=None):
+        self.export(self.expected, sample).close()
+
+        # Stop in the middle of the second range
+        calls = [0]
+
+        def failing(start, end):
+            calls[0] += 1
+            if calls[0] == 6:
+                raise Interrupted()
+            return sample(start, end)
+
+        self.assertRaises(Interrupted, self.export, self.dir, failing,
+                          file_writer=file_writer)
+        if file_writer is not None:
+            file_writer.wait()
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'Face.json')))
+
+        resumed = stream.AnimationWriter(os.path.join(self.dir, 'Face.json'), NAMES, SCALES,
+                                         self.settings, buffer=32, resume=True)
+        self.assertEqual(resumed.resumed, 1)
+        self.assertEqual(resumed.state['frames'], 32)
+
+        # Frames already on disk are not sampled again
+        sampled = []
+
+        def counting(start, end):
+            sampled.append((start, end))
+            return sample(start, end)
+
+        self.export(self.dir, counting, resume=True).close()
+        self.assertEqual(sampled[0][0], 98 + 32)
+        self.assertEqual(self.files(self.dir), self.files(self.expected))
+        json.loads(self.files(self.dir)['Face.json'].decode('utf-8'))
+
+    def test_resume(self):
+        self.check()
+
+    def test_resume_background_writes(self):
+        self.check(writer.FileWriter(2, 4000))
+
+    def test_other_settings_start_over(self):
+        self.export(self.dir, sample)
+        settings = dict(self.settings, tolerance=0.02)
+        out = stream.AnimationWriter(os.path.join(self.dir, 'Face.json'), NAMES, SCALES,
+                                     settings, buffer=32, resume=True)
+        self.assertEqual(out.resumed, 0)
+
+    def test_unwritten_outputs(self):
+        # The binary file of a range fails to write: its part file stays
+        # and the next export writes it
+        file_writer = writer.FileWriter(1)
+        write_tracks = animation.write_tracks
+
+        def failing(*args, **kwargs):
+            raise IOError("disk gone")
+
+        animation.write_tracks = failing
+        try:
+            out = stream.AnimationWriter(os.path.join(self.dir, 'Face.json'), NAMES, SCALES,
+                                         self.settings, buffer=32, file_writer=file_writer)
+            out.write_range(0, 'Talk', 1, 97, sample, os.path.join(self.dir, 'Talk.TXT'),
+                            os.path.join(self.dir, 'Talk.bytes'))
+            file_writer.wait()
+        finally:
+            animation.write_tracks = write_tracks
+        self.assertTrue(file_writer.failed)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'Talk.bytes')))
+
+        out = stream.AnimationWriter(os.path.join(self.dir, 'Face.json'), NAMES, SCALES,
+                                     self.settings, buffer=32, resume=True)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, 'Talk.bytes')))
+        out.close()
+        self.assertEqual(sorted(os.listdir(self.dir)), ['Face.json', 'Talk.TXT', 'Talk.bytes'])
+
+
+
+# Overlapping ranges sampled through SharedFrames
+class SharedFramesTest(unittest.TestCase):
+
+    ranges = [(1, 40), (30, 60), (10, 20), (55, 70)]
+
+    def check(self, limit):
+        sampled = []
+
+        def spans_sample(spans):
+            frames = [f for start, end in spans for f in range(start, end + 1)]
+            sampled.extend(frames)
+            samples = animation.Samples(frames, NAMES)
+            for frame in frames:
+                samples.set_frame(frame, range(len(NAMES)), VALUES[frame])
+            return samples
+
+        shared = animation.SharedFrames(spans_sample, NAMES, self.ranges, limit)
+        for index, (start, end) in enumerate(self.ranges):
+            samples = shared.sample(index, start, end)
+            self.assertEqual(samples.rows(start, end, range(len(NAMES))),
+                             [VALUES[f] for f in range(start, end + 1)])
+            self.assertLessEqual(len(shared.rows), limit)
+        return sampled
+
+    def test_frames_sampled_once(self):
+        sampled = self.check(1000)
+        self.assertEqual(sorted(sampled), animation.range_frames(self.ranges))
+
+    def test_limit(self):
+        # Without room to keep rows, shared frames are sampled again
+        sampled = self.check(0)
+        self.assertEqual(len(sampled), sum(end - start + 1 for start, end in self.ranges))
+        self.assertLess(len(self.check(5)), len(sampled))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from io_export_diffmap import writer
+
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_half(path, data):
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    raise IOError('disk full')
+
+
+class WriteAtomicTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'map.tga')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write(self):
+        writer.write_atomic(self.path, _write_bytes, b'data')
+        self.assertEqual(os.listdir(self.dir), ['map.tga'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+    def test_failed_write(self):
+        # The old file stays whole and the temporary one goes
+        writer.write_atomic(self.path, _write_bytes, b'old')
+        with self.assertRaises(IOError):
+            writer.write_atomic(self.path, _write_half, b'new data')
+        self.assertEqual(os.listdir(self.dir), ['map.tga'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+
+
+class FileWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    # Write once the test lets it
+    def held(self, path, data):
+        self.release.wait(5.0)
+        _write_bytes(path, data)
+
+    # Submit from another thread
+    # Returns: the thread, alive while submit waits
+    def submit_in_thread(self, files, *args, **kwargs):
+        thread = threading.Thread(target=files.submit, args=args, kwargs=kwargs)
+        thread.start()
+        self.addCleanup(thread.join, 5.0)
+        return thread
+
+    def test_write(self):
+        files = writer.FileWriter(threads=2)
+        for name in ('a', 'b', 'c'):
+            files.submit(self.path(name), _write_bytes, (name.encode('ascii'),), 1)
+        files.wait()
+        self.assertEqual(files.pending, 0)
+        self.assertEqual(sorted(files.written), [self.path(n) for n in ('a', 'b', 'c')])
+        files.close()
+        self.assertEqual(sorted(os.listdir(self.dir)), ['a', 'b', 'c'])
+
+    def test_backpressure(self):
+        files = writer.FileWriter(threads=2, buffer=100)
+        files.submit(self.path('a'), self.held, (b'a',), 60)
+        thread = self.submit_in_thread(files, self.path('b'), _write_bytes, (b'b',), 60)
+        thread.join(0.1)
+        # Over budget until the first file is written
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(files.pending, 60)
+        self.release.set()
+        thread.join(5.0)
+        self.assertFalse(thread.is_alive())
+        files.close()
+        self.assertEqual(sorted(os.listdir(self.dir)), ['a', 'b'])
+
+    def test_within_budget(self):
+        files = writer.FileWriter(threads=2, buffer=100)
+        files.submit(self.path('a'), self.held, (b'a',), 40)
+        thread = self.submit_in_thread(files, self.path('b'), self.held, (b'b',), 40)
+        thread.join(5.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(files.pending, 80)
+        self.release.set()
+        files.close()
+
+    def test_oversized(self):
+        # A file bigger than the budget waits for all earlier files
+        files = writer.FileWriter(threads=2, buffer=100)
+        files.submit(self.path('a'), self.held, (b'a',), 10)
+        thread = self.submit_in_thread(files, self.path('b'), _write_bytes, (b'b',), 500)
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.release.set()
+        thread.join(5.0)
+        self.assertFalse(thread.is_alive())
+        files.close()
+
+    def test_errors(self):
+        # Errors on the writer threads are kept and raised by close, the
+        # other files are still written
+        files = writer.FileWriter(threads=2)
+        files.submit(self.path('a'), _write_bytes, (b'a',), 1)
+        files.submit(self.path('b'), _write_half, (b'bb',), 2)
+        files.submit(self.path('c'), _write_bytes, (b'c',), 1)
+        files.wait()
+        self.assertEqual(files.failed, [self.path('b')])
+        self.assertEqual(files.pending, 0)
+        with self.assertRaises(IOError) as raised:
+            files.close()
+        self.assertEqual(str(raised.exception), 'disk full')
+        self.assertEqual(sorted(os.listdir(self.dir)), ['a', 'c'])
+
+    def test_done_fails(self):
+        # A failing done callback counts the file as failed
+        def done():
+            raise ValueError('done')
+
+        files = writer.FileWriter(threads=1)
+        files.submit(self.path('a'), _write_bytes, (b'a',), 1, done)
+        files.wait()
+        self.assertEqual(files.failed, [self.path('a')])
+        with self.assertRaises(ValueError):
+            files.close()
+
+    def test_write_image(self):
+        files = writer.FileWriter(threads=1)
+        files.write_image(self.path('map.tga'), [0.5] * 12, 2, 2)
+        files.close()
+        self.assertEqual(os.listdir(self.dir), ['map.tga'])
+        self.assertEqual(os.path.getsize(self.path('map.tga')), 18 + 12)